@@ -3,7 +3,7 @@ import Card from './Card';
 import Button from './Button';
 import './TransactionList.css';
 
-const TransactionList = ({ title, emoji, transactions, type, onDelete, onAdd }) => {
+const TransactionList = ({ title, emoji, transactions, type, onDelete, onAdd, onLoadMore, loadingMore = false }) => {
   const isEmpty = transactions.length === 0;
 
   return (
@@ -43,6 +43,14 @@ const TransactionList = ({ title, emoji, transactions, type, onDelete, onAdd })
               </div>
             </div>
           ))}
+          {/* The API sends the newest rows a page at a time */}
+          {onLoadMore && (
+            <div className="transaction-load-more">
+              <Button variant="secondary" size="small" onClick={onLoadMore} disabled={loadingMore}>
+                {loadingMore ? 'Loading...' : `Load older ${type.toLowerCase()}`}
+              </Button>
+            </div>
+          )}
         </div>
       )}
     </Card>
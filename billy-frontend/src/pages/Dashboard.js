@@ -12,6 +12,7 @@ const Dashboard = () => {
   const [data, setData] = useState(null);
   const [loading, setLoading] = useState(true);
   const [showModal, setShowModal] = useState(null); // 'income' or 'expense'
+  const [loadingMore, setLoadingMore] = useState(null); // 'incomes' or 'expenses'
   const { addToast } = useToast();
 
   const fetchData = async () => {
@@ -30,6 +31,39 @@ const Dashboard = () => {
     fetchData();
   }, []);
 
+  // The dashboard sends the newest rows a page at a time: append the next
+  // page of one list, leaving the other list and the totals as they are
+  const loadMore = async (list) => {
+    const cursorParam = list === "incomes" ? "income_cursor" : "expense_cursor";
+    try {
+      setLoadingMore(list);
+      const page = await financeAPI.getDashboard({ [cursorParam]: data.next_cursor[list] });
+      setData((current) => ({
+        ...current,
+        [list]: [...current[list], ...page[list]],
+        next_cursor: { ...current.next_cursor, [list]: page.next_cursor[list] },
+      }));
+    } catch (error) {
+      console.error(`Error loading more ${list}:`, error);
+      addToast("Couldn't load older records. Please try again.", "error");
+    } finally {
+      setLoadingMore(null);
+    }
+  };
+
+  // After a delete, take the new totals but keep the pages already loaded
+  // (cursors are positions, so they stay valid without the deleted row)
+  const removeRow = async (list, id) => {
+    const fresh = await financeAPI.getDashboard();
+    setData((current) => ({
+      ...fresh,
+      incomes: current.incomes,
+      expenses: current.expenses,
+      next_cursor: current.next_cursor,
+      [list]: current[list].filter((row) => row.id !== id),
+    }));
+  };
+
   const handleAddIncome = async (formData) => {
     try {
       setLoading(true); // Show spinner while updating
@@ -88,7 +122,7 @@ const Dashboard = () => {
     if (window.confirm("Are you sure you want to delete this income?")) {
       try {
         await financeAPI.deleteIncome(id);
-        await fetchData();
+        await removeRow("incomes", id);
         addToast("Income deleted successfully! 🗑️", "info");
       } catch (error) {
         console.error("Error deleting income:", error);
@@ -101,7 +135,7 @@ const Dashboard = () => {
     if (window.confirm("Are you sure you want to delete this expense?")) {
       try {
         await financeAPI.deleteExpense(id);
-        await fetchData();
+        await removeRow("expenses", id);
         addToast("Expense deleted successfully! 🗑️", "info");
       } catch (error) {
         console.error("Error deleting expense:", error);
@@ -149,6 +183,8 @@ const Dashboard = () => {
           type="Income"
           onDelete={handleDeleteIncome}
           onAdd={() => setShowModal("income")}
+          onLoadMore={data.next_cursor?.incomes ? () => loadMore("incomes") : null}
+          loadingMore={loadingMore === "incomes"}
         />
 
         <TransactionList
@@ -158,6 +194,8 @@ const Dashboard = () => {
           type="Expense"
           onDelete={handleDeleteExpense}
           onAdd={() => setShowModal("expense")}
+          onLoadMore={data.next_cursor?.expenses ? () => loadMore("expenses") : null}
+          loadingMore={loadingMore === "expenses"}
         />
       </div>
 
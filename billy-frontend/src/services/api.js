@@ -69,10 +69,28 @@ export const authAPI = {
 },
 };
 
+// A fresh key per logical create: if the request is retried (by us or a
+// proxy), the backend replays the first response instead of inserting twice
+const idempotencyHeaders = () => ({ 'Idempotency-Key': crypto.randomUUID() });
+
 // Update financeAPI object:
 export const financeAPI = {
-  getDashboard: async () => {
-    const response = await api.get('/api/dashboard/');
+  // One page of each list; pass next_cursor.incomes / .expenses back as
+  // params.income_cursor / params.expense_cursor for the older rows
+  getDashboard: async (params = {}) => {
+    const response = await api.get('/api/dashboard/', { params });
+    return response.data;
+  },
+
+  // Incomes and expenses merged newest first; pass next_cursor back as params.cursor
+  getTransactions: async (params = {}) => {
+    const response = await api.get('/api/transactions/', { params });
+    return response.data;
+  },
+
+  // Only what changed since `since` (the `version` from the previous call)
+  getChanges: async (since) => {
+    const response = await api.get('/api/changes/', { params: { since } });
     return response.data;
   },
 
@@ -81,7 +99,7 @@ export const financeAPI = {
       amount,
       source,
       date,
-    });
+    }, { headers: idempotencyHeaders() });
     return response.data;
   },
 
@@ -94,7 +112,7 @@ export const financeAPI = {
       amount,
       description,
       date,
-    });
+    }, { headers: idempotencyHeaders() });
     return response.data;
   },
 
@@ -2,6 +2,8 @@
 Django settings for billydjango project.
 """
 
+import os
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -31,12 +33,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.InstrumentationMiddleware',  # no-op unless INSTRUMENTATION_ENABLED
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',  # ← MUST BE HERE
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',  # ← must come AFTER SessionMiddleware
+    'core.middleware.CachedAuthenticationMiddleware',  # ← must come AFTER SessionMiddleware
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -61,15 +64,152 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'billydjango.wsgi.application'
 
+# Serve check-auth, the dashboard and the add/delete endpoints from
+# core.async_views. Turn on (BILLY_ASYNC_VIEWS=1) when running under ASGI;
+# under WSGI each async view would need its own event loop per request.
+ASYNC_VIEWS = os.environ.get('BILLY_ASYNC_VIEWS') == '1'
+
 
 # Database
+# BILLY_DB_PROFILE=production selects the tuned SQLite setup: WAL so reads
+# don't wait on the writer, persistent connections, and the pragmas below,
+# which the backend runs (init_command) each time it opens a connection.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',  # durable at checkpoints; safe with WAL
+    'cache_size': -65536,  # negative means KiB: 64 MB page cache
+    'mmap_size': 268435456,  # 256 MB of the file read through mmap
+    'busy_timeout': 5000,  # ms to wait for a lock before "database is locked"
+    'temp_store': 'MEMORY',
+}
+
+# Every profile takes the write lock when a transaction starts, not halfway
+# through it: the ledger reads before it writes inside one transaction, and
+# a deferred transaction that has to upgrade its lock fails with "database
+# is locked" at once instead of queueing on the busy timeout
+SQLITE_OPTIONS = {'transaction_mode': 'IMMEDIATE'}
+
+DATABASE_PROFILES = {
+    'default': {'OPTIONS': {**SQLITE_OPTIONS}},
+    'production': {
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            **SQLITE_OPTIONS,
+        },
+    },
+}
+
+DB_PROFILE = os.environ.get('BILLY_DB_PROFILE', 'default')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        **DATABASE_PROFILES[DB_PROFILE],
     }
 }
 
+# Read replica
+# Set BILLY_REPLICA_DB to a second SQLite file to serve the read-only views
+# (@read_replica in core.routers) from it; `manage.py sync_replica` keeps
+# it a copy of the primary.
+REPLICA_DB = os.environ.get('BILLY_REPLICA_DB')
+if REPLICA_DB:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': REPLICA_DB,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# After a write, that user's reads stay on the primary this long; keep it
+# longer than the sync_replica interval
+REPLICA_STICKY_SECONDS = 30
+
+
+# Caches
+# 'responses' holds rendered per-user JSON (core.response_cache). It is
+# bounded and LRU-evicted; set BILLY_RESPONSE_CACHE=file to share it
+# between worker processes through a directory instead of process memory.
+RESPONSE_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'core.cache_backends.CountingLocMemCache',
+        'LOCATION': 'billy-responses',
+    },
+    'file': {
+        'BACKEND': 'core.cache_backends.CountingFileBasedCache',
+        'LOCATION': os.environ.get('BILLY_RESPONSE_CACHE_DIR', str(BASE_DIR / '.cache' / 'responses')),
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        **RESPONSE_CACHE_BACKENDS[os.environ.get('BILLY_RESPONSE_CACHE', 'locmem')],
+        'TIMEOUT': 600,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('BILLY_RESPONSE_CACHE_ENTRIES', 5000)),
+            'CULL_FREQUENCY': 10,  # evict the least recently used 10% when full
+        },
+    },
+    # Sessions (in the cache-backed session modes) and cached users for
+    # core.middleware. Shared between the workers like the pins below, or a
+    # logout or password change in one worker wouldn't reach the copies the
+    # others hold: on disk by default, or point BILLY_SESSION_CACHE_DIR
+    # somewhere all the workers see.
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('BILLY_SESSION_CACHE_DIR', str(BASE_DIR / '.cache' / 'sessions')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # core.routers' read-your-writes pins. A write is pinned in whichever
+    # worker handled it and read in any other, so this one must be shared:
+    # on disk by default, or point BILLY_REPLICA_PIN_DIR somewhere all the
+    # workers see.
+    'replica_pins': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('BILLY_REPLICA_PIN_DIR', str(BASE_DIR / '.cache' / 'replica-pins')),
+    },
+}
+
+
+# Request instrumentation (core.middleware.InstrumentationMiddleware):
+# query counts and DB/serialization/total time per request, sent as a
+# Server-Timing header, logged on 'core.timing' and kept as per-endpoint
+# histograms. Turn it on with BILLY_INSTRUMENTATION=1.
+INSTRUMENTATION_ENABLED = os.environ.get('BILLY_INSTRUMENTATION') == '1'
+INSTRUMENTATION_FLUSH_SECONDS = 10
+# One file of flushed histograms per worker process, read by `manage.py dump_timings`
+INSTRUMENTATION_DIR = os.environ.get('BILLY_TIMINGS_DIR', str(BASE_DIR / '.cache' / 'timings'))
+# Requests running more queries than this are logged as warnings (N+1s)
+INSTRUMENTATION_QUERY_WARNING = 25
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.timing': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+
+# How long a response stored under an Idempotency-Key can be replayed
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
+
+# Budget alerts go out by email from `manage.py deliver_budget_alerts`.
+# Printed to the console unless BILLY_EMAIL_BACKEND names another backend
+# (e.g. django.core.mail.backends.smtp.EmailBackend with the EMAIL_* settings)
+EMAIL_BACKEND = os.environ.get('BILLY_EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('BILLY_FROM_EMAIL', 'Billy <alerts@localhost>')
+
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -129,6 +269,7 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'idempotency-key',
 ]
 
 # Allow these methods
@@ -161,6 +302,21 @@ CSRF_COOKIE_HTTPONLY = False  # MUST be False for React to read it
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_AGE = 1209600  # 2 weeks
 
+# Where sessions live, from BILLY_SESSION_MODE: 'db' (the django_session
+# table), 'cached_db' (the table, read through the cache), 'cache' (cache
+# only) or 'signed_cookies' (in the cookie itself; nothing server-side)
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_ENGINE = SESSION_ENGINES[os.environ.get('BILLY_SESSION_MODE', 'db')]
+SESSION_CACHE_ALIAS = 'sessions'
+
+# How long core.middleware serves request.user from the cache without a query
+USER_CACHE_TIMEOUT = 300
+
 # CSRF settings
 CSRF_TRUSTED_ORIGINS = [
     'http://localhost:3000',
@@ -174,6 +330,16 @@ CSRF_TRUSTED_ORIGINS = [
 # AUTHENTICATION SETTINGS
 # ============================================
 
+# Log in with a username or an email address, hashing at most once
+AUTHENTICATION_BACKENDS = ['core.backends.UsernameOrEmailBackend']
+
+# Login attempts allowed per (tokens, seconds) before a 429, checked
+# before any password hashing (core.throttle)
+LOGIN_THROTTLE = {
+    'ip': (20, 60),
+    'account': (5, 60),
+}
+
 # Where to redirect unauthenticated users
 LOGIN_URL = 'core:login'
 
@@ -1,47 +1,146 @@
 from django.contrib import admin
-from .models import Income, Expense
+from django.contrib.auth.models import User
+from django.db.models import Q
+from . import budgets, recurring, search
+from .changelist import LargeTableAdmin
+from .forms import BudgetForm, RecurringRuleForm
+from .models import Income, Expense, Budget, BudgetAlert, RecurringRule, UserSummary
+
+
+class FullTextSearchMixin:
+    """
+    Admin search through the core_search FTS5 index instead of LIKE '%term%'
+    scans over the whole table. Usernames are still matched with icontains,
+    on the (much smaller) user table.
+    """
+    def get_search_results(self, request, queryset, search_term):
+        if not search.terms(search_term):
+            return super().get_search_results(request, queryset, search_term)
+        users = User.objects.filter(username__icontains=search_term.strip())
+        return queryset.filter(search.matching(self.model, search_term) | Q(user__in=users)), False
 
 
 @admin.register(Income)
-class IncomeAdmin(admin.ModelAdmin):
+class IncomeAdmin(FullTextSearchMixin, LargeTableAdmin):
     """
     Customize how Income appears in Django admin
     """
     list_display = ['source', 'amount', 'date', 'user', 'created_at']
     # Columns shown in the list view
     
-    list_filter = ['date', 'user', 'source']
-    # Sidebar filters for easy searching
+    # list_filter (user autocomplete, year/month drill-down), keyset paging
+    # and list_select_related come from LargeTableAdmin
     
     search_fields = ['source', 'user__username']
-    # Search by source or username
-    
-    date_hierarchy = 'date'
-    # Date navigation at the top
-    
-    ordering = ['-date', '-created_at']
-    # Show newest first
+    # Search by source or username (full-text, see FullTextSearchMixin)
     
     readonly_fields = ['created_at']
     # Can't edit system timestamp
 
 
 @admin.register(Expense)
-class ExpenseAdmin(admin.ModelAdmin):
+class ExpenseAdmin(FullTextSearchMixin, LargeTableAdmin):
     """
     Customize how Expense appears in Django admin
     """
     list_display = ['description', 'amount', 'date', 'user', 'created_at']
     
-    list_filter = ['date', 'user']
-    
     search_fields = ['description', 'user__username']
     
-    date_hierarchy = 'date'
+    readonly_fields = ['created_at']
+
+
+@admin.register(RecurringRule)
+class RecurringRuleAdmin(admin.ModelAdmin):
+    """
+    Rules that core.recurring turns into incomes/expenses
+    """
+    form = RecurringRuleForm
+    
+    fields = ['user', 'kind', 'amount', 'label', 'frequency', 'interval', 'start_date', 'end_date', 'next_due',
+              'created_at']
     
-    ordering = ['-date', '-created_at']
+    list_display = ['label', 'kind', 'amount', 'frequency', 'interval', 'next_due', 'end_date', 'user']
     
-    readonly_fields = ['created_at']
+    list_filter = ['kind', 'frequency']
+    
+    search_fields = ['label', 'user__username']
+    
+    list_select_related = ['user']
+    
+    autocomplete_fields = ['user']
+    
+    readonly_fields = ['next_due', 'created_at']
+    # next_due is moved by the scheduler, and recomputed when the schedule is edited
+    
+    def save_model(self, request, obj, form, change):
+        if change and set(form.changed_data) & set(recurring.SCHEDULE_FIELDS):
+            recurring.reschedule(obj)
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(Budget)
+class BudgetAdmin(admin.ModelAdmin):
+    """
+    Monthly budgets; core.budgets keeps their spend counters
+    """
+    form = BudgetForm
+    
+    fields = ['user', 'category', 'amount']
+    
+    list_display = ['user', 'category', 'amount', 'created_at']
+    
+    search_fields = ['category', 'user__username']
+    
+    list_select_related = ['user']
+    
+    autocomplete_fields = ['user']
+    
+    def get_readonly_fields(self, request, obj=None):
+        # The counters belong to the user and category; make a new budget instead
+        return ['user', 'category'] if obj is not None else []
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        budgets.refresh(obj)
+
+
+@admin.register(BudgetAlert)
+class BudgetAlertAdmin(admin.ModelAdmin):
+    """
+    Read-only view of the alert queue; deliver_budget_alerts sends it
+    """
+    list_display = ['budget', 'user', 'month', 'threshold', 'spent', 'limit', 'created_at', 'delivered_at']
+    
+    list_filter = ['threshold']
+    
+    search_fields = ['user__username']
+    
+    list_select_related = ['budget', 'user']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(UserSummary)
+class UserSummaryAdmin(admin.ModelAdmin):
+    """
+    Read-only view of the running totals maintained by core.ledger
+    """
+    list_display = ['user', 'total_income', 'total_expenses', 'income_count', 'expense_count', 'updated_at']
+    
+    search_fields = ['user__username']
+    
+    list_select_related = ['user']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 """
@@ -57,15 +156,16 @@ WHAT THIS DOES:
 
 3. list_filter:
    - Sidebar filters
-   - Filter by date, user, etc.
+   - Filter by user (autocomplete) and year/month (from MonthlyRollup)
 
 4. search_fields:
    - Search box at the top
    - Search by source/description or username
+   - FullTextSearchMixin answers it from the FTS5 index (core.search)
 
-5. date_hierarchy:
-   - Date navigation breadcrumbs
-   - Click year → month → day
+5. LargeTableAdmin (core/changelist.py):
+   - Newest-first pages with "Older" links instead of page numbers
+   - Counts from the ledger tables instead of COUNT(*) over everything
 
 6. readonly_fields:
    - Can't edit created_at (it's auto-generated)
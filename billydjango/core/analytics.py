@@ -0,0 +1,88 @@
+"""
+Time-series queries over MonthlyRollup.
+
+Everything here reads rollup rows only, so the cost of a request grows with
+the number of months (and buckets) asked for, never with the number of
+underlying Income/Expense rows.
+"""
+from datetime import date
+
+from django.db.models import Sum
+
+from .models import MonthlyRollup
+
+MAX_MONTHS = 120
+
+
+def parse_month(value):
+    """'2026-02' -> date(2026, 2, 1); raises ValueError on anything else"""
+    year, month = value.split('-')
+    return date(int(year), int(month), 1)
+
+
+def add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_range(start, end):
+    """Every first-of-month from start to end inclusive"""
+    # Counted by month index rather than stepping with add_months(), which
+    # would step past date.max after December 9999
+    first, last = start.year * 12 + start.month - 1, end.year * 12 + end.month - 1
+    return [date(index // 12, index % 12 + 1, 1) for index in range(first, last + 1)]
+
+
+def rollups_for(user, start, end, kind=None, bucket=None):
+    rows = MonthlyRollup.objects.filter(user=user, month__gte=start, month__lte=end)
+    if kind:
+        rows = rows.filter(kind=kind)
+    if bucket:
+        rows = rows.filter(bucket=bucket)
+    return rows.order_by()
+
+
+def monthly_series(user, start, end, kind=None, bucket=None):
+    """
+    One point per month in [start, end] with income and expense totals.
+
+    Months without activity are filled in with zeros so charts don't have
+    to guess.
+    """
+    sums = {}
+    grouped = rollups_for(user, start, end, kind, bucket).values('month', 'kind').annotate(
+        total=Sum('total'), n=Sum('count')
+    )
+    for row in grouped:
+        sums[(row['month'], row['kind'])] = row
+
+    series = []
+    for month in month_range(start, end):
+        income = sums.get((month, MonthlyRollup.INCOME), {})
+        expense = sums.get((month, MonthlyRollup.EXPENSE), {})
+        series.append({
+            'month': month.strftime('%Y-%m'),
+            'income': float(income.get('total') or 0),
+            'expenses': float(expense.get('total') or 0),
+            'income_count': income.get('n') or 0,
+            'expense_count': expense.get('n') or 0,
+        })
+    return series
+
+
+def bucket_breakdown(user, start, end, kind=None):
+    """Totals per source/description bucket over the whole range, largest first"""
+    grouped = (
+        rollups_for(user, start, end, kind)
+        .values('kind', 'bucket')
+        .annotate(total=Sum('total'), n=Sum('count'))
+        .order_by('kind', '-total')
+    )
+    breakdown = {MonthlyRollup.INCOME: [], MonthlyRollup.EXPENSE: []}
+    for row in grouped:
+        breakdown[row['kind']].append({
+            'bucket': row['bucket'],
+            'total': float(row['total']),
+            'count': row['n'],
+        })
+    return breakdown
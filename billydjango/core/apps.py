@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        # Connect the receivers that keep UserSummary in sync
+        from . import signals  # noqa: F401
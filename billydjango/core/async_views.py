@@ -0,0 +1,183 @@
+"""
+Async versions of the busiest API views, mounted in place of the ones in
+core.views when ASYNC_VIEWS is on (see core.urls) and the project is
+served through ASGI. Requests and responses are the same as core.views.
+
+Reads go through the async ORM, so a request that is waiting on the
+database or on a slow client doesn't hold a worker thread. Writes still
+run as one synchronous unit through sync_to_async(): a row and its ledger
+bookkeeping (core.signals) must commit in one transaction, and Django
+transactions only work in sync code.
+"""
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.shortcuts import get_object_or_404
+from django.views.decorators.cache import cache_control
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_http_methods
+
+from . import conditional, events, ledger, serializers, timing
+from .idempotency import idempotent
+from .models import Income, Expense
+from .pagination import InvalidCursor, parse_limit
+from .response_cache import cache_per_user
+from .routers import read_replica
+
+
+def preload_user(view):
+    """Resolve request.user asynchronously before sync code (ETag functions) reads it"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        await request.auser()
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+@sync_to_async
+def _create(model, **fields):
+    with transaction.atomic():
+        return model.objects.create(**fields)
+
+
+@sync_to_async
+def _delete_owned(model, pk, user):
+    with transaction.atomic():
+        get_object_or_404(model, id=pk, user=user).delete()
+
+
+@preload_user
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=conditional.check_auth_etag)
+async def check_auth(request):
+    """Essential for React to check if session is valid and get CSRF token"""
+    get_token(request)
+    user = await request.auser()
+    if user.is_authenticated:
+        return JsonResponse({
+            'isAuthenticated': True,
+            'user': {
+                'username': user.username,
+                'first_name': user.first_name,
+            }
+        })
+    return JsonResponse({'isAuthenticated': False}, status=401)
+
+
+@login_required
+@read_replica
+@conditional.preload_version
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=conditional.versioned_etag('dashboard'))
+@cache_per_user('dashboard')
+async def dashboard_api(request):
+    """core.views.dashboard_api, with the page and summary read asynchronously"""
+    fmt = request.GET.get('format') or serializers.ROWS
+    if fmt not in serializers.FORMATS:
+        return JsonResponse({'error': 'format must be rows or columnar.'}, status=400)
+    user = await request.auser()
+    try:
+        limit = parse_limit(request.GET.get('limit'))
+        incomes, next_income = await serializers.apage(
+            Income.objects.filter(user=user), ['id', 'amount', 'source', 'date'],
+            request.GET.get('income_cursor'), limit,
+        )
+        expenses, next_expense = await serializers.apage(
+            Expense.objects.filter(user=user), ['id', 'amount', 'description', 'date'],
+            request.GET.get('expense_cursor'), limit,
+        )
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    summary = await ledger.aget_summary(user)
+
+    with timing.span('serialize'):
+        response = serializers.json_response({
+            'format': fmt,
+            'incomes': incomes,
+            'expenses': expenses,
+            'next_cursor': {'incomes': next_income, 'expenses': next_expense},
+            'total_income': float(summary.total_income),
+            'total_expenses': float(summary.total_expenses),
+            'balance': float(summary.balance),
+            'user': {'username': user.username, 'first_name': user.first_name}
+        }, fmt)
+    return response
+
+
+@csrf_exempt
+@login_required
+@require_http_methods(["POST"])
+@idempotent
+async def add_income(request):
+    try:
+        data = json.loads(request.body)
+        income = await _create(
+            Income,
+            user=await request.auser(),
+            amount=data.get('amount'),
+            source=data.get('source'),
+            date=data.get('date')
+        )
+        return JsonResponse({'success': True, 'id': income.id}, status=201)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+
+@csrf_exempt
+@login_required
+@require_http_methods(["POST"])
+@idempotent
+async def add_expense(request):
+    try:
+        data = json.loads(request.body)
+        expense = await _create(
+            Expense,
+            user=await request.auser(),
+            amount=data.get('amount'),
+            description=data.get('description'),
+            date=data.get('date')
+        )
+        return JsonResponse({'success': True, 'id': expense.id}, status=201)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+
+@csrf_exempt
+@login_required
+async def delete_income(request, income_id):
+    await _delete_owned(Income, income_id, await request.auser())
+    return JsonResponse({'success': True})
+
+
+@csrf_exempt
+@login_required
+async def delete_expense(request, expense_id):
+    await _delete_owned(Expense, expense_id, await request.auser())
+    return JsonResponse({'success': True})
+
+
+@login_required
+async def events_api(request):
+    """
+    Server-Sent Events stream of the user's changes, so the dashboard can
+    stop polling. Each 'changes' event is an /api/changes/ payload; resume
+    with the Last-Event-ID header (sent by EventSource on reconnect) or
+    ?since=<version>.
+    """
+    since = request.headers.get('Last-Event-ID') or request.GET.get('since')
+    try:
+        since = int(since) if since else None
+    except ValueError:
+        return JsonResponse({'error': 'since must be an integer.'}, status=400)
+    response = StreamingHttpResponse(
+        events.stream(await request.auser(), since), content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let nginx hold events back
+    return response
@@ -0,0 +1,50 @@
+"""
+Authentication backend that accepts a username or an email address.
+
+The user is found with a single query, so whichever identifier is given,
+a login attempt runs exactly one password hash: against the matched
+user's hash, or against a dummy one when nobody matched, so response
+times don't reveal which accounts exist.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import Case, IntegerField, Q, Value, When
+
+UserModel = get_user_model()
+
+
+class UsernameOrEmailBackend(ModelBackend):
+    def find_user(self, identifier):
+        """The user with this username or, failing that, the only one with this email"""
+        if '@' not in identifier:
+            return UserModel._default_manager.filter(username=identifier).first()
+
+        # An exact username match wins; otherwise the email has to be unambiguous
+        candidates = list(
+            UserModel._default_manager
+            .filter(Q(username=identifier) | Q(email=identifier))
+            .order_by(Case(When(username=identifier, then=Value(0)), default=Value(1), output_field=IntegerField()))
+            [:2]
+        )
+        if candidates and (candidates[0].username == identifier or len(candidates) == 1):
+            return candidates[0]
+        return None
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        user = self.find_user(username)
+        if user is None:
+            # Run the hasher anyway so a miss costs as much as a wrong password
+            UserModel().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        return await sync_to_async(self.authenticate)(request, username, password, **kwargs)
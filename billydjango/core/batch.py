@@ -0,0 +1,117 @@
+"""
+Apply many creates and deletes in one request and one transaction.
+
+The whole batch is validated up front - creates with the same model forms
+as the single-row views, deletes by checking ownership with one query per
+type - and nothing is written unless every operation is valid. Writes are
+then set-based: one bulk_create and one filtered delete() per type, with
+the ledger bookkeeping grouped by ledger.deferred().
+
+An operation looks like
+    {"op": "create", "type": "income", "amount": "12.50", "source": "Gift", "date": "2026-02-01"}
+    {"op": "delete", "type": "expense", "id": 42}
+"""
+from django.db import transaction
+
+from . import importer, ledger, search
+
+MAX_OPERATIONS = 1000
+
+
+class BatchError(ValueError):
+    """The request body isn't a usable list of operations"""
+
+
+def _error(field, message):
+    """Same shape as form.errors.get_json_data(), so clients parse one format"""
+    return {field: [{'message': message, 'code': 'invalid'}]}
+
+
+def _parse(operations, user):
+    """
+    Validate every operation; returns (creates, deletes, results).
+
+    creates is a list of (index, unsaved instance); deletes maps kind to
+    {id: index}. results has one dict per operation, with 'errors' set on
+    the invalid ones.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise BatchError("'operations' must be a non-empty list.")
+    if len(operations) > MAX_OPERATIONS:
+        raise BatchError(f"At most {MAX_OPERATIONS} operations per batch.")
+
+    creates, deletes, results = [], {ledger.INCOME: {}, ledger.EXPENSE: {}}, []
+    for index, operation in enumerate(operations):
+        result = {'index': index}
+        results.append(result)
+        if not isinstance(operation, dict):
+            result['errors'] = _error('__all__', "Operation must be an object.")
+            continue
+
+        op, kind = operation.get('op'), operation.get('type')
+        result['op'] = op
+        if kind not in (ledger.INCOME, ledger.EXPENSE):
+            result['errors'] = _error('type', "Must be 'income' or 'expense'.")
+        elif op == 'create':
+            instance, errors = importer.build_instance(operation, user)
+            if errors:
+                result['errors'] = errors
+            else:
+                creates.append((index, instance))
+        elif op == 'delete':
+            pk = operation.get('id')
+            if not isinstance(pk, int) or isinstance(pk, bool):
+                result['errors'] = _error('id', "Must be an integer.")
+            elif pk in deletes[kind]:
+                result['errors'] = _error('id', "Deleted twice in the same batch.")
+            else:
+                deletes[kind][pk] = index
+        else:
+            result['errors'] = _error('op', "Must be 'create' or 'delete'.")
+
+    # Ownership check for all deletes of a type in one query
+    for kind, ids in deletes.items():
+        if not ids:
+            continue
+        found = set(
+            ledger.MODELS[kind].objects.filter(user=user, id__in=list(ids)).values_list('id', flat=True)
+        )
+        for pk, index in list(ids.items()):
+            if pk not in found:
+                results[index]['errors'] = _error('id', "Not found.")
+                del ids[pk]
+
+    return creates, deletes, results
+
+
+def run_batch(operations, user):
+    """
+    Validate and apply a batch. Returns (ok, results); when ok is False
+    nothing was written and the results explain which operations failed.
+    """
+    creates, deletes, results = _parse(operations, user)
+    if any('errors' in result for result in results):
+        for result in results:
+            result.setdefault('status', 'invalid' if 'errors' in result else 'skipped')
+        return False, results
+
+    instances = [instance for _, instance in creates]
+    with transaction.atomic(), ledger.deferred():
+        ledger.assign_versions(instances)
+        for model in ledger.MODELS.values():
+            rows = [instance for instance in instances if isinstance(instance, model)]
+            if rows:
+                model.objects.bulk_create(rows)
+        ledger.apply([ledger.entry_for(instance) for instance in instances])
+        search.index(instances)
+
+        for kind, ids in deletes.items():
+            if ids:
+                ledger.MODELS[kind].objects.filter(user=user, id__in=list(ids)).delete()
+
+    for index, instance in creates:
+        results[index].update(status='created', id=instance.pk)
+    for ids in deletes.values():
+        for pk, index in ids.items():
+            results[index].update(status='deleted', id=pk)
+    return True, results
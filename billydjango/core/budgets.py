@@ -0,0 +1,245 @@
+"""
+Monthly budgets, checked incrementally.
+
+Every expense write already goes through ledger.apply(), which groups it by
+(user, month, bucket) and sends ledger.rollups_applied. apply() here turns
+that into one UPDATE of a BudgetSpend counter per budget and month touched
+- the user's overall budget and the one for the expense's category, if
+they have them - and compares the new total with the thresholds. A write
+never re-sums the month's expenses: a counter is only computed from
+MonthlyRollup the first time its budget sees that month.
+
+Crossing a threshold queues a BudgetAlert in the writer's transaction, so
+an alert exists exactly when the write that caused it committed;
+deliver() sends them later. Spending that drops back below a threshold
+(a delete or an edit) lowers the counter's level without an alert, so
+crossing it again alerts again.
+
+reconcile() recomputes the counters in bulk from the rollups, to repair
+them after writes that bypass the ledger (seed_data) or a rollup rebuild.
+Like the writes, it leaves months without a counter alone (apart from the
+current one): their counter is summed from the rollups when it's needed.
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Sum
+from django.utils import timezone
+
+from . import ledger
+from .models import Budget, BudgetAlert, BudgetSpend, MonthlyRollup
+
+# Percent of the budget; each one alerts once per budget and month
+THRESHOLDS = (80, 100)
+DELIVERY_BATCH_SIZE = 100
+
+_cent = Decimal('0.01')
+
+
+def level(spent, limit):
+    """The highest threshold `spent` has reached; 0 for none"""
+    reached = 0
+    for threshold in THRESHOLDS:
+        if spent * 100 >= limit * threshold:
+            reached = threshold
+    return reached
+
+
+def spent_from_rollups(budget, month):
+    """A budget's spend for one month, summed from the rollups"""
+    rollups = MonthlyRollup.objects.filter(user_id=budget.user_id, month=month, kind=ledger.EXPENSE)
+    if budget.category:
+        rollups = rollups.filter(bucket=budget.category)
+    # SQLite sums come back without the decimal places
+    return (rollups.aggregate(total=Sum('total'))['total'] or Decimal(0)).quantize(_cent)
+
+
+# ============================================
+# Incremental updates
+# ============================================
+
+def apply(changes):
+    """Fold one ledger.rollups_applied batch of changes into the counters"""
+    spending = defaultdict(Decimal)
+    for (user_id, month, kind, bucket), (total, _) in changes.items():
+        if kind == ledger.EXPENSE and total:
+            spending[(user_id, month, bucket)] += total
+    if not spending:
+        return
+
+    # One indexed lookup, however many rows the batch had
+    budgets = defaultdict(dict)
+    for budget in Budget.objects.filter(user_id__in={user_id for user_id, _, _ in spending}):
+        budgets[budget.user_id][budget.category] = budget
+
+    deltas = defaultdict(Decimal)
+    for (user_id, month, bucket), total in spending.items():
+        for category in {'', bucket}:
+            budget = budgets[user_id].get(category)
+            if budget is not None:
+                deltas[(budget, month)] += total
+
+    for (budget, month), delta in deltas.items():
+        counter = BudgetSpend.objects.filter(budget=budget, month=month)
+        if not counter.update(spent=F('spent') + delta):
+            # First write of the month for this budget - the rollups
+            # already include it
+            BudgetSpend.objects.create(budget=budget, month=month, spent=spent_from_rollups(budget, month))
+        spent, alerted = counter.values_list('spent', 'alerted').get()
+        _check(budget, month, spent, alerted)
+
+
+def _check(budget, month, spent, alerted):
+    """Move the counter's level to match `spent`; queue an alert if it went up"""
+    reached = level(spent, budget.amount)
+    if reached == alerted:
+        return
+    # Conditional on the level read, so of two writers crossing the same
+    # threshold only one queues the alert
+    moved = BudgetSpend.objects.filter(budget=budget, month=month, alerted=alerted).update(alerted=reached)
+    if moved and reached > alerted:
+        BudgetAlert.objects.create(
+            user_id=budget.user_id, budget=budget, month=month, threshold=reached, spent=spent, limit=budget.amount
+        )
+
+
+def refresh(budget, day=None):
+    """
+    Recompute a budget's counter for the month of `day` (default: today)
+    and check it - after the budget is created or its amount changes. The
+    budget's other months are re-levelled against the new amount without
+    alerts, as reconcile() would.
+    """
+    month = ledger.month_of(day or date.today())
+    with transaction.atomic():
+        spent = spent_from_rollups(budget, month)
+        counter, _ = BudgetSpend.objects.update_or_create(budget=budget, month=month, defaults={'spent': spent})
+        _check(budget, month, spent, counter.alerted)
+
+        others = []
+        for other in BudgetSpend.objects.filter(budget=budget).exclude(month=month):
+            reached = level(other.spent, budget.amount)
+            if other.alerted != reached:
+                other.alerted = reached
+                others.append(other)
+        BudgetSpend.objects.bulk_update(others, ['alerted'])
+    return spent
+
+
+# ============================================
+# Bulk repair
+# ============================================
+
+def compute_spend(user_ids=None, months=None):
+    """{(budget_id, month): spent} from the rollups, for every budget month with expenses"""
+    budgets = Budget.objects.all()
+    rollups = MonthlyRollup.objects.filter(kind=ledger.EXPENSE)
+    if user_ids is not None:
+        budgets = budgets.filter(user_id__in=user_ids)
+        rollups = rollups.filter(user_id__in=user_ids)
+    if months is not None:
+        rollups = rollups.filter(month__in=months)
+    budget_ids = {(user_id, category): pk for pk, user_id, category in budgets.values_list('id', 'user_id', 'category')}
+
+    overall = rollups.filter(
+        Exists(Budget.objects.filter(user=OuterRef('user'), category=''))
+    ).values('user_id', 'month').annotate(spent=Sum('total')).values_list('user_id', 'month', 'spent')
+    by_category = rollups.filter(
+        Exists(Budget.objects.filter(user=OuterRef('user'), category=OuterRef('bucket')))
+    ).values_list('user_id', 'month', 'bucket', 'total')
+
+    spend = {(budget_ids[(user_id, '')], month): spent.quantize(_cent) for user_id, month, spent in overall}
+    for user_id, month, bucket, total in by_category:
+        spend[(budget_ids[(user_id, bucket)], month)] = total
+    return spend
+
+
+def reconcile(user_ids=None, months=None, save=True):
+    """
+    Recompute the BudgetSpend counters from the rollups, in bulk; returns
+    the corrected counters (unsaved when save=False).
+
+    Covers the months that have counters, and the current month. Levels
+    follow the corrected totals. Only the current month's crossings queue
+    alerts - older months are history by now.
+    """
+    this_month = ledger.month_of(date.today())
+    with transaction.atomic():
+        expected = compute_spend(user_ids, months)
+        counters = BudgetSpend.objects.all()
+        budgets = Budget.objects.all()
+        if user_ids is not None:
+            counters = counters.filter(budget__user_id__in=user_ids)
+            budgets = budgets.filter(user_id__in=user_ids)
+        if months is not None:
+            counters = counters.filter(month__in=months)
+        stored = {(counter.budget_id, counter.month): counter for counter in counters}
+        budgets = {pk: (user_id, amount) for pk, user_id, amount in budgets.values_list('id', 'user_id', 'amount')}
+
+        corrected, alerts = [], []
+        current = {key for key in expected if key[1] == this_month}
+        for budget_id, month in stored.keys() | current:
+            user_id, limit = budgets[budget_id]
+            spent = expected.get((budget_id, month), Decimal(0))
+            counter = stored.get((budget_id, month))
+            reached = level(spent, limit)
+            if counter is None and not spent:
+                continue
+            if counter is not None and counter.spent == spent and counter.alerted == reached:
+                continue
+            corrected.append(BudgetSpend(budget_id=budget_id, month=month, spent=spent, alerted=reached))
+            if reached > (counter.alerted if counter else 0) and month == this_month:
+                alerts.append(BudgetAlert(
+                    user_id=user_id, budget_id=budget_id, month=month, threshold=reached, spent=spent, limit=limit,
+                ))
+
+        if save:
+            BudgetSpend.objects.bulk_create(
+                corrected, update_conflicts=True, unique_fields=['budget', 'month'],
+                update_fields=['spent', 'alerted'], batch_size=1000,
+            )
+            BudgetAlert.objects.bulk_create(alerts, batch_size=1000)
+    return corrected
+
+
+# ============================================
+# Delivery
+# ============================================
+
+def message(alert):
+    """(subject, body) for an alert's email"""
+    name = alert.budget.category or 'overall'
+    month = f"{alert.month:%B %Y}"
+    if alert.threshold >= 100:
+        subject = f"You're over your {name} budget for {month}"
+    else:
+        subject = f"You've used {alert.threshold}% of your {name} budget for {month}"
+    body = f"Hi {alert.user.first_name or alert.user.username},\n\n" \
+           f"You've spent ${alert.spent} of your ${alert.limit} {name} budget for {month}.\n"
+    return subject, body
+
+
+def deliver(batch_size=DELIVERY_BATCH_SIZE):
+    """
+    Email the oldest pending alerts, up to batch_size, over one connection
+    and mark them delivered; returns how many were handled (0 once the
+    queue is empty). Users without an email address only see theirs in
+    /api/budgets/. A failed send leaves the batch pending for the next try,
+    so run one deliverer at a time.
+    """
+    alerts = list(
+        BudgetAlert.objects.filter(delivered_at__isnull=True)
+        .select_related('user', 'budget').order_by('id')[:batch_size]
+    )
+    if not alerts:
+        return 0
+    send_mass_mail(
+        [(*message(alert), settings.DEFAULT_FROM_EMAIL, [alert.user.email]) for alert in alerts if alert.user.email],
+        fail_silently=False,
+    )
+    BudgetAlert.objects.filter(pk__in=[alert.pk for alert in alerts]).update(delivered_at=timezone.now())
+    return len(alerts)
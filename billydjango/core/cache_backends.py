@@ -0,0 +1,131 @@
+"""
+Django cache backends that count hits, misses, stores and evictions.
+
+Both are drop-in replacements for the stock local-memory and file-based
+backends (so they need no external service) with LRU eviction once
+MAX_ENTRIES is reached. Counters are per process and per cache LOCATION;
+read them with stats_for(alias).
+"""
+import os
+import threading
+from dataclasses import dataclass, field
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+
+_MISSING = object()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    sets: int = 0
+    evictions: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self):
+        data = {'hits': self.hits, 'misses': self.misses, 'sets': self.sets, 'evictions': self.evictions}
+        lookups = self.hits + self.misses
+        data['hit_rate'] = round(self.hits / lookups, 4) if lookups else None
+        return data
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _stats_for_location(location):
+    with _stats_lock:
+        return _stats.setdefault(location, CacheStats())
+
+
+def stats_for(alias):
+    """Counters for the cache configured as CACHES[alias], plus its size limit"""
+    cache = caches[alias]
+    stats = getattr(cache, 'stats', None)
+    data = stats.as_dict() if stats else {}
+    data['backend'] = f'{type(cache).__module__}.{type(cache).__name__}'
+    data['max_entries'] = cache._max_entries
+    return data
+
+
+class StatsMixin:
+    """Counts lookups and stores; backends report evictions from _cull()"""
+
+    @property
+    def stats(self):
+        return _stats_for_location(self._stats_location)
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        if value is _MISSING:
+            self.stats.add(misses=1)
+            return default
+        self.stats.add(hits=1)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        super().set(key, value, timeout, version)
+        self.stats.add(sets=1)
+
+
+class CountingLocMemCache(StatsMixin, LocMemCache):
+    """
+    LocMemCache already keeps entries in LRU order (get() moves a key to the
+    front) and culls from the back, so only the counting is added here.
+    """
+
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        self._stats_location = f'locmem:{name}'
+
+    def _cull(self):
+        before = len(self._cache)
+        super()._cull()
+        self.stats.add(evictions=before - len(self._cache))
+
+
+class CountingFileBasedCache(StatsMixin, FileBasedCache):
+    """
+    FileBasedCache evicts a random sample when full; this version evicts
+    the least recently used files instead (hits refresh the file's mtime).
+    """
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self._stats_location = f'file:{self._dir}'
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        if value is _MISSING:
+            return default
+        try:
+            os.utime(self._key_to_file(key, version))
+        except OSError:
+            pass
+        return value
+
+    def _cull(self):
+        filelist = self._list_cache_files()
+        if len(filelist) < self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            doomed = filelist
+        else:
+            def mtime(path):
+                try:
+                    return os.path.getmtime(path)
+                except OSError:
+                    return 0
+            doomed = sorted(filelist, key=mtime)[:len(filelist) // self._cull_frequency]
+        for fname in doomed:
+            self._delete(fname)
+        self.stats.add(evictions=len(doomed))
@@ -0,0 +1,214 @@
+"""
+Admin changelists that stay fast on very large Income/Expense tables.
+
+The stock changelist counts the whole filtered table on every page, reads
+pages with OFFSET, lists every user in the sidebar and builds its date
+drill-down from DISTINCT queries over the raw rows. LargeTableAdmin swaps
+each of those for something that doesn't grow with the table:
+
+- pages are keyset-paginated newest first on (date, created_at, id), the
+  dashboard's order (core.pagination) - "Older" links carry a cursor.
+  Filtered to a user, any page is one range read of the user/date index
+  (unfiltered, one pass over the table keeping the newest page's rows);
+- the result count comes from the ledger's UserSummary/MonthlyRollup rows
+  when only the user and month filters are active, and from a COUNT capped
+  at COUNT_CAP otherwise;
+- the user filter is an autocomplete box backed by the admin's own
+  autocomplete view;
+- the year/month drill-down lists months from MonthlyRollup.
+"""
+from datetime import date
+
+from django import forms
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.db.models import Max, Min, Sum
+
+from . import analytics, ledger
+from .models import MonthlyRollup, UserSummary
+from .pagination import ORDERING, InvalidCursor, paginate
+
+CURSOR_VAR = 'after'
+USER_VAR = 'user'
+PERIOD_VAR = 'period'
+COUNT_CAP = 10_000
+
+
+def parse_period(value):
+    """'2024' or '2024-03' -> (first day, first day after); raises ValueError otherwise"""
+    if '-' in value:
+        start = analytics.parse_month(value)
+        return start, analytics.add_months(start, 1)
+    year = int(value)
+    return date(year, 1, 1), date(year + 1, 1, 1)
+
+
+def _last(params, name):
+    values = params.get(name)
+    return values[-1] if values else None
+
+
+class UserAutocompleteFilter(admin.SimpleListFilter):
+    """Filter by user through an autocomplete box instead of listing every user"""
+    title = 'user'
+    parameter_name = USER_VAR
+    template = 'admin/core/user_autocomplete_filter.html'
+
+    def __init__(self, request, params, model, model_admin):
+        super().__init__(request, params, model, model_admin)
+        # Checked before the widget looks the user up by it
+        if self.value() is not None and not self.value().isdigit():
+            raise IncorrectLookupParameters("user must be an id.")
+        user_field = model._meta.get_field('user')
+        # The admin's autocomplete widget, bound to a form field for its choices
+        field = forms.ModelChoiceField(
+            user_field.remote_field.model.objects.all(), required=False,
+            widget=AutocompleteSelect(user_field, model_admin.admin_site),
+        )
+        self.widget = field.widget.render(USER_VAR, self.value(), attrs={'id': 'changelist-filter-user'})
+
+    def has_output(self):
+        return True
+
+    def lookups(self, request, model_admin):
+        # The autocomplete box supplies the choices; nothing to list here
+        return []
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+        return queryset.filter(user_id=int(self.value()))
+
+
+class RollupMonthFilter(admin.SimpleListFilter):
+    """
+    Year, then month drill-down. Choices come from MonthlyRollup (one row
+    per user, month and bucket) rather than DISTINCT dates over the rows.
+    """
+    title = 'month'
+    parameter_name = PERIOD_VAR
+
+    def __init__(self, request, params, model, model_admin):
+        super().__init__(request, params, model, model_admin)
+        # Here rather than in queryset(), which isn't called while there are
+        # no months to list
+        if self.value() is not None:
+            try:
+                parse_period(self.value())
+            except ValueError:
+                raise IncorrectLookupParameters("period must look like YYYY or YYYY-MM.")
+
+    def lookups(self, request, model_admin):
+        rollups = MonthlyRollup.objects.filter(kind=ledger.kind_of(model_admin.model))
+        user_id = request.GET.get(USER_VAR)
+        if user_id and user_id.isdigit():
+            rollups = rollups.filter(user_id=user_id)
+
+        bounds = rollups.aggregate(first=Min('month'), last=Max('month'))
+        if bounds['first'] is None:
+            return []
+        try:
+            selected_year = parse_period(self.value())[0].year if self.value() else None
+        except ValueError:
+            selected_year = None
+
+        choices = []
+        for year in range(bounds['last'].year, bounds['first'].year - 1, -1):
+            choices.append((str(year), str(year)))
+            if year == selected_year:
+                months = (
+                    rollups.filter(month__gte=date(year, 1, 1), month__lt=date(year + 1, 1, 1))
+                    .order_by('-month').values_list('month', flat=True).distinct()
+                )
+                choices += [(f'{month:%Y-%m}', f'{month:%B %Y}') for month in months]
+        return choices
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+        start, end = parse_period(self.value())
+        return queryset.filter(date__gte=start, date__lt=end)
+
+
+class KeysetChangeList(ChangeList):
+    """Newest-first keyset pages; see the module docstring"""
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Filter, search and "newest" links all start again from the top
+        new_params = new_params or {}
+        if CURSOR_VAR not in new_params:
+            remove = [*(remove or []), CURSOR_VAR]
+        return super().get_query_string(new_params, remove)
+
+    def get_ordering(self, request, queryset):
+        return list(ORDERING)
+
+    def get_results(self, request):
+        self.cursor = request.GET.get(CURSOR_VAR) or None
+        try:
+            self.result_list, self.next_cursor = paginate(self.queryset, self.cursor, self.list_per_page)
+        except InvalidCursor:
+            raise IncorrectLookupParameters
+        self.result_count, self.result_count_exceeds_cap = self.estimate_count()
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = False
+        self.paginator = None
+
+    def estimate_count(self):
+        """(count, capped) for the filtered rows, without counting the table"""
+        params = self.get_filters_params()
+        if self.query or set(params) - {USER_VAR, PERIOD_VAR}:
+            count = self.queryset.order_by()[:COUNT_CAP + 1].count()
+            return min(count, COUNT_CAP), count > COUNT_CAP
+
+        kind = ledger.kind_of(self.model)
+        user_id, period = _last(params, USER_VAR), _last(params, PERIOD_VAR)
+        if period:
+            start, end = parse_period(period)
+            rollups = MonthlyRollup.objects.filter(kind=kind, month__gte=start, month__lt=end)
+            if user_id:
+                rollups = rollups.filter(user_id=user_id)
+            return rollups.aggregate(count=Sum('count'))['count'] or 0, False
+
+        summaries = UserSummary.objects.filter(user_id=user_id) if user_id else UserSummary.objects.all()
+        return summaries.aggregate(count=Sum(f'{kind}_count'))['count'] or 0, False
+
+    @property
+    def next_page_url(self):
+        if self.next_cursor is None:
+            return None
+        return self.get_query_string({CURSOR_VAR: self.next_cursor})
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    ModelAdmin base for Income/Expense: keyset pages, cheap counts and
+    filters that don't scan the table. Column sorting is off - every page
+    is read newest first, in the order the cursors follow.
+    """
+    list_filter = [UserAutocompleteFilter, RollupMonthFilter]
+    list_select_related = ['user']
+    autocomplete_fields = ['user']
+    ordering = ORDERING
+    sortable_by = ()
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    @property
+    def media(self):
+        # The user filter's autocomplete box needs select2 on the changelist too
+        widget = AutocompleteSelect(self.model._meta.get_field('user'), self.admin_site)
+        return super().media + widget.media
@@ -0,0 +1,79 @@
+"""
+ETag functions for Django's @condition decorator.
+
+The tags are derived from the per-user change version (see
+core.ledger.data_version), which is a single primary-key lookup on
+UserSummary. An unchanged dashboard is answered with 304 Not Modified
+before the view runs - no transaction queries and no JSON encoding.
+"""
+import hashlib
+from datetime import date
+from functools import wraps
+
+from django.conf import settings
+
+from . import ledger
+
+
+def make_etag(*parts):
+    return hashlib.sha1(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def request_version(request):
+    """The user's data version, looked up at most once per request"""
+    if not hasattr(request, '_billy_data_version'):
+        request._billy_data_version = ledger.data_version(request.user.pk)
+    return request._billy_data_version
+
+
+async def arequest_version(request):
+    if not hasattr(request, '_billy_data_version'):
+        user = await request.auser()
+        request._billy_data_version = await ledger.adata_version(user.pk)
+    return request._billy_data_version
+
+
+def preload_version(view):
+    """
+    For async views: look up the user and their data version with async
+    queries up front, so the synchronous ETag functions and request_version()
+    calls further down find them already memoized.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if (await request.auser()).is_authenticated:
+            await arequest_version(request)
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def versioned_etag(name):
+    """
+    Build an etag_func for a view whose output depends only on the user's
+    data, their name and the query string. Today's date is mixed in too,
+    because defaults like "the last 12 months" move with the calendar.
+    """
+    def etag_func(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return None
+        version = request_version(request)
+        if version is None:
+            return None
+        return make_etag(
+            name, request.user.pk, version, request.user.username, request.user.first_name,
+            request.META.get('QUERY_STRING', ''), date.today(),
+        )
+    return etag_func
+
+
+def check_auth_etag(request):
+    """
+    check_auth only echoes the user's name - but it also hands out the CSRF
+    cookie, so a client that lost its cookie must get a full response.
+    """
+    if not request.user.is_authenticated:
+        return None
+    return make_etag(
+        'check-auth', request.user.pk, request.user.username, request.user.first_name,
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    )
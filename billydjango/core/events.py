@@ -0,0 +1,102 @@
+"""
+Live change notifications for /api/events/ (Server-Sent Events).
+
+An in-process pub/sub: each open event stream subscribes to its user's
+channel and is woken whenever ledger.data_changed fires for that user (see
+core.signals). A wake-up carries no data - the stream then asks core.sync
+for everything after the last version it sent, so a burst of writes
+collapses into one event, and an event never disagrees with /api/changes/.
+
+Writers run in sync threads (WSGI workers, sync_to_async), streams in the
+ASGI event loop, so publishing goes through call_soon_threadsafe(). The
+channels only span one process: streams also re-check the user's version
+on every keepalive, which picks up writes made by other workers within
+KEEPALIVE_SECONDS.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+
+from . import ledger, sync
+
+KEEPALIVE_SECONDS = 15
+# Streams end after this long; the browser reconnects with Last-Event-ID,
+# which also re-checks the session.
+STREAM_SECONDS = 300
+RETRY_MILLISECONDS = 3000
+
+_lock = threading.Lock()
+_listeners = defaultdict(set)
+
+
+def publish(user_id):
+    """Wake every stream of this user, from any thread"""
+    with _lock:
+        listeners = list(_listeners.get(user_id, ()))
+    for loop, wakeup in listeners:
+        try:
+            loop.call_soon_threadsafe(wakeup.set)
+        except RuntimeError:
+            # That stream's event loop has already shut down
+            pass
+
+
+@contextmanager
+def subscribe(user_id):
+    """
+    Yield an asyncio.Event that gets set whenever the user's data changes.
+    Call from the event loop that will wait on it.
+    """
+    listener = (asyncio.get_running_loop(), asyncio.Event())
+    with _lock:
+        _listeners[user_id].add(listener)
+    try:
+        yield listener[1]
+    finally:
+        with _lock:
+            _listeners[user_id].discard(listener)
+            if not _listeners[user_id]:
+                del _listeners[user_id]
+
+
+def format_event(payload):
+    return f"id: {payload['version']}\nevent: changes\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n"
+
+
+async def stream(user, since=None):
+    """
+    The body of an event stream: a 'changes' event (the /api/changes/
+    payload - rows added or edited, ids deleted, new totals) whenever the
+    user's version moves past `since`.
+
+    Without `since` the first event carries only the current totals and
+    version. Event ids are versions, so a reconnecting browser resumes from
+    Last-Event-ID without missing anything.
+    """
+    changes_since = sync_to_async(sync.changes_since)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + STREAM_SECONDS
+
+    with subscribe(user.pk) as wakeup:
+        if since is None:
+            since = await ledger.adata_version(user.pk) or 0
+        payload = await changes_since(user, since)
+        yield f'retry: {RETRY_MILLISECONDS}\n' + format_event(payload)
+        since = payload['version']
+
+        while loop.time() < deadline:
+            try:
+                await asyncio.wait_for(wakeup.wait(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                if await ledger.adata_version(user.pk) == since:
+                    yield ': keepalive\n\n'
+                    continue
+            wakeup.clear()
+            payload = await changes_since(user, since)
+            if payload['version'] != since:
+                yield format_event(payload)
+                since = payload['version']
@@ -0,0 +1,101 @@
+"""
+One date-ordered feed of incomes and expenses.
+
+Each table is read with its own keyset query (newest first, limit + 1 rows
+off the (user, date, created_at, id) index) and the two ordered streams are
+combined with a lazy k-way merge, so only the requested page is ever
+materialized - no UNION over the full history and no client-side sorting.
+
+Feed order is date, created_at and id descending; where an income and an
+expense share date and created_at, the income comes first. The cursor
+records the kind of the last row so those ties page correctly.
+"""
+import base64
+import heapq
+import json
+from datetime import date, datetime
+from itertools import islice
+
+from django.db.models import Q
+
+from . import ledger
+from .pagination import InvalidCursor, ORDERING, after_position
+
+# Higher rank sorts first among rows with the same date and created_at
+KIND_RANK = {ledger.INCOME: 1, ledger.EXPENSE: 0}
+
+
+def encode_cursor(row):
+    raw = json.dumps([row['date'], row['created_at'], row['type'], row['id']])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        row_date, created_at, kind, pk = json.loads(base64.urlsafe_b64decode(padded))
+        if kind not in KIND_RANK:
+            raise ValueError(kind)
+        return date.fromisoformat(row_date), datetime.fromisoformat(created_at), kind, int(pk)
+    except (TypeError, ValueError):
+        raise InvalidCursor("Invalid cursor.")
+
+
+def _after_cursor(kind, cursor):
+    """Q for rows of `kind` that sort after the cursor position in the merged feed"""
+    row_date, created_at, cursor_kind, pk = cursor
+    if kind == cursor_kind:
+        return after_position(row_date, created_at, pk)
+
+    # At the cursor's exact instant, only rows of a lower-ranked kind follow it
+    ties_follow = KIND_RANK[kind] < KIND_RANK[cursor_kind]
+    tie = Q(created_at__lte=created_at) if ties_follow else Q(created_at__lt=created_at)
+    return Q(date__lte=row_date) & (Q(date__lt=row_date) | tie)
+
+
+def _stream(kind, user, cursor, filters, limit):
+    model = ledger.MODELS[kind]
+    label = ledger.label_field(model)
+    rows = model.objects.filter(user=user, **filters)
+    if cursor:
+        rows = rows.filter(_after_cursor(kind, cursor))
+    rows = rows.order_by(*ORDERING).values_list('id', 'date', 'created_at', 'amount', label)[:limit + 1]
+
+    rank = KIND_RANK[kind]
+    for pk, day, created_at, amount, text in rows:
+        yield (day, created_at, rank, pk), {
+            'id': pk,
+            'type': kind,
+            'amount': str(amount),
+            label: text,
+            'date': day.strftime('%Y-%m-%d'),
+            'created_at': created_at.isoformat(),
+        }
+
+
+def feed_page(user, kinds=None, cursor=None, limit=50, start=None, end=None, min_amount=None, max_amount=None):
+    """
+    Return (rows, next_cursor) for one page of the merged feed.
+
+    kinds limits the feed to 'income' and/or 'expense'; the remaining
+    arguments filter on date and amount (all bounds inclusive).
+    """
+    position = decode_cursor(cursor) if cursor else None
+    filters = {}
+    if start:
+        filters['date__gte'] = start
+    if end:
+        filters['date__lte'] = end
+    if min_amount is not None:
+        filters['amount__gte'] = min_amount
+    if max_amount is not None:
+        filters['amount__lte'] = max_amount
+
+    streams = [_stream(kind, user, position, filters, limit) for kind in (kinds or ledger.MODELS)]
+    merged = heapq.merge(*streams, key=lambda item: item[0], reverse=True)
+    rows = [row for _, row in islice(merged, limit + 1)]
+
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1])
@@ -3,8 +3,9 @@ from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 from django.contrib.auth import authenticate
-from datetime import date
-from .models import Income, Expense
+from datetime import date, timedelta
+from .models import Income, Expense, Budget, MonthlyRollup, RecurringRule
+from .ledger import bucket_for
 
 
 class SignupForm(forms.Form):
@@ -109,18 +110,10 @@ class LoginForm(forms.Form):
         password = cleaned_data.get('password')
         
         if username and password:
-            # Try to authenticate with username first
+            # The backend matches username or email in one query and one hash
             user = authenticate(username=username, password=password)
             
-            # If authentication fails, try with email
-            if user is None:
-                try:
-                    user_obj = User.objects.get(email=username)
-                    user = authenticate(username=user_obj.username, password=password)
-                except User.DoesNotExist:
-                    pass
-            
-            # If still no user, raise validation error
+            # No user, raise validation error
             if user is None:
                 raise ValidationError("Invalid username/email or password.")
             
@@ -216,4 +209,80 @@ class ExpenseForm(forms.ModelForm):
         if expense_date and expense_date > date.today():
             raise ValidationError("Expense date cannot be in the future.")
         
-        return expense_date
\ No newline at end of file
+        return expense_date
+
+
+class RecurringRuleForm(forms.ModelForm):
+    class Meta:
+        model = RecurringRule
+        fields = ['kind', 'amount', 'label', 'frequency', 'interval', 'start_date', 'end_date']
+        # 'user' is set in the view, next_due by the model
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['interval'].required = False
+    
+    def clean_amount(self):
+        amount = self.cleaned_data.get('amount')
+        
+        if amount is not None and amount <= 0:
+            raise ValidationError("Amount must be greater than zero.")
+        
+        return amount
+    
+    def clean_interval(self):
+        interval = self.cleaned_data.get('interval')
+        
+        if interval is None:
+            return 1
+        if interval < 1:
+            raise ValidationError("Interval must be at least 1.")
+        
+        return interval
+    
+    def clean_start_date(self):
+        start_date = self.cleaned_data.get('start_date')
+        
+        # Past occurrences are backfilled on the next run; keep that bounded.
+        # An existing rule keeps its (possibly older) start date when edited.
+        if start_date and 'start_date' in self.changed_data and start_date < date.today() - timedelta(days=366):
+            raise ValidationError("Start date cannot be more than a year ago.")
+        
+        return start_date
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        kind = cleaned_data.get('kind')
+        label = cleaned_data.get('label')
+        start_date = cleaned_data.get('start_date')
+        end_date = cleaned_data.get('end_date')
+        
+        # Occurrences are copied into Income.source, which is shorter
+        if kind == MonthlyRollup.INCOME and label:
+            if len(label) > Income._meta.get_field('source').max_length:
+                self.add_error('label', "Income sources are at most 100 characters.")
+        
+        if start_date and end_date and end_date < start_date:
+            self.add_error('end_date', "End date cannot be before the start date.")
+        
+        return cleaned_data
+
+
+class BudgetForm(forms.ModelForm):
+    class Meta:
+        model = Budget
+        fields = ['category', 'amount']
+        # 'user' is set in the view
+    
+    def clean_category(self):
+        # Budgets match expenses by rollup bucket, so "Groceries " and
+        # "groceries" are the same budget
+        return bucket_for(self.cleaned_data.get('category') or '')
+    
+    def clean_amount(self):
+        amount = self.cleaned_data.get('amount')
+        
+        if amount is not None and amount <= 0:
+            raise ValidationError("Amount must be greater than zero.")
+        
+        return amount
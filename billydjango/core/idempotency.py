@@ -0,0 +1,113 @@
+"""
+Idempotency-Key support for POST endpoints that create rows.
+
+The first request with a given key runs the view and stores its response
+in the same transaction, under a unique (user, key) constraint. A retry -
+or a duplicate arriving while the first is still running, which blocks on
+that constraint - gets the stored response back without the view running
+again, so it never touches the transaction tables.
+"""
+import hashlib
+from datetime import timedelta
+from functools import wraps
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+DEFAULT_TTL = timedelta(hours=24)
+
+
+def _fingerprint(request):
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.path.encode(), request.body):
+        digest.update(part)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _replay(record, fingerprint):
+    if record.fingerprint != fingerprint:
+        return JsonResponse(
+            {'error': f'{HEADER} was already used for a different request.'}, status=422
+        )
+    response = HttpResponse(bytes(record.response_body), status=record.status_code,
+                            content_type='application/json')
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """
+    Make a JSON POST view honor the Idempotency-Key header.
+
+    Requests without the header behave exactly as before. Responses of 500
+    and above are not stored (the transaction is rolled back), so the
+    client can retry them.
+    """
+    if iscoroutinefunction(view):
+        # The response has to be stored in the view's own transaction, and
+        # transactions are sync-only: run the keyed path in a thread and the
+        # view inside it. The view's sync_to_async() calls come back to that
+        # same thread, so they share its connection and transaction.
+        sync_view = async_to_sync(view)
+
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if not request.headers.get(HEADER):
+                return await view(request, *args, **kwargs)
+            return await sync_to_async(_run)(sync_view, request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.headers.get(HEADER):
+            return view(request, *args, **kwargs)
+        return _run(view, request, *args, **kwargs)
+    return wrapper
+
+
+def _run(view, request, *args, **kwargs):
+    key = request.headers.get(HEADER)
+    if len(key) > 255:
+        return JsonResponse({'error': f'{HEADER} must be at most 255 characters.'}, status=400)
+
+    fingerprint = _fingerprint(request)
+    existing = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+    if existing is not None:
+        if existing.expires_at > timezone.now():
+            return _replay(existing, fingerprint)
+        existing.delete()
+
+    ttl = getattr(settings, 'IDEMPOTENCY_KEY_TTL', DEFAULT_TTL)
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                user=request.user, key=key, fingerprint=fingerprint,
+                status_code=0, response_body=b'', expires_at=timezone.now() + ttl,
+            )
+            response = view(request, *args, **kwargs)
+            if response.status_code >= 500:
+                transaction.set_rollback(True)
+                return response
+            record.status_code = response.status_code
+            record.response_body = response.content
+            record.save(update_fields=['status_code', 'response_body'])
+            return response
+    except IntegrityError:
+        # A concurrent request with the same key got there first
+        record = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+        if record is None:
+            return JsonResponse({'error': 'Request with this key failed; retry.'}, status=409)
+        return _replay(record, fingerprint)
+
+
+def purge_expired():
+    """Delete expired keys; returns how many were removed"""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
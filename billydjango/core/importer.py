@@ -0,0 +1,178 @@
+"""
+Streaming bulk import of Income/Expense rows from CSV or NDJSON.
+
+Records are read one line at a time from the upload (or the raw request
+body), validated with the same IncomeForm/ExpenseForm rules as the
+single-row views, and written with bulk_create in bounded batches - one
+transaction per batch - so memory stays flat and a bad row only costs a
+line in the error report.
+
+Each record needs amount and date, a type of 'income' or 'expense' (or a
+default type for the whole file), and a source (income) or description
+(expense); 'label' is accepted for either.
+"""
+import csv
+import json
+from dataclasses import dataclass, field
+
+from django.db import transaction
+
+from . import ledger, search
+from .forms import IncomeForm, ExpenseForm
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+FORMATS = (CSV, NDJSON)
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+
+FORMS = {ledger.INCOME: IncomeForm, ledger.EXPENSE: ExpenseForm}
+
+
+@dataclass
+class ImportReport:
+    imported: int = 0
+    incomes: int = 0
+    expenses: int = 0
+    failed: int = 0
+    errors: list = field(default_factory=list)
+
+    def add_error(self, row, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'imported': self.imported,
+            'incomes': self.incomes,
+            'expenses': self.expenses,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+
+def guess_format(name='', content_type=''):
+    """Pick csv/ndjson from a file name or Content-Type; None if unclear"""
+    name, content_type = (name or '').lower(), (content_type or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type or 'jsonl' in content_type:
+        return NDJSON
+    if name.endswith('.csv') or 'csv' in content_type:
+        return CSV
+    return None
+
+
+def _decoded_lines(stream):
+    """Decode a binary stream line by line, dropping a UTF-8 byte order mark"""
+    for number, line in enumerate(stream, start=1):
+        yield line.decode('utf-8-sig' if number == 1 else 'utf-8')
+
+
+def read_records(stream, fmt):
+    """
+    Yield (row_number, record_dict_or_error) from a binary stream.
+
+    The stream is decoded lazily, so this never holds more than one line
+    in memory. Unparseable NDJSON lines are yielded as an error string.
+    A line that isn't UTF-8 (or breaks the CSV reader) is yielded as an
+    error too, and ends the file: rows before it have been imported, but
+    there's no telling where the next record starts.
+    """
+    number = 0
+    try:
+        if fmt == CSV:
+            for number, record in enumerate(csv.DictReader(_decoded_lines(stream)), start=1):
+                yield number, record
+            return
+
+        for number, line in enumerate(_decoded_lines(stream), start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield number, "Line is not valid JSON."
+                continue
+            if not isinstance(record, dict):
+                yield number, "Line must be a JSON object."
+                continue
+            yield number, record
+    except UnicodeDecodeError:
+        yield number + 1, "Line is not valid UTF-8; the rest of the file was not read."
+    except csv.Error as e:
+        yield number + 1, f"Line is not valid CSV ({e}); the rest of the file was not read."
+
+
+def build_instance(record, user, default_kind=None):
+    """
+    Validate one record with the matching model form.
+
+    Returns (instance, None) for a valid record or (None, errors).
+    """
+    kind = str(record.get('type') or default_kind or '').strip().lower()
+    form_class = FORMS.get(kind)
+    if form_class is None:
+        return None, {'type': [{'message': "Must be 'income' or 'expense'.", 'code': 'invalid'}]}
+
+    label = ledger.label_field(form_class._meta.model)
+    data = {
+        'amount': record.get('amount'),
+        'date': record.get('date'),
+        label: record.get(label) or record.get('label'),
+    }
+    form = form_class(data=data)
+    if not form.is_valid():
+        return None, form.errors.get_json_data()
+
+    instance = form.save(commit=False)
+    instance.user = user
+    return instance, None
+
+
+def write_batch(instances):
+    """Insert one batch and fold it into the derived tables atomically"""
+    by_model = {}
+    for instance in instances:
+        by_model.setdefault(type(instance), []).append(instance)
+
+    with transaction.atomic():
+        ledger.assign_versions(instances)
+        for model, rows in by_model.items():
+            model.objects.bulk_create(rows)
+        ledger.apply([ledger.entry_for(instance) for instance in instances])
+        search.index(instances)
+
+
+def import_records(records, user, default_kind=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Validate and import an iterable of (row_number, record); returns an ImportReport"""
+    report = ImportReport()
+    batch = []
+
+    def flush():
+        write_batch(batch)
+        for instance in batch:
+            if ledger.kind_of(instance) == ledger.INCOME:
+                report.incomes += 1
+            else:
+                report.expenses += 1
+        report.imported += len(batch)
+        batch.clear()
+
+    for number, record in records:
+        if isinstance(record, str):
+            report.add_error(number, {'__all__': [{'message': record, 'code': 'invalid'}]})
+            continue
+        instance, errors = build_instance(record, user, default_kind)
+        if errors:
+            report.add_error(number, errors)
+            continue
+        batch.append(instance)
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+    return report
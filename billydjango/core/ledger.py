@@ -0,0 +1,368 @@
+"""
+Incremental bookkeeping for Income and Expense writes.
+
+Every change to a transaction row is described as an Entry and folded into
+the derived tables - UserSummary (one row per user) and MonthlyRollup (one
+row per user, month and bucket) - with one UPDATE per affected row, inside
+the caller's transaction. core.signals feeds single-row saves and deletes
+in here; bulk write paths call apply() directly with all their entries.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date
+from decimal import Decimal
+from typing import NamedTuple
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+from django.dispatch import Signal
+from django.utils import timezone
+
+from . import routers
+from .models import Income, Expense, MonthlyRollup, Tombstone, UserSummary
+
+INCOME = MonthlyRollup.INCOME
+EXPENSE = MonthlyRollup.EXPENSE
+
+MODELS = {INCOME: Income, EXPENSE: Expense}
+
+# Sent (after commit) with user_id= whenever a user's data version moves
+data_changed = Signal()
+
+# Sent (inside the transaction) with kind= and rows=[(user_id, object_id)]
+# once per batch of deletions, grouped like the tombstones
+rows_deleted = Signal()
+
+# Sent (inside the transaction) with changes={(user_id, month, kind, bucket):
+# [total, count]} - what one apply() added to (or took from) the rollups
+rollups_applied = Signal()
+
+# Work queued by deferred(); None when not inside such a block
+_deferred = ContextVar('ledger_deferred', default=None)
+
+# Users whose own delete() is cascading to their rows right now
+_deleting_owners = ContextVar('ledger_deleting_owners', default=frozenset())
+
+
+class Entry(NamedTuple):
+    """One transaction row as far as the derived tables are concerned"""
+    kind: str
+    user_id: int
+    amount: Decimal
+    date: date
+    label: str
+
+
+def kind_of(model):
+    """'income' or 'expense' for a model class or instance"""
+    return INCOME if model._meta.concrete_model is Income else EXPENSE
+
+
+def label_field(model):
+    """Name of the free-text column: 'source' for Income, 'description' for Expense"""
+    return 'source' if kind_of(model) == INCOME else 'description'
+
+
+def bucket_for(label):
+    """Normalize a source/description into its rollup bucket"""
+    return ' '.join(label.split()).lower()[:200]
+
+
+def month_of(day):
+    return day.replace(day=1)
+
+
+def entry_for(instance):
+    """Build an Entry from an Income/Expense instance"""
+    # Views pass raw JSON strings to create(), so normalize amount and date here
+    amount = instance._meta.get_field('amount').to_python(instance.amount)
+    day = instance._meta.get_field('date').to_python(instance.date)
+    return Entry(kind_of(instance), instance.user_id, amount, day, getattr(instance, label_field(instance)))
+
+
+@contextmanager
+def deferred():
+    """
+    Collect the apply() and record_deletions() calls made inside the block -
+    typically by signal receivers firing once per row during a
+    QuerySet.delete() - and run them grouped when the block exits cleanly.
+    Nested blocks fold into the outermost one.
+    """
+    if _deferred.get() is not None:
+        yield
+        return
+
+    pending = {'entries': [], 'deletions': defaultdict(list)}
+    token = _deferred.set(pending)
+    try:
+        yield
+    finally:
+        _deferred.reset(token)
+    _apply_signed(pending['entries'])
+    for kind, rows in pending['deletions'].items():
+        record_deletions(kind, rows)
+
+
+def begin_owner_delete(user_id):
+    """
+    Mark a User as being deleted. The cascade takes their UserSummary,
+    rollups and tombstones with it, so the per-row deletes that follow have
+    nothing to update - see owner_deleted().
+    """
+    _deleting_owners.set(_deleting_owners.get() | {user_id})
+
+
+def end_owner_delete(user_id):
+    _deleting_owners.set(_deleting_owners.get() - {user_id})
+
+
+def owner_deleted(user_id):
+    """True while `user_id`'s own delete() is cascading"""
+    return user_id in _deleting_owners.get()
+
+
+def apply(entries, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) entries from the derived tables.
+
+    Entries are grouped first, so a batch of 10,000 rows for one user and
+    month is still a handful of UPDATEs. Users without a summary row yet get
+    one built from scratch - the rows being applied are already in (or
+    already gone from) the table at this point, so the rebuild sees the
+    final state.
+    """
+    pending = _deferred.get()
+    if pending is not None:
+        pending['entries'].extend((entry, sign) for entry in entries)
+        return
+    _apply_signed((entry, sign) for entry in entries)
+
+
+def _apply_signed(signed_entries):
+    totals = defaultdict(lambda: [Decimal(0), 0, Decimal(0), 0])
+    rollups = defaultdict(lambda: [Decimal(0), 0])
+    for entry, sign in signed_entries:
+        delta = totals[entry.user_id]
+        if entry.kind == INCOME:
+            delta[0] += sign * entry.amount
+            delta[1] += sign
+        else:
+            delta[2] += sign * entry.amount
+            delta[3] += sign
+
+        rollup = rollups[(entry.user_id, month_of(entry.date), entry.kind, bucket_for(entry.label))]
+        rollup[0] += sign * entry.amount
+        rollup[1] += sign
+
+    with transaction.atomic():
+        for user_id, (income, income_n, expense, expense_n) in totals.items():
+            updated = UserSummary.objects.filter(user_id=user_id).update(
+                total_income=F('total_income') + income,
+                income_count=F('income_count') + income_n,
+                total_expenses=F('total_expenses') + expense,
+                expense_count=F('expense_count') + expense_n,
+            )
+            if not updated:
+                rebuild_summaries([user_id])
+
+        _apply_rollups(rollups)
+        if rollups:
+            rollups_applied.send(sender=MonthlyRollup, changes=rollups)
+
+
+def _apply_rollups(rollups):
+    """Increment existing rollup rows, create new ones, drop emptied ones"""
+    stale_users = set()
+    for (user_id, month, kind, bucket), (total, count) in rollups.items():
+        if not count and not total:
+            continue
+        lookup = MonthlyRollup.objects.filter(user_id=user_id, month=month, kind=kind, bucket=bucket)
+        if lookup.update(total=F('total') + total, count=F('count') + count):
+            if count < 0:
+                lookup.filter(count=0).delete()
+        elif count > 0:
+            MonthlyRollup.objects.create(
+                user_id=user_id, month=month, kind=kind, bucket=bucket, total=total, count=count
+            )
+        else:
+            # Removing from a bucket we have no record of - the rollups were
+            # out of sync already, so recompute this user from scratch.
+            stale_users.add(user_id)
+
+    if stale_users:
+        rebuild_rollups(stale_users)
+
+
+def allocate_versions(user_id, count=1):
+    """
+    Reserve `count` consecutive change versions for a user.
+
+    Returns the last one; the range is (last - count, last]. Must run inside
+    the writer's transaction so the bump and the rows commit together.
+    """
+    with transaction.atomic():
+        bump = UserSummary.objects.filter(user_id=user_id)
+        changes = {'version': F('version') + count, 'updated_at': timezone.now()}
+        if not bump.update(**changes):
+            rebuild_summaries([user_id])
+            bump.update(**changes)
+        transaction.on_commit(lambda: data_changed.send(sender=UserSummary, user_id=user_id))
+        return bump.values_list('version', flat=True).get()
+
+
+def data_version(user_id):
+    """
+    The user's current change version - a cheap "has anything changed?"
+    marker read from the summary row alone. None if there's no summary yet.
+    """
+    return UserSummary.objects.filter(user_id=user_id).values_list('version', flat=True).first()
+
+
+async def adata_version(user_id):
+    return await UserSummary.objects.filter(user_id=user_id).values_list('version', flat=True).afirst()
+
+
+def assign_versions(instances):
+    """Stamp unsaved Income/Expense instances with fresh versions before bulk_create()"""
+    by_user = defaultdict(list)
+    for instance in instances:
+        by_user[instance.user_id].append(instance)
+    for user_id, rows in by_user.items():
+        last = allocate_versions(user_id, len(rows))
+        for offset, instance in enumerate(rows):
+            instance.version = last - len(rows) + 1 + offset
+
+
+def record_deletions(kind, rows):
+    """
+    Leave a Tombstone for each deleted (user_id, object_id) pair.
+
+    One version bump and one INSERT per user, however many rows were deleted.
+    """
+    pending = _deferred.get()
+    if pending is not None:
+        pending['deletions'][kind].extend(rows)
+        return
+
+    by_user = defaultdict(list)
+    for user_id, object_id in rows:
+        by_user[user_id].append(object_id)
+
+    tombstones = []
+    for user_id, object_ids in by_user.items():
+        last = allocate_versions(user_id, len(object_ids))
+        first = last - len(object_ids) + 1
+        tombstones.extend(
+            Tombstone(user_id=user_id, kind=kind, object_id=object_id, version=first + offset)
+            for offset, object_id in enumerate(object_ids)
+        )
+    Tombstone.objects.bulk_create(tombstones)
+    rows_deleted.send(sender=Tombstone, kind=kind, rows=rows)
+
+
+def compute_summaries(user_ids=None):
+    """
+    Recompute totals straight from the transaction tables.
+
+    Returns {user_id: UserSummary (unsaved)}; two GROUP BY queries no matter
+    how many users are included.
+    """
+    incomes = Income.objects.all()
+    expenses = Expense.objects.all()
+    if user_ids is not None:
+        incomes = incomes.filter(user_id__in=user_ids)
+        expenses = expenses.filter(user_id__in=user_ids)
+
+    # Users with no rows left still get a (zero) summary, so a rebuild
+    # resets a stale one instead of leaving it alone
+    if user_ids is None:
+        existing = UserSummary.objects.values_list('user_id', flat=True)
+        summaries = {user_id: UserSummary(user_id=user_id) for user_id in existing}
+    else:
+        summaries = {user_id: UserSummary(user_id=user_id) for user_id in user_ids}
+
+    for row in incomes.order_by().values('user_id').annotate(total=Sum('amount'), n=Count('id')):
+        summary = summaries.setdefault(row['user_id'], UserSummary(user_id=row['user_id']))
+        summary.total_income, summary.income_count = row['total'], row['n']
+    for row in expenses.order_by().values('user_id').annotate(total=Sum('amount'), n=Count('id')):
+        summary = summaries.setdefault(row['user_id'], UserSummary(user_id=row['user_id']))
+        summary.total_expenses, summary.expense_count = row['total'], row['n']
+    return summaries
+
+
+def rebuild_summaries(user_ids=None):
+    """Overwrite stored summaries with freshly computed ones; returns the count"""
+    summaries = list(compute_summaries(user_ids).values())
+    UserSummary.objects.bulk_create(
+        summaries,
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['total_income', 'total_expenses', 'income_count', 'expense_count', 'updated_at'],
+    )
+    return len(summaries)
+
+
+def compute_rollups(user_ids=None):
+    """
+    Recompute rollups straight from the transaction tables.
+
+    The database groups by (user, month, raw label); folding raw labels into
+    buckets happens here so it matches bucket_for() exactly.
+    """
+    rollups = {}
+    for kind, model in MODELS.items():
+        rows = model.objects.all()
+        if user_ids is not None:
+            rows = rows.filter(user_id__in=user_ids)
+        label = label_field(model)
+        grouped = (
+            rows.order_by()
+            .annotate(month=TruncMonth('date'))
+            .values('user_id', 'month', label)
+            .annotate(total=Sum('amount'), n=Count('id'))
+        )
+        for row in grouped.iterator(chunk_size=2000):
+            key = (row['user_id'], row['month'], kind, bucket_for(row[label]))
+            rollup = rollups.get(key)
+            if rollup is None:
+                rollup = rollups[key] = MonthlyRollup(
+                    user_id=key[0], month=key[1], kind=kind, bucket=key[3], total=0, count=0
+                )
+            rollup.total += row['total']
+            rollup.count += row['n']
+    return list(rollups.values())
+
+
+def rebuild_rollups(user_ids=None):
+    """Replace stored rollups with freshly computed ones; returns the count"""
+    rollups = compute_rollups(user_ids)
+    with transaction.atomic():
+        existing = MonthlyRollup.objects.all()
+        if user_ids is not None:
+            existing = existing.filter(user_id__in=user_ids)
+        existing.delete()
+        MonthlyRollup.objects.bulk_create(rollups, batch_size=1000)
+    return len(rollups)
+
+
+def get_summary(user):
+    """The user's summary row, built on first access"""
+    summary = UserSummary.objects.filter(user=user).first()
+    if summary is None:
+        # Build it from (and read it back off) the primary, even when
+        # called from a view that reads from the replica
+        with routers.primary():
+            rebuild_summaries([user.pk])
+            summary = UserSummary.objects.get(user=user)
+    return summary
+
+
+async def aget_summary(user):
+    summary = await UserSummary.objects.filter(user=user).afirst()
+    if summary is None:
+        # Building it writes, and that needs a transaction: do it in sync code
+        summary = await sync_to_async(get_summary)(user)
+    return summary
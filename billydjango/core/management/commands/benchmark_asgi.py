@@ -0,0 +1,193 @@
+import asyncio
+import io
+import json
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.test import Client
+
+from core import importer, timing
+from core.models import Income
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare request throughput under WSGI (a fixed pool of worker threads) and ASGI "
+        "(one event loop) with many slow clients, calling Django's handlers in-process. "
+        "Run it with and without BILLY_ASYNC_VIEWS=1 to compare the sync and async views."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/dashboard/', help="URL to request, query string allowed")
+        parser.add_argument('--clients', type=int, default=100, help="Concurrent clients")
+        parser.add_argument('--requests', type=int, default=5, help="Requests per client, one after another")
+        parser.add_argument('--delay', type=float, default=0.2,
+                            help="Seconds each request spends trickling in and draining out (slow client)")
+        parser.add_argument('--threads', type=int, default=8, help="WSGI worker threads")
+        parser.add_argument('--rows', type=int, default=200, help="Incomes seeded for the benchmark user")
+        parser.add_argument('--server', choices=['wsgi', 'asgi'], action='append', help="Default: both")
+        parser.add_argument('--json', action='store_true', help="Print results as JSON")
+
+    def handle(self, *args, **options):
+        user, cookie = self.setup(options['rows'])
+        try:
+            results = {
+                'path': options['path'],
+                'async_views': settings.ASYNC_VIEWS,
+                'clients': options['clients'],
+                'requests_per_client': options['requests'],
+                'client_delay_seconds': options['delay'],
+                'runs': {},
+            }
+            for server in options['server'] or ['wsgi', 'asgi']:
+                run = self.run_wsgi if server == 'wsgi' else self.run_asgi
+                results['runs'][server] = run(cookie, options)
+        finally:
+            # Rows first, so the ledger still has the summary to take them off
+            Income.objects.filter(user=user).delete()
+            user.delete()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.report(results)
+
+    def setup(self, rows):
+        """A throwaway user with some incomes, and a session cookie for them"""
+        user = User.objects.create_user(f'bench-asgi-{time.time_ns()}')
+        start = date(2024, 1, 1)
+        importer.write_batch([
+            Income(user=user, amount=f'{index % 500 + 1}.00', source=f'Source {index % 7}',
+                   date=start + timedelta(days=index % 700))
+            for index in range(rows)
+        ])
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+        cookie = '; '.join(f'{name}={morsel.value}' for name, morsel in client.cookies.items())
+        return user, cookie
+
+    def summarize(self, latencies, statuses, elapsed):
+        latencies.sort()
+        return {
+            'requests_per_second': round(len(latencies) / elapsed, 1),
+            'median_ms': round(statistics.median(latencies) * 1000, 1) if latencies else None,
+            'p95_ms': round(timing.percentile(latencies, 95) * 1000, 1) if latencies else None,
+            'statuses': {str(code): statuses.count(code) for code in sorted(set(statuses))},
+            'seconds': round(elapsed, 3),
+        }
+
+    # ============================================
+    # WSGI: a slow client holds a worker thread for its whole request
+    # ============================================
+
+    def run_wsgi(self, cookie, options):
+        handler = get_wsgi_application()
+        path, _, query = options['path'].partition('?')
+        workers = threading.BoundedSemaphore(options['threads'])
+        delay = options['delay']
+        latencies, statuses, lock = [], [], threading.Lock()
+
+        def call():
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+                'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+                'HTTP_HOST': 'localhost', 'HTTP_COOKIE': cookie, 'REMOTE_ADDR': '127.0.0.1',
+                'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+                'wsgi.errors': sys.stderr, 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+                'wsgi.run_once': False,
+            }
+            status = []
+            time.sleep(delay / 2)  # reading the request off a slow connection
+            body = handler(environ, lambda line, headers, exc_info=None: status.append(int(line.split()[0])))
+            for _ in body:
+                pass
+            time.sleep(delay / 2)  # writing the response to a slow connection
+            body.close()
+            return status[0]
+
+        def client():
+            for _ in range(options['requests']):
+                started = time.perf_counter()
+                with workers:
+                    status = call()
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+                    statuses.append(status)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['clients']) as pool:
+            for future in [pool.submit(client) for _ in range(options['clients'])]:
+                future.result()
+        result = self.summarize(latencies, statuses, time.perf_counter() - started)
+        result['threads'] = options['threads']
+        return result
+
+    # ============================================
+    # ASGI: a slow client is just a suspended coroutine
+    # ============================================
+
+    def run_asgi(self, cookie, options):
+        return asyncio.run(self._run_asgi(get_asgi_application(), cookie, options))
+
+    async def _run_asgi(self, app, cookie, options):
+        path, _, query = options['path'].partition('?')
+        delay = options['delay']
+        latencies, statuses = [], []
+
+        async def call():
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+                'root_path': '', 'headers': [(b'host', b'localhost'), (b'cookie', cookie.encode())],
+                'client': ('127.0.0.1', 50000), 'server': ('localhost', 80),
+            }
+            received, status = False, []
+
+            async def receive():
+                nonlocal received
+                if not received:
+                    received = True
+                    await asyncio.sleep(delay / 2)
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await asyncio.Event().wait()  # never disconnects; Django cancels this
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+                elif not message.get('more_body'):
+                    await asyncio.sleep(delay / 2)
+
+            await app(scope, receive, send)
+            return status[0]
+
+        async def client():
+            for _ in range(options['requests']):
+                started = time.perf_counter()
+                status = await call()
+                latencies.append(time.perf_counter() - started)
+                statuses.append(status)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(options['clients'])))
+        return self.summarize(latencies, statuses, time.perf_counter() - started)
+
+    def report(self, results):
+        views = 'async' if results['async_views'] else 'sync'
+        self.stdout.write(
+            f"GET {results['path']} ({views} views): {results['clients']} clients x "
+            f"{results['requests_per_client']} requests, {results['client_delay_seconds']}s client delay each\n"
+        )
+        for server, run in results['runs'].items():
+            label = f"{server} ({run['threads']} threads)" if 'threads' in run else server
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(f"  {run['requests_per_second']} req/s, median {run['median_ms']} ms, "
+                              f"p95 {run['p95_ms']} ms, statuses {run['statuses']}")
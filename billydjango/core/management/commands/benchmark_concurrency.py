@@ -0,0 +1,200 @@
+import json
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core import timing
+from core.models import Income, UserSummary
+from core.pagination import DEFAULT_PAGE_SIZE, ORDERING
+
+
+def _profile(config):
+    """What the Django backend does with one of settings.DATABASE_PROFILES, in sqlite3 terms"""
+    options = config.get('OPTIONS', {})
+    statements = [statement.strip() for statement in options.get('init_command', '').split(';')]
+    mode = options.get('transaction_mode')
+    return {
+        'pragmas': dict(statement.removeprefix('PRAGMA ').split('=', 1) for statement in statements if statement),
+        'reuse_connections': bool(config.get('CONN_MAX_AGE')),
+        'begin': f'BEGIN {mode}' if mode else 'BEGIN',
+    }
+
+
+PROFILES = {name: _profile(config) for name, config in settings.DATABASE_PROFILES.items()}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure dashboard read throughput and latency on a scratch SQLite database "
+        "while an import writes to it, with each of settings.DATABASE_PROFILES"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200_000, help="Rows seeded before the run")
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--readers', type=int, default=4, help="Concurrent dashboard reader threads")
+        parser.add_argument('--seconds', type=float, default=5.0, help="Length of each run")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per import transaction")
+        parser.add_argument('--profile', choices=PROFILES, action='append', help="Default: all profiles")
+        parser.add_argument('--json', action='store_true', help="Print results as JSON")
+
+    def handle(self, *args, **options):
+        results = {
+            'rows': options['rows'],
+            'users': options['users'],
+            'readers': options['readers'],
+            'seconds': options['seconds'],
+            'runs': {},
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in options['profile'] or PROFILES:
+                path = Path(tmp) / f'{name}.sqlite3'
+                self.prepare(path, PROFILES[name], options['rows'], options['users'])
+                results['runs'][name] = self.run(path, PROFILES[name], options)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.report(results)
+
+    def connect(self, path, profile):
+        """A connection set up the way the Django backend would for this profile"""
+        db = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        for name, value in profile['pragmas'].items():
+            db.execute(f'PRAGMA {name}={value}')
+        return db
+
+    def prepare(self, path, profile, rows, users):
+        self.stderr.write(f"Seeding {rows:,} rows for {users} users in {path.name}...")
+        with connection.schema_editor(collect_sql=True) as editor:
+            editor.create_model(Income)
+            editor.create_model(UserSummary)
+
+        db = self.connect(path, profile)
+        for sql in editor.collected_sql:
+            db.execute(sql.rstrip(';'))
+        db.execute('BEGIN')
+        db.executemany('INSERT INTO core_income (amount, source, date, created_at, user_id, version) '
+                       'VALUES (?, ?, ?, ?, ?, 1)', self.generate(random.Random(42), rows, users))
+        db.execute(
+            'INSERT INTO core_usersummary (user_id, total_income, total_expenses, income_count, expense_count, '
+            'version, updated_at) SELECT user_id, SUM(amount), 0, COUNT(*), 0, 1, ? FROM core_income GROUP BY user_id',
+            [datetime.now(timezone.utc).isoformat()],
+        )
+        db.execute('COMMIT')
+        db.execute('ANALYZE')
+        db.close()
+
+    def generate(self, rng, rows, users):
+        start = date(2015, 1, 1)
+        epoch = datetime(2015, 1, 1, tzinfo=timezone.utc)
+        for _ in range(rows):
+            yield (
+                f'{rng.randrange(1, 500000) / 100:.2f}',
+                rng.choice(['Salary', 'Freelance', 'Gift', 'Dividends', 'Refund']),
+                (start + timedelta(days=rng.randrange(4000))).isoformat(),
+                (epoch + timedelta(seconds=rng.randrange(400_000_000))).strftime('%Y-%m-%d %H:%M:%S.%f'),
+                rng.randrange(1, users + 1),
+            )
+
+    def compile(self, queryset):
+        sql, params = queryset.query.get_compiler(connection=connection).as_sql()
+        return sql.replace('%s', '?'), [p if isinstance(p, (int, float)) else str(p) for p in params]
+
+    def dashboard_queries(self, user_id):
+        """The SQL one dashboard request runs: the summary row and the first page"""
+        return [
+            self.compile(UserSummary.objects.filter(user_id=user_id)),
+            self.compile(Income.objects.filter(user_id=user_id).order_by(*ORDERING)[:DEFAULT_PAGE_SIZE + 1]),
+        ]
+
+    def run(self, path, profile, options):
+        users, batch_size = options['users'], options['batch_size']
+        deadline = time.perf_counter() + options['seconds']
+        latencies, errors, written = [], {'reads': 0, 'writes': 0}, [0]
+        lock = threading.Lock()
+
+        def reader(seed):
+            rng = random.Random(seed)
+            db = self.connect(path, profile) if profile['reuse_connections'] else None
+            mine = []
+            while time.perf_counter() < deadline:
+                queries = self.dashboard_queries(rng.randrange(1, users + 1))
+                started = time.perf_counter()
+                conn = db or self.connect(path, profile)
+                try:
+                    for sql, params in queries:
+                        conn.execute(sql, params).fetchall()
+                except sqlite3.OperationalError:
+                    with lock:
+                        errors['reads'] += 1
+                    continue
+                finally:
+                    if db is None:
+                        conn.close()
+                mine.append((time.perf_counter() - started) * 1000)
+            if db is not None:
+                db.close()
+            with lock:
+                latencies.extend(mine)
+
+        def writer():
+            rng = random.Random(7)
+            db = self.connect(path, profile)
+            while time.perf_counter() < deadline:
+                user_id = rng.randrange(1, users + 1)
+                rows = list(self.generate(rng, batch_size, 1))
+                try:
+                    db.execute(profile['begin'])
+                    db.executemany('INSERT INTO core_income (amount, source, date, created_at, user_id, version) '
+                                   'VALUES (?, ?, ?, ?, ?, 1)', [row[:4] + (user_id,) for row in rows])
+                    db.execute('UPDATE core_usersummary SET total_income = total_income + ?, '
+                               'income_count = income_count + ?, version = version + 1 WHERE user_id = ?',
+                               [sum(float(row[0]) for row in rows), len(rows), user_id])
+                    db.execute('COMMIT')
+                except sqlite3.OperationalError:
+                    if db.in_transaction:
+                        db.execute('ROLLBACK')
+                    errors['writes'] += 1
+                    continue
+                written[0] += len(rows)
+            db.close()
+
+        threads = [threading.Thread(target=writer)]
+        threads += [threading.Thread(target=reader, args=(seed,)) for seed in range(options['readers'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'pragmas': profile['pragmas'],
+            'reads_per_second': round(len(latencies) / elapsed, 1),
+            'read_median_ms': round(statistics.median(latencies), 3) if latencies else None,
+            'read_p95_ms': round(timing.percentile(latencies, 95), 3) if latencies else None,
+            'rows_written_per_second': round(written[0] / elapsed, 1),
+            'failed_reads': errors['reads'],
+            'failed_writes': errors['writes'],
+        }
+
+    def report(self, results):
+        self.stdout.write(f"{results['rows']:,} rows, {results['users']} users, {results['readers']} readers "
+                          f"and 1 importer for {results['seconds']}s per profile\n")
+        for name, run in results['runs'].items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(f"  dashboard reads: {run['reads_per_second']}/s, median {run['read_median_ms']} ms, "
+                              f"p95 {run['read_p95_ms']} ms ({run['failed_reads']} failed)")
+            self.stdout.write(f"  import writes: {run['rows_written_per_second']} rows/s "
+                              f"({run['failed_writes']} failed batches)")
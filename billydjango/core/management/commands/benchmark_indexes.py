@@ -0,0 +1,148 @@
+import json
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+
+from core import timing
+from core.models import Income
+from core.pagination import DEFAULT_PAGE_SIZE, ORDERING, after_position
+
+INDEX_NAME = 'core_income_user_date_idx'
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch SQLite database with Income rows and compare query plans "
+        "and latency of the dashboard queries on the schema without the composite "
+        "index (user_id foreign key index only) and with it"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=50, help="Timed runs per query")
+        parser.add_argument('--db', help="New scratch database file to keep (default: a temp file, deleted afterwards)")
+        parser.add_argument('--json', action='store_true', help="Print results as JSON")
+
+    def handle(self, *args, **options):
+        if options['db'] and Path(options['db']).exists():
+            raise CommandError(f"{options['db']} already exists; --db must name a new file.")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(options['db'] or Path(tmp) / 'bench.sqlite3')
+            db = sqlite3.connect(path)
+            table_sql, other_indexes, index_sql = self.schema()
+
+            db.execute(table_sql)
+            self.seed(db, options['rows'], options['users'])
+            # Built after seeding, which is faster than maintaining them row by row
+            for sql in other_indexes:
+                db.execute(sql)
+
+            queries = self.queries(user_id=1)
+            results = {'rows': options['rows'], 'users': options['users'], 'runs': {}}
+            # Both runs get planner statistics, so the plans differ only by the index
+            db.execute('ANALYZE')
+            results['runs']['fk_index_only'] = self.measure(db, queries, options['repeat'])
+            started = time.perf_counter()
+            db.execute(index_sql)
+            results['index_build_seconds'] = round(time.perf_counter() - started, 3)
+            db.execute('ANALYZE')
+            results['runs']['composite_index'] = self.measure(db, queries, options['repeat'])
+            db.close()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.report(results)
+
+    def schema(self):
+        """
+        (CREATE TABLE, the table's other indexes, the composite CREATE INDEX),
+        exactly as the migrations emit them - the other indexes include the
+        user_id foreign key index the composite one replaces in the plans
+        """
+        with connection.schema_editor(collect_sql=True) as editor:
+            editor.create_model(Income)
+        statements = [sql.rstrip(';') for sql in editor.collected_sql]
+        table_sql = next(sql for sql in statements if sql.startswith('CREATE TABLE'))
+        index_sql = next(sql for sql in statements if INDEX_NAME in sql)
+        others = [sql for sql in statements if sql not in (table_sql, index_sql)]
+        return table_sql, others, index_sql
+
+    def seed(self, db, rows, users):
+        self.stderr.write(f"Seeding {rows:,} rows for {users} users...")
+        rng = random.Random(42)
+        start = date(2015, 1, 1)
+        epoch = datetime(2015, 1, 1, tzinfo=timezone.utc)
+
+        def generate():
+            for number in range(rows):
+                day = start + timedelta(days=rng.randrange(4000))
+                created = epoch + timedelta(seconds=rng.randrange(400_000_000))
+                yield (
+                    f'{rng.randrange(1, 500000) / 100:.2f}',
+                    rng.choice(['Salary', 'Freelance', 'Gift', 'Dividends', 'Refund']),
+                    day.isoformat(),
+                    created.strftime('%Y-%m-%d %H:%M:%S.%f'),
+                    rng.randrange(1, users + 1),
+                    # Only has to be filled in: no dashboard query reads it
+                    number + 1,
+                )
+
+        with db:
+            db.executemany(
+                'INSERT INTO core_income (amount, source, date, created_at, user_id, version) VALUES (?, ?, ?, ?, ?, ?)',
+                generate(),
+            )
+
+    def queries(self, user_id):
+        """The SQL the app actually runs, compiled by Django's query compiler"""
+        mine = Income.objects.filter(user_id=user_id)
+        ordered = mine.order_by(*ORDERING)
+        cursor = (date(2020, 6, 1), datetime(2020, 6, 1, tzinfo=timezone.utc), 10 ** 9)
+        querysets = {
+            'dashboard first page': ordered[:DEFAULT_PAGE_SIZE + 1],
+            'dashboard keyset page': ordered.filter(after_position(*cursor))[:DEFAULT_PAGE_SIZE + 1],
+            'sum(amount) per user': mine.order_by().values('user_id').annotate(total=Sum('amount')),
+        }
+        compiled = {}
+        for name, queryset in querysets.items():
+            sql, params = queryset.query.get_compiler(connection=connection).as_sql()
+            compiled[name] = (sql.replace('%s', '?'), [str(p) if not isinstance(p, (int, float)) else p for p in params])
+        return compiled
+
+    def measure(self, db, queries, repeat):
+        results = {}
+        for name, (sql, params) in queries.items():
+            plan = [row[3] for row in db.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                db.execute(sql, params).fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            results[name] = {
+                'plan': plan,
+                'median_ms': round(statistics.median(timings), 3) if timings else None,
+                'p95_ms': round(timing.percentile(timings, 95), 3) if timings else None,
+            }
+        return results
+
+    def report(self, results):
+        self.stdout.write(f"{results['rows']:,} rows, {results['users']} users "
+                          f"(index build {results['index_build_seconds']}s)\n")
+        for run, queries in results['runs'].items():
+            self.stdout.write(self.style.MIGRATE_HEADING(run))
+            for name, result in queries.items():
+                self.stdout.write(f"  {name}: median {result['median_ms']} ms, p95 {result['p95_ms']} ms")
+                for step in result['plan']:
+                    self.stdout.write(f"      {step}")
@@ -0,0 +1,130 @@
+import json
+import logging
+import statistics
+import time
+
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from core.backends import UsernameOrEmailBackend
+
+PASSWORD = 'correct-horse-battery'
+
+
+class Rollback(Exception):
+    """Raised to undo the benchmark's users and sessions"""
+
+
+def legacy_authenticate(identifier, password):
+    """What LoginForm.clean used to do: username first, then look up the email and hash again"""
+    backend = ModelBackend()
+    user = backend.authenticate(None, username=identifier, password=password)
+    if user is None:
+        try:
+            user_obj = User.objects.get(email=identifier)
+            user = backend.authenticate(None, username=user_obj.username, password=password)
+        except User.DoesNotExist:
+            pass
+    return user
+
+
+class Command(BaseCommand):
+    help = (
+        "Time login attempts (wall clock and CPU) with the old two-step lookup and with "
+        "core.backends, then flood the login view to show the throttle. Runs in a "
+        "transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--attempts', type=int, default=5, help="Timed attempts per case")
+        parser.add_argument('--flood', type=int, default=200, help="Requests in the throttle flood")
+        parser.add_argument('--json', action='store_true', help="Print results as JSON")
+
+    def handle(self, *args, **options):
+        results = {}
+        try:
+            with transaction.atomic():
+                User.objects.create_user('bench-login', email='bench-login@example.com', password=PASSWORD)
+                results['authenticate'] = self.measure_backends(options['attempts'])
+                results['flood'] = self.flood(options['flood'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.report(results)
+
+    def measure_backends(self, attempts):
+        cases = {
+            'username, right password': ('bench-login', PASSWORD),
+            'email, right password': ('bench-login@example.com', PASSWORD),
+            'email, wrong password': ('bench-login@example.com', 'wrong'),
+            'unknown email': ('nobody@example.com', 'wrong'),
+        }
+        implementations = {
+            'legacy': legacy_authenticate,
+            'backend': lambda identifier, password: UsernameOrEmailBackend().authenticate(
+                None, username=identifier, password=password
+            ),
+        }
+        results = {}
+        for name, authenticate in implementations.items():
+            results[name] = {}
+            for case, (identifier, password) in cases.items():
+                wall, cpu = [], []
+                with CaptureQueriesContext(connection) as queries:
+                    for _ in range(attempts):
+                        started, started_cpu = time.perf_counter(), time.process_time()
+                        authenticate(identifier, password)
+                        wall.append((time.perf_counter() - started) * 1000)
+                        cpu.append((time.process_time() - started_cpu) * 1000)
+                results[name][case] = {
+                    'median_ms': round(statistics.median(wall), 2),
+                    'cpu_ms': round(statistics.median(cpu), 2),
+                    'queries': len(queries) // attempts,
+                }
+        return results
+
+    def flood(self, requests):
+        """Wrong passwords against one account from one IP, through the real view"""
+        caches['default'].clear()
+        client = Client(HTTP_HOST='localhost')
+        body = json.dumps({'username': 'bench-login@example.com', 'password': 'wrong'})
+        statuses = {}
+        # Every refused attempt would otherwise log a warning
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        started, started_cpu = time.perf_counter(), time.process_time()
+        try:
+            for _ in range(requests):
+                response = client.post('/login/', body, content_type='application/json')
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        finally:
+            request_logger.setLevel(level)
+        elapsed, cpu = time.perf_counter() - started, time.process_time() - started_cpu
+        caches['default'].clear()
+        return {
+            'requests': requests,
+            'statuses': {str(code): count for code, count in sorted(statuses.items())},
+            'seconds': round(elapsed, 3),
+            'cpu_ms_per_request': round(cpu * 1000 / requests, 2),
+        }
+
+    def report(self, results):
+        for name, cases in results['authenticate'].items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for case, result in cases.items():
+                self.stdout.write(f"  {case}: median {result['median_ms']} ms, cpu {result['cpu_ms']} ms, "
+                                  f"{result['queries']} queries")
+        flood = results['flood']
+        self.stdout.write(self.style.MIGRATE_HEADING('throttled flood'))
+        self.stdout.write(f"  {flood['requests']} attempts in {flood['seconds']}s -> {flood['statuses']}, "
+                          f"cpu {flood['cpu_ms_per_request']} ms per attempt")
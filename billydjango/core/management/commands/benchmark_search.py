@@ -0,0 +1,214 @@
+import json
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core import ledger, search, timing
+from core.models import Expense, Income
+from core.pagination import DEFAULT_PAGE_SIZE, ORDERING
+
+MERCHANTS = ['Whole Foods', 'Trader Joes', 'Shell', 'Amazon', 'Netflix', 'Uber', 'Starbucks', 'Costco',
+             'Walgreens', 'Delta Airlines', 'Home Depot', 'Spotify', 'Chipotle', 'Target', 'Lyft']
+CATEGORIES = ['groceries', 'fuel', 'subscription', 'coffee', 'travel', 'pharmacy', 'household', 'dinner',
+              'lunch', 'gift', 'rent', 'utilities', 'insurance', 'books', 'parking']
+SOURCES = ['Salary', 'Freelance design', 'Freelance writing', 'Dividends', 'Refund', 'Gift', 'Bonus',
+           'Interest', 'Rental income', 'Side project']
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch SQLite database with incomes and expenses and compare the "
+        "FTS5 search index with the icontains (LIKE) queries it replaces"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500_000, help="Expenses; a fifth as many incomes")
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20, help="Timed runs per query")
+        parser.add_argument('--db', help="Scratch database file (default: a temp file, deleted afterwards)")
+        parser.add_argument('--json', action='store_true', help="Print results as JSON")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(options['db'] or Path(tmp) / 'bench.sqlite3')
+            db = sqlite3.connect(path)
+            for table in ('core_search', 'core_income', 'core_expense'):
+                db.execute(f'DROP TABLE IF EXISTS {table}')
+            for sql in self.schema():
+                db.execute(sql)
+            self.seed(db, options['rows'], options['users'])
+
+            started = time.perf_counter()
+            self.build_index(db)
+            index_seconds = time.perf_counter() - started
+            db.execute('ANALYZE')
+
+            results = {
+                'rows': {'expenses': options['rows'], 'incomes': options['rows'] // 5},
+                'users': options['users'],
+                'index_build_seconds': round(index_seconds, 3),
+                'queries': {},
+            }
+            for name, (like, fts) in self.queries(user_id=1).items():
+                results['queries'][name] = {
+                    'like': self.measure(db, *like, options['repeat']),
+                    'fts': self.measure(db, *fts, options['repeat']),
+                }
+            results['insert_cost'] = self.insert_overhead(db)
+            db.close()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.report(results)
+
+    def schema(self):
+        with connection.schema_editor(collect_sql=True) as editor:
+            editor.create_model(Income)
+            editor.create_model(Expense)
+        return [sql.rstrip(';') for sql in editor.collected_sql]
+
+    def seed(self, db, rows, users):
+        self.stderr.write(f"Seeding {rows:,} expenses and {rows // 5:,} incomes for {users} users...")
+        rng = random.Random(42)
+        start = date(2015, 1, 1)
+
+        def generate(count, label):
+            for _ in range(count):
+                yield (
+                    f'{rng.randrange(1, 500000) / 100:.2f}',
+                    label(),
+                    (start + timedelta(days=rng.randrange(4000))).isoformat(),
+                    '2020-01-01 00:00:00',
+                    rng.randrange(1, users + 1),
+                )
+
+        def description():
+            return f'{rng.choice(MERCHANTS)} {rng.choice(CATEGORIES)} #{rng.randrange(100000)}'
+
+        with db:
+            db.executemany(
+                'INSERT INTO core_expense (amount, description, date, created_at, user_id, version) '
+                'VALUES (?, ?, ?, ?, ?, 0)',
+                generate(rows, description),
+            )
+            db.executemany(
+                'INSERT INTO core_income (amount, source, date, created_at, user_id, version) '
+                'VALUES (?, ?, ?, ?, ?, 0)',
+                generate(rows // 5, lambda: rng.choice(SOURCES)),
+            )
+
+    def build_index(self, db):
+        """What migration 0008 / search.rebuild() do, against the scratch file"""
+        db.execute(
+            f"CREATE VIRTUAL TABLE {search.TABLE} USING "
+            "fts5(owned, text, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        with db:
+            for kind, parity in search.PARITY.items():
+                model = ledger.MODELS[kind]
+                rows = db.execute(
+                    f'SELECT id, user_id, {ledger.label_field(model)} FROM {model._meta.db_table}'
+                ).fetchall()
+                db.executemany(
+                    f'INSERT INTO {search.TABLE} (rowid, owned, text) VALUES (?, ?, ?)',
+                    ((pk * 2 + parity, search.owned_text(user_id, text), text) for pk, user_id, text in rows),
+                )
+            db.execute(f"INSERT INTO {search.TABLE} ({search.TABLE}) VALUES ('optimize')")
+
+    def insert_overhead(self, db):
+        """
+        Per-row cost of an expense insert with and without its index entry:
+        one commit per row (as the JSON views write) and one commit per
+        1,000 rows (as the importer writes).
+        """
+        text = 'Corner shop groceries'
+        row_sql = ("INSERT INTO core_expense (amount, description, date, created_at, user_id, version) "
+                   f"VALUES ('1.00', '{text}', '2024-01-01', '2024-01-01 00:00:00', 1, 0)")
+        index_sql = f'INSERT INTO {search.TABLE} (rowid, owned, text) VALUES (?, ?, ?)'
+        parity = search.PARITY[ledger.EXPENSE]
+
+        def insert(indexed):
+            pk = db.execute(row_sql).lastrowid
+            if indexed:
+                db.execute(index_sql, (pk * 2 + parity, search.owned_text(1, text), text))
+
+        db.isolation_level = None
+        results = {}
+        for run, indexed in (('with_index', True), ('without_index', False)):
+            started = time.perf_counter()
+            for _ in range(200):
+                db.execute('BEGIN')
+                insert(indexed)
+                db.execute('COMMIT')
+            single = (time.perf_counter() - started) / 200
+            started = time.perf_counter()
+            db.execute('BEGIN')
+            for _ in range(1000):
+                insert(indexed)
+            db.execute('COMMIT')
+            batch = (time.perf_counter() - started) / 1000
+            results[run] = {'single_row_ms': round(single * 1000, 3), 'batch_row_ms': round(batch * 1000, 3)}
+        return results
+
+    def compile(self, sql, params):
+        """Django's %s / %% placeholders to sqlite3's"""
+        return sql.replace('%s', '?').replace('%%', '%'), [p if isinstance(p, (int, float)) else str(p) for p in params]
+
+    def compile_queryset(self, queryset):
+        return self.compile(*queryset.query.get_compiler(connection=connection).as_sql())
+
+    def queries(self, user_id):
+        """(LIKE, FTS) pairs of the SQL the app runs, before and after the index"""
+        compiled = {}
+        for query in ['gro', 'whole foods', 'coffee star', 'freelance']:
+            like = Expense.objects.filter(search.like_filter(Expense, query))
+            mine = like.filter(user_id=user_id).order_by(*ORDERING)[:DEFAULT_PAGE_SIZE + 1]
+            compiled[f'user search "{query}"'] = (
+                self.compile_queryset(mine),
+                self.compile(*search.ranked_query(user_id, query, ledger.EXPENSE, DEFAULT_PAGE_SIZE + 1)),
+            )
+            admin = Expense.objects.order_by(*ORDERING)
+            compiled[f'admin search "{query}"'] = (
+                self.compile_queryset(admin.filter(search.like_filter(Expense, query))[:100]),
+                self.compile_queryset(admin.filter(search.matching(Expense, query))[:100]),
+            )
+        return compiled
+
+    def measure(self, db, sql, params, repeat):
+        plan = [row[3] for row in db.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            count = len(db.execute(sql, params).fetchall())
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return {
+            'plan': plan,
+            'rows': count,
+            'median_ms': round(statistics.median(timings), 3) if timings else None,
+            'p95_ms': round(timing.percentile(timings, 95), 3) if timings else None,
+        }
+
+    def report(self, results):
+        rows = results['rows']
+        self.stdout.write(f"{rows['expenses']:,} expenses, {rows['incomes']:,} incomes, {results['users']} users "
+                          f"(index build {results['index_build_seconds']}s)")
+        for name, runs in results['queries'].items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for run, result in runs.items():
+                self.stdout.write(f"  {run}: median {result['median_ms']} ms, p95 {result['p95_ms']} ms, "
+                                  f"{result['rows']} rows")
+                for step in result['plan']:
+                    self.stdout.write(f"      {step}")
+        self.stdout.write(self.style.MIGRATE_HEADING("insert cost per row"))
+        for run, cost in results['insert_cost'].items():
+            self.stdout.write(f"  {run}: {cost['single_row_ms']} ms committed one by one, "
+                              f"{cost['batch_row_ms']} ms in a batch of 1,000")
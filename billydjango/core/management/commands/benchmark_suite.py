@@ -0,0 +1,279 @@
+import itertools
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import date
+from http.cookiejar import CookieJar
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from core import seeding, timing
+
+SCENARIOS = ['check_auth', 'dashboard', 'add_delete', 'login']
+
+
+class InProcessSession:
+    """Requests through Django's test client in this process; counts queries on every database"""
+
+    # Every request comes from its own address, as if from many clients, so
+    # the per-IP login throttle doesn't turn the login scenario into 429s
+    addresses = itertools.count(1)
+
+    def __init__(self):
+        # Failures come back as 500s, as they would from a server
+        self.client = Client(HTTP_HOST='localhost', raise_request_exception=False)
+
+    def login(self, username, password):
+        self.client.force_login(User.objects.get(username=username))
+
+    def request(self, method, path, body=None):
+        number = next(self.addresses)
+        address = f'10.{number >> 16 & 255}.{number >> 8 & 255}.{number & 255}'
+        with ExitStack() as stack:
+            captures = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+            if method == 'GET':
+                response = self.client.get(path, REMOTE_ADDR=address)
+            else:
+                response = self.client.post(path, json.dumps(body or {}), content_type='application/json',
+                                            REMOTE_ADDR=address)
+            content = b''.join(response.streaming_content) if response.streaming else response.content
+        return response.status_code, content, sum(len(capture) for capture in captures)
+
+
+class HttpSession:
+    """
+    Requests over HTTP to a running server; queries come from its
+    Server-Timing header, if sent. All requests share this machine's
+    address, so logins past LOGIN_THROTTLE['ip'] get 429s.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+
+    def login(self, username, password):
+        status, content, _ = self.request('POST', '/login/', {'username': username, 'password': password})
+        if status != 200:
+            raise CommandError(f"Logging in {username} against the server failed: {status} {content[:200]!r}")
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body or {}).encode() if method != 'GET' else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with self.opener.open(request) as response:
+                status, content, header = response.status, response.read(), response.headers.get('Server-Timing')
+        except urllib.error.HTTPError as error:
+            status, content, header = error.code, error.read(), error.headers.get('Server-Timing')
+        return status, content, self.queries(header)
+
+    def queries(self, header):
+        # e.g. 'db;dur=1.2;desc="3 queries", total;dur=5.1' (BILLY_INSTRUMENTATION=1)
+        for metric in (header or '').split(','):
+            if metric.strip().startswith('db;') and 'desc="' in metric:
+                return int(metric.split('desc="', 1)[1].split()[0])
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive check-auth, the dashboard, add/delete and login at a given concurrency, in-process "
+        "through the test client or against a running server (--url), as users created by "
+        "seed_data. Reports throughput, latency percentiles and queries per operation; save the "
+        "JSON with --output and pass it to --compare on another commit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Base URL of a running server (default: in-process)")
+        parser.add_argument('--concurrency', type=int, default=8, help="Concurrent clients, one user each")
+        parser.add_argument('--requests', type=int, default=500, help="Timed operations per scenario")
+        parser.add_argument('--warmup', type=int, default=20, help="Untimed operations per scenario")
+        parser.add_argument('--scenario', choices=SCENARIOS, action='append', help="Default: all")
+        parser.add_argument('--prefix', default=seeding.USERNAME_PREFIX, help="seed_data username prefix")
+        parser.add_argument('--password', default=seeding.PASSWORD)
+        parser.add_argument('--output', help="Also write the JSON results to this file")
+        parser.add_argument('--compare', help="JSON results of an earlier run to compare against")
+        parser.add_argument('--json', action='store_true', help="Print results as JSON")
+
+    def handle(self, *args, **options):
+        concurrency = max(options['concurrency'], 1)
+        usernames = list(
+            User.objects.filter(username__startswith=options['prefix'])
+            .order_by('id').values_list('username', flat=True)[:concurrency]
+        )
+        if not usernames:
+            raise CommandError(f"No users named '{options['prefix']}...'; run seed_data first.")
+
+        clients = []
+        for number in range(concurrency):
+            username = usernames[number % len(usernames)]
+            session = HttpSession(options['url']) if options['url'] else InProcessSession()
+            session.login(username, options['password'])
+            clients.append((session, username))
+
+        results = {'meta': self.meta(options, concurrency, len(usernames)), 'scenarios': {}}
+        # Refused logins, bad requests and failed writes would otherwise log one each
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            for name in options['scenario'] or SCENARIOS:
+                operation = getattr(self, f'op_{name}')
+                self.run(clients, operation, options['warmup'], options['password'])
+                results['scenarios'][name] = self.run(clients, operation, options['requests'], options['password'])
+        finally:
+            request_logger.setLevel(level)
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            baseline = None
+            if options['compare']:
+                with open(options['compare']) as previous:
+                    baseline = json.load(previous)
+            self.report(results, baseline)
+
+    def meta(self, options, concurrency, users):
+        """Enough context to tell two result files apart"""
+        def git(*args):
+            try:
+                done = subprocess.run(['git', *args], cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=10)
+            except (OSError, subprocess.SubprocessError):
+                return None
+            return done.stdout.strip() if done.returncode == 0 else None
+
+        status = git('status', '--porcelain', '--untracked-files=no')
+        return {
+            'commit': git('rev-parse', '--short', 'HEAD'),
+            'dirty': bool(status) if status is not None else None,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'target': options['url'] or 'in-process',
+            'async_views': settings.ASYNC_VIEWS,
+            'db_profile': settings.DB_PROFILE,
+            'session_engine': settings.SESSION_ENGINE,
+            'concurrency': concurrency,
+            'users': users,
+        }
+
+    # ============================================
+    # Operations: each returns [(status, queries)] for the requests it made
+    # ============================================
+
+    def op_check_auth(self, session, username, password):
+        status, _, queries = session.request('GET', '/api/check-auth/')
+        return [(status, queries)]
+
+    def op_dashboard(self, session, username, password):
+        status, _, queries = session.request('GET', '/api/dashboard/')
+        return [(status, queries)]
+
+    def op_add_delete(self, session, username, password):
+        body = {'amount': '12.34', 'source': 'Benchmark', 'date': date.today().isoformat()}
+        status, content, queries = session.request('POST', '/income/add/', body)
+        if status != 201:
+            return [(status, queries)]
+        income_id = json.loads(content)['id']
+        deleted, _, delete_queries = session.request('POST', f'/income/delete/{income_id}/')
+        return [(status, queries), (deleted, delete_queries)]
+
+    def op_login(self, session, username, password):
+        status, _, queries = session.request('POST', '/login/', {'username': username, 'password': password})
+        return [(status, queries)]
+
+    def run(self, clients, operation, count, password):
+        """`count` operations shared out between the (session, username) clients, all running at once"""
+        remaining = [count]
+        latencies, statuses, queries, errors = [], {}, [], [0]
+        lock = threading.Lock()
+
+        def worker(session, username):
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                started = time.perf_counter()
+                try:
+                    made = operation(session, username, password)
+                except (OSError, ValueError):
+                    # Connection failures, unreadable responses
+                    with lock:
+                        errors[0] += 1
+                    continue
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed * 1000)
+                    for status, _ in made:
+                        statuses[status] = statuses.get(status, 0) + 1
+                    if all(made_queries is not None for _, made_queries in made):
+                        queries.append(sum(made_queries for _, made_queries in made))
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(clients)) as pool:
+            for future in [pool.submit(worker, session, username) for session, username in clients]:
+                future.result()
+        return self.summarize(latencies, statuses, queries, errors[0], time.perf_counter() - started)
+
+    def summarize(self, latencies, statuses, queries, errors, elapsed):
+        latencies.sort()
+
+        def percentile(p):
+            return round(timing.percentile(latencies, p), 2) if latencies else None
+
+        return {
+            'operations': len(latencies),
+            'operations_per_second': round(len(latencies) / elapsed, 1),
+            'median_ms': round(statistics.median(latencies), 2) if latencies else None,
+            'p95_ms': percentile(95),
+            'p99_ms': percentile(99),
+            'max_ms': round(latencies[-1], 2) if latencies else None,
+            'queries_per_operation': round(statistics.mean(queries), 1) if queries else None,
+            'max_queries': max(queries) if queries else None,
+            'statuses': {str(code): count for code, count in sorted(statuses.items())},
+            'errors': errors,
+            'seconds': round(elapsed, 3),
+        }
+
+    def report(self, results, baseline=None):
+        meta = results['meta']
+        self.stdout.write(
+            f"{meta['target']} at commit {meta['commit']}{' (dirty)' if meta['dirty'] else ''}, "
+            f"{meta['concurrency']} clients, {'async' if meta['async_views'] else 'sync'} views, "
+            f"db profile {meta['db_profile']}"
+        )
+        if baseline:
+            self.stdout.write(f"compared with commit {baseline['meta'].get('commit')}")
+        self.stdout.write('')
+        for name, run in results['scenarios'].items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            queries = '' if run['queries_per_operation'] is None else f", {run['queries_per_operation']} queries/op"
+            self.stdout.write(f"  {run['operations_per_second']} ops/s, median {run['median_ms']} ms, "
+                              f"p95 {run['p95_ms']} ms, p99 {run['p99_ms']} ms{queries}")
+            self.stdout.write(f"  statuses {run['statuses']}" + (f", {run['errors']} errors" if run['errors'] else ''))
+            before = (baseline or {}).get('scenarios', {}).get(name)
+            if before:
+                self.stdout.write(f"  vs baseline: {self.change(before['operations_per_second'], run['operations_per_second'])} ops/s, "
+                                  f"{self.change(before['p95_ms'], run['p95_ms'])} p95")
+
+    def change(self, before, after):
+        if not before or after is None:
+            return 'n/a'
+        return f"{(after - before) / before * 100:+.1f}%"
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import budgets
+
+
+class Command(BaseCommand):
+    help = (
+        "Email the queued budget alerts and mark them delivered. Runs until the queue is empty; "
+        "with --interval it keeps polling, as a worker. Run one at a time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=budgets.DELIVERY_BATCH_SIZE,
+                            help="Alerts per email connection")
+        parser.add_argument('--interval', type=float, help="Seconds between polls once the queue is empty")
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        delivered = 0
+        while True:
+            sent = budgets.deliver(batch_size)
+            delivered += sent
+            if sent:
+                continue
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f"Delivered {delivered} budget alerts."))
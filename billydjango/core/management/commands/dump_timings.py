@@ -0,0 +1,50 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core import timing
+
+
+class Command(BaseCommand):
+    help = (
+        "Print per-endpoint latency, DB time and query count percentiles collected by "
+        "InstrumentationMiddleware, merged across the worker processes that have flushed"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', help="Only this view name, e.g. core:dashboard-api")
+        parser.add_argument('--json', action='store_true', help="Print results as JSON")
+        parser.add_argument('--reset', action='store_true', help="Discard the collected histograms afterwards")
+
+    def handle(self, *args, **options):
+        results = {
+            endpoint: {
+                metric: histogram.summary(integer=metric in timing.INTEGER_METRICS)
+                for metric, histogram in metrics.items()
+            }
+            for endpoint, metrics in sorted(timing.collect().items())
+            if options['endpoint'] in (None, endpoint)
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        elif not results:
+            self.stdout.write("No timings collected yet (is BILLY_INSTRUMENTATION=1 set on the server?)")
+        else:
+            self.report(results)
+
+        if options['reset']:
+            timing.reset()
+            self.stderr.write("Histograms reset.")
+
+    def report(self, results):
+        for endpoint, metrics in results.items():
+            total, db, serialize, queries = (metrics[name] for name in timing.METRICS)
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{endpoint} ({total['count']} requests)"))
+            for label, summary, unit in [
+                ('total', total, ' ms'), ('db', db, ' ms'), ('serialize', serialize, ' ms'), ('queries', queries, ''),
+            ]:
+                self.stdout.write(
+                    f"  {label:<10} p50 {summary['p50']}{unit}, p95 {summary['p95']}{unit}, "
+                    f"p99 {summary['p99']}{unit}, max {summary['max']}{unit}"
+                )
@@ -0,0 +1,39 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core import importer
+
+
+class Command(BaseCommand):
+    help = "Stream a CSV or NDJSON file of incomes/expenses into a user's account"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import")
+        parser.add_argument('--user', required=True, metavar='USERNAME')
+        parser.add_argument('--format', choices=importer.FORMATS, help="Default: guessed from the file name")
+        parser.add_argument('--type', choices=['income', 'expense'], help="Type for rows without a 'type' column")
+        parser.add_argument('--batch-size', type=int, default=importer.DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['user']}' does not exist.")
+
+        fmt = options['format'] or importer.guess_format(options['path'])
+        if fmt is None:
+            raise CommandError("Can't tell the format from the file name; pass --format.")
+
+        with open(options['path'], 'rb') as stream:
+            report = importer.import_records(
+                importer.read_records(stream, fmt), user, options['type'], max(options['batch_size'], 1)
+            )
+
+        for error in report.errors:
+            self.stderr.write(f"row {error['row']}: {error['errors']}")
+        if report.failed > len(report.errors):
+            self.stderr.write(f"... and {report.failed - len(report.errors)} more failed rows")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report.imported} rows ({report.incomes} incomes, {report.expenses} expenses); "
+            f"{report.failed} failed."
+        ))
@@ -0,0 +1,24 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core import ledger
+
+
+class Command(BaseCommand):
+    help = "Backfill or rebuild the MonthlyRollup analytics tables from Income/Expense"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', action='append', dest='usernames', metavar='USERNAME',
+            help="Limit to this user (repeatable). Default: everyone",
+        )
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['usernames']:
+            user_ids = list(User.objects.filter(username__in=options['usernames']).values_list('pk', flat=True))
+            if len(user_ids) != len(set(options['usernames'])):
+                raise CommandError("One or more usernames do not exist.")
+
+        count = ledger.rebuild_rollups(user_ids)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} rollup rows."))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild (or, with --verify, check) the full-text search index over incomes and expenses"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help="Only compare the index with the transaction tables; exit non-zero on drift",
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            return self.verify()
+
+        count = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} rows."))
+
+    def verify(self):
+        drifted = {kind: count for kind, count in search.drift().items() if count}
+        for kind, count in drifted.items():
+            self.stdout.write(f"{kind}: {count} rows missing, stale or orphaned")
+        if drifted:
+            raise CommandError("The search index is out of date; run rebuild_search_index.")
+        self.stdout.write(self.style.SUCCESS("The search index matches the transaction tables."))
@@ -0,0 +1,56 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core import ledger
+from core.models import UserSummary
+
+
+class Command(BaseCommand):
+    help = "Rebuild (or, with --verify, check) the per-user UserSummary totals"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help="Only compare stored totals with the transaction tables; exit non-zero on drift",
+        )
+        parser.add_argument(
+            '--user', action='append', dest='usernames', metavar='USERNAME',
+            help="Limit to this user (repeatable). Default: everyone",
+        )
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['usernames']:
+            user_ids = list(User.objects.filter(username__in=options['usernames']).values_list('pk', flat=True))
+            if len(user_ids) != len(set(options['usernames'])):
+                raise CommandError("One or more usernames do not exist.")
+
+        if options['verify']:
+            return self.verify(user_ids)
+
+        with transaction.atomic():
+            count = ledger.rebuild_summaries(user_ids)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} user summaries."))
+
+    def verify(self, user_ids):
+        expected = ledger.compute_summaries(user_ids)
+        # compute_summaries() covers every stored summary, at zero if its rows are gone
+        stored = UserSummary.objects.in_bulk(list(expected) if user_ids is not None else None)
+
+        fields = ['total_income', 'total_expenses', 'income_count', 'expense_count']
+        drifted = 0
+        for user_id, summary in expected.items():
+            current = stored.get(user_id)
+            diffs = [
+                f"{field}: stored={getattr(current, field) if current else 'missing'} actual={getattr(summary, field)}"
+                for field in fields
+                if current is None or getattr(current, field) != getattr(summary, field)
+            ]
+            if diffs:
+                drifted += 1
+                self.stdout.write(f"user {user_id}: " + ", ".join(diffs))
+
+        if drifted:
+            raise CommandError(f"{drifted} of {len(expected)} summaries are out of date.")
+        self.stdout.write(self.style.SUCCESS(f"All {len(expected)} summaries match."))
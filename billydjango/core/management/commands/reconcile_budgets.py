@@ -0,0 +1,49 @@
+from datetime import datetime
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core import budgets
+
+
+def month(value):
+    return datetime.strptime(value, '%Y-%m').date()
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the budget spend counters from the monthly rollups, in bulk (or, with "
+        "--verify, only report the ones that are off)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help="Only compare the counters with the rollups; exit non-zero on drift",
+        )
+        parser.add_argument(
+            '--user', action='append', dest='usernames', metavar='USERNAME',
+            help="Limit to this user (repeatable). Default: everyone",
+        )
+        parser.add_argument(
+            '--month', action='append', dest='months', type=month, metavar='YYYY-MM',
+            help="Limit to this month (repeatable). Default: every month",
+        )
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['usernames']:
+            user_ids = list(User.objects.filter(username__in=options['usernames']).values_list('pk', flat=True))
+            if len(user_ids) != len(set(options['usernames'])):
+                raise CommandError("One or more usernames do not exist.")
+
+        corrected = budgets.reconcile(user_ids, options['months'], save=not options['verify'])
+        if not options['verify']:
+            self.stdout.write(self.style.SUCCESS(f"Corrected {len(corrected)} budget counters."))
+            return
+
+        for counter in corrected:
+            self.stdout.write(f"budget {counter.budget_id} {counter.month:%Y-%m}: actual spent={counter.spent}")
+        if corrected:
+            raise CommandError(f"{len(corrected)} budget counters are out of date.")
+        self.stdout.write(self.style.SUCCESS("All budget counters match."))
@@ -0,0 +1,49 @@
+import time
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core import importer, seeding
+
+
+class Command(BaseCommand):
+    help = (
+        "Create N users with realistic, deterministic incomes and expenses for load testing "
+        "(same --seed, same data). Users are named <prefix>000001... and share one password."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--rows', type=int, default=100_000, help="Incomes and expenses in total")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default=seeding.USERNAME_PREFIX, help="Username prefix")
+        parser.add_argument('--months', type=int, default=seeding.DEFAULT_MONTHS, help="Months of history")
+        parser.add_argument('--end', type=date.fromisoformat, default=seeding.DEFAULT_END,
+                            help="Last day of the history, YYYY-MM-DD")
+        parser.add_argument('--batch-size', type=int, default=importer.DEFAULT_BATCH_SIZE,
+                            help="Rows per transaction")
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['rows'] < 0 or options['months'] < 1:
+            raise CommandError("--users and --months must be at least 1, --rows at least 0.")
+        if User.objects.filter(username__startswith=options['prefix']).exists():
+            raise CommandError(f"Users named '{options['prefix']}...' already exist; pick another --prefix.")
+
+        rows = options['rows']
+        started = time.perf_counter()
+
+        def progress(written):
+            self.stderr.write(f"\r{written:,}/{rows:,} rows", ending='')
+
+        totals = seeding.seed(
+            options['users'], rows, seed=options['seed'], prefix=options['prefix'], end=options['end'],
+            months=options['months'], batch_size=max(options['batch_size'], 1), progress=progress,
+        )
+        elapsed = time.perf_counter() - started
+        if rows:
+            self.stderr.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {totals['users']:,} users with {totals['incomes']:,} incomes and {totals['expenses']:,} "
+            f"expenses in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s). Password: {seeding.PASSWORD}"
+        ))
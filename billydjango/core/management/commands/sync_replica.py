@@ -0,0 +1,47 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from core.routers import REPLICA
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database onto the replica file with SQLite's online "
+        "backup API; with --interval, keep doing so as the replica stand-in's sync job"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help="Seconds between copies; runs until interrupted")
+
+    def handle(self, *args, **options):
+        if REPLICA not in settings.DATABASES:
+            raise CommandError("No replica configured; set BILLY_REPLICA_DB.")
+        interval = options['interval']
+        if interval is not None and interval >= settings.REPLICA_STICKY_SECONDS:
+            self.stderr.write(self.style.WARNING(
+                f"--interval is not below REPLICA_STICKY_SECONDS ({settings.REPLICA_STICKY_SECONDS}s); "
+                "users may not see their own writes."
+            ))
+
+        while True:
+            started = time.perf_counter()
+            self.sync()
+            self.stdout.write(f"Replica synced in {time.perf_counter() - started:.3f}s")
+            if interval is None:
+                return
+            time.sleep(interval)
+
+    def sync(self):
+        source = sqlite3.connect(settings.DATABASES[DEFAULT_DB_ALIAS]['NAME'])
+        target = sqlite3.connect(settings.DATABASES[REPLICA]['NAME'], timeout=30)
+        try:
+            # One step: the replica switches from the old copy to the new one
+            # in a single transaction, so readers never see a half-copied file
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
@@ -0,0 +1,135 @@
+"""
+Project middleware.
+
+InstrumentationMiddleware (only when INSTRUMENTATION_ENABLED) counts and
+times each request's queries and reports them with core.timing.
+
+CachedAuthenticationMiddleware stands in for Django's
+AuthenticationMiddleware: instead of loading the User row on every
+authenticated request, it rebuilds the user from a cached copy of the few
+columns requests actually use, and checks the session's auth hash against
+a cached copy of the user's, like django.contrib.auth does. The password
+hash itself is never cached. Together with a cache-backed or
+signed-cookie session (BILLY_SESSION_MODE), a polled endpoint such as
+check_auth needs no query at all.
+"""
+import json
+import logging
+from contextlib import ExitStack
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from . import timing
+
+logger = logging.getLogger('core.timing')
+
+# Anything else on the instance, the password included, stays deferred and
+# is loaded on first access
+CACHED_FIELDS = [
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in {
+        'id', 'username', 'first_name', 'last_name', 'email', 'is_active', 'is_staff', 'is_superuser',
+    }
+]
+
+
+def _cache():
+    return caches[settings.SESSION_CACHE_ALIAS]
+
+
+def _user_key(user_id):
+    return f'auth-user:{user_id}'
+
+
+def forget_user(user_id):
+    """Drop the cached copy; called whenever the User row changes"""
+    _cache().delete(_user_key(user_id))
+
+
+def _load_user(request):
+    """request.user, from the cache when the session checks out against it"""
+    user_id = request.session.get(SESSION_KEY)
+    values = _cache().get(_user_key(user_id)) if user_id is not None else None
+    if values is None:
+        user = auth.get_user(request)
+        if user.is_authenticated:
+            _cache().set(
+                _user_key(user.pk),
+                ([getattr(user, name) for name in CACHED_FIELDS], user.get_session_auth_hash()),
+                settings.USER_CACHE_TIMEOUT,
+            )
+        return user
+
+    values, auth_hash = values
+    user = User.from_db(DEFAULT_DB_ALIAS, CACHED_FIELDS, values)
+    session_hash = request.session.get(HASH_SESSION_KEY)
+    if not user.is_active or not session_hash or not constant_time_compare(session_hash, auth_hash):
+        # Let Django decide (fallback secret keys, flushing a stale session)
+        return auth.get_user(request)
+    return user
+
+
+def _get_user(request):
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = _load_user(request)
+    return request._cached_user
+
+
+async def _aget_user(request):
+    # Same cache slot as _get_user, so request.user is free once this ran
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = await sync_to_async(_load_user)(request)
+    return request._cached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: _get_user(request))
+        request.auser = partial(_aget_user, request)
+
+
+class InstrumentationMiddleware:
+    """
+    Query count, DB time, serialization time and total time per request,
+    as a Server-Timing header, a JSON log line on the 'core.timing' logger
+    and per-endpoint histograms (see `manage.py dump_timings`). Put it
+    first in MIDDLEWARE so the total covers the other middleware too.
+    """
+
+    def __init__(self, get_response):
+        if not settings.INSTRUMENTATION_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with timing.request_timings() as timings, ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timings.execute_wrapper))
+            response = self.get_response(request)
+
+        metrics = timings.finish()
+        match = request.resolver_match
+        endpoint = match.view_name if match else '<unresolved>'
+        response['Server-Timing'] = timing.server_timing(metrics)
+        timing.record(endpoint, metrics)
+
+        level = logging.WARNING if metrics['queries'] > settings.INSTRUMENTATION_QUERY_WARNING else logging.INFO
+        logger.log(level, json.dumps({
+            'endpoint': endpoint,
+            'method': request.method,
+            'status': response.status_code,
+            **metrics,
+        }))
+        return response
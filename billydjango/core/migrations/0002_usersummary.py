@@ -0,0 +1,49 @@
+# Generated by Django 6.0.2 on 2026-10-18 17:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_summaries(apps, schema_editor):
+    """Compute totals for users who already have transactions"""
+    Income = apps.get_model('core', 'Income')
+    Expense = apps.get_model('core', 'Expense')
+    UserSummary = apps.get_model('core', 'UserSummary')
+
+    summaries = {}
+    for row in Income.objects.order_by().values('user_id').annotate(total=Sum('amount'), n=Count('id')):
+        summary = summaries.setdefault(row['user_id'], UserSummary(user_id=row['user_id']))
+        summary.total_income, summary.income_count = row['total'], row['n']
+    for row in Expense.objects.order_by().values('user_id').annotate(total=Sum('amount'), n=Count('id')):
+        summary = summaries.setdefault(row['user_id'], UserSummary(user_id=row['user_id']))
+        summary.total_expenses, summary.expense_count = row['total'], row['n']
+    UserSummary.objects.bulk_create(summaries.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_income', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_expenses', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('income_count', models.PositiveIntegerField(default=0)),
+                ('expense_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'User summary',
+                'verbose_name_plural': 'User summaries',
+            },
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
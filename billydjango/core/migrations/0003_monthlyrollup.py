@@ -0,0 +1,60 @@
+# Generated by Django 6.0.2 on 2026-10-18 17:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def backfill_rollups(apps, schema_editor):
+    """Aggregate existing transactions into monthly buckets"""
+    MonthlyRollup = apps.get_model('core', 'MonthlyRollup')
+
+    rollups = {}
+    for kind, model_name, label in [('income', 'Income', 'source'), ('expense', 'Expense', 'description')]:
+        model = apps.get_model('core', model_name)
+        grouped = (
+            model.objects.order_by()
+            .annotate(month=TruncMonth('date'))
+            .values('user_id', 'month', label)
+            .annotate(total=Sum('amount'), n=Count('id'))
+        )
+        for row in grouped.iterator(chunk_size=2000):
+            bucket = ' '.join(row[label].split()).lower()[:200]
+            key = (row['user_id'], row['month'], kind, bucket)
+            if key not in rollups:
+                rollups[key] = MonthlyRollup(
+                    user_id=row['user_id'], month=row['month'], kind=kind, bucket=bucket, total=0, count=0
+                )
+            rollups[key].total += row['total']
+            rollups[key].count += row['n']
+    MonthlyRollup.objects.bulk_create(rollups.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_usersummary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('income', 'Income'), ('expense', 'Expense')], max_length=7)),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('bucket', models.CharField(max_length=200)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['month', 'kind', 'bucket'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'month', 'kind', 'bucket'), name='core_rollup_unique_bucket')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
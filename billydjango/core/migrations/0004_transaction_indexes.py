@@ -0,0 +1,23 @@
+# Generated by Django 6.0.2 on 2026-10-18 17:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_monthlyrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['user', '-date', '-created_at', '-id', 'amount'], name='core_expense_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='income',
+            index=models.Index(fields=['user', '-date', '-created_at', '-id', 'amount'], name='core_income_user_date_idx'),
+        ),
+    ]
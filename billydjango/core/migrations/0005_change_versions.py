@@ -0,0 +1,65 @@
+# Generated by Django 6.0.2 on 2026-10-18 17:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def stamp_existing_rows(apps, schema_editor):
+    """Existing rows all count as version 1, so ?since=0 returns them"""
+    for model_name in ['Income', 'Expense', 'UserSummary']:
+        apps.get_model('core', model_name).objects.update(version=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_transaction_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('income', 'Income'), ('expense', 'Expense')], max_length=7)),
+                ('object_id', models.BigIntegerField()),
+                ('version', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='version',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='income',
+            name='version',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='usersummary',
+            name='version',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['user', 'version'], name='core_expense_user_version_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='income',
+            index=models.Index(fields=['user', 'version'], name='core_income_user_version_idx'),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tombstones', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['user', 'version'], name='core_tombstone_user_ver_idx'),
+        ),
+        migrations.RunPython(stamp_existing_rows, migrations.RunPython.noop),
+    ]
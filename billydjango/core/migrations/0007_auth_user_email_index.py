@@ -0,0 +1,20 @@
+# Generated by Django 6.0.2 on 2026-10-18 17:42
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_idempotencykey'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    # auth_user.email has no index of its own; core.backends looks users up
+    # by it on every email login
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX "core_auth_user_email_idx" ON "auth_user" ("email")',
+            reverse_sql='DROP INDEX "core_auth_user_email_idx"',
+        ),
+    ]
@@ -0,0 +1,48 @@
+import re
+import unicodedata
+
+from django.db import migrations
+
+# FTS5 index over Income.source and Expense.description (see core.search).
+# rowid is id * 2 for incomes and id * 2 + 1 for expenses. The tokenizing
+# below is a frozen copy of core.search's, so that later changes to that
+# module don't change what this migration does.
+
+WORD = re.compile(r'[^\W_]+')
+CHUNK_SIZE = 5000
+
+
+def terms(text):
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return WORD.findall(''.join(char for char in decomposed if not unicodedata.combining(char)))
+
+
+def index_existing_rows(apps, schema_editor):
+    insert = 'INSERT INTO core_search (rowid, owned, text) VALUES (%s, %s, %s)'
+    sources = [('Income', 'source', 0), ('Expense', 'description', 1)]
+    with schema_editor.connection.cursor() as cursor:
+        for model_name, label, parity in sources:
+            rows = apps.get_model('core', model_name).objects.using(schema_editor.connection.alias)
+            documents = []
+            for pk, user_id, text in rows.values_list('id', 'user_id', label).iterator(chunk_size=CHUNK_SIZE):
+                owned = ' '.join(f'u{user_id}x{word}' for word in terms(text))
+                documents.append((pk * 2 + parity, owned, text))
+                if len(documents) == CHUNK_SIZE:
+                    cursor.executemany(insert, documents)
+                    documents = []
+            cursor.executemany(insert, documents)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_auth_user_email_index'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE VIRTUAL TABLE core_search USING fts5(owned, text, tokenize = 'unicode61 remove_diacritics 2')",
+            reverse_sql='DROP TABLE core_search',
+        ),
+        migrations.RunPython(index_existing_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 6.0.2 on 2026-10-18 18:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('income', 'Income'), ('expense', 'Expense')], max_length=7)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('label', models.CharField(help_text='Income source or expense description, e.g. Rent', max_length=200)),
+                ('frequency', models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly'), ('yearly', 'Yearly')], max_length=7)),
+                ('interval', models.PositiveSmallIntegerField(default=1)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('next_due', models.DateField(blank=True, editable=False, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_rules', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='recurring_rule',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='expenses', to='core.recurringrule'),
+        ),
+        migrations.AddField(
+            model_name='income',
+            name='recurring_rule',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='incomes', to='core.recurringrule'),
+        ),
+        migrations.AddConstraint(
+            model_name='expense',
+            constraint=models.UniqueConstraint(condition=models.Q(('recurring_rule__isnull', False)), fields=('recurring_rule', 'date'), name='core_expense_rule_date_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='income',
+            constraint=models.UniqueConstraint(condition=models.Q(('recurring_rule__isnull', False)), fields=('recurring_rule', 'date'), name='core_income_rule_date_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='recurringrule',
+            index=models.Index(fields=['next_due'], name='core_rule_next_due_idx'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 6.0.2 on 2026-10-18 18:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_recurring_rules'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Budget',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(blank=True, help_text='Expense description to limit, e.g. groceries; blank for all expenses', max_length=200)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='budgets', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BudgetAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('threshold', models.PositiveSmallIntegerField(help_text='Percent of the budget, e.g. 80')),
+                ('spent', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('limit', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+                ('budget', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='core.budget')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='budget_alerts', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BudgetSpend',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('spent', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('alerted', models.PositiveSmallIntegerField(default=0)),
+                ('budget', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spend', to='core.budget')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='budget',
+            constraint=models.UniqueConstraint(fields=('user', 'category'), name='core_budget_unique_category'),
+        ),
+        migrations.AddIndex(
+            model_name='budgetalert',
+            index=models.Index(condition=models.Q(('delivered_at__isnull', True)), fields=['id'], name='core_budgetalert_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='budgetalert',
+            index=models.Index(fields=['user', '-created_at'], name='core_budgetalert_user_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='budgetspend',
+            constraint=models.UniqueConstraint(fields=('budget', 'month'), name='core_budgetspend_unique_month'),
+        ),
+    ]
@@ -29,11 +29,46 @@ class Income(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
     
+    version = models.BigIntegerField(default=0, editable=False)
+    # Per-user change version of the last insert/edit (see core.ledger)
+    
+    recurring_rule = models.ForeignKey(
+        'RecurringRule',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=False,
+        related_name='incomes'
+    )
+    # The rule this row was created from, if any (see core.recurring)
+    
     class Meta:
         ordering = ['-date', '-created_at']
         # Show newest incomes first
         verbose_name = 'Income'
         verbose_name_plural = 'Incomes'
+        indexes = [
+            models.Index(
+                fields=['user', '-date', '-created_at', '-id', 'amount'],
+                name='core_income_user_date_idx'
+            ),
+            models.Index(fields=['user', 'version'], name='core_income_user_version_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recurring_rule', 'date'],
+                condition=models.Q(recurring_rule__isnull=False),
+                name='core_income_rule_date_unique'
+            ),
+        ]
+        # One row per rule and day, so a rule can never be materialized twice.
+        # Partial, so it only holds recurring rows (and SQLite can add it
+        # without rebuilding the table); it also serves the rule foreign key.
+        # Matches "WHERE user_id = ? ORDER BY date DESC, created_at DESC, id DESC",
+        # so pages are read straight off the index with no sort step. amount
+        # rides along as a trailing key column so SUM(amount) per user is
+        # index-only too (SQLite has no INCLUDE clause).
     
     def __str__(self):
         return f"{self.source} - ${self.amount} ({self.date})"
@@ -68,13 +103,370 @@ class Expense(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     # When was this record created in the system?
     
+    version = models.BigIntegerField(default=0, editable=False)
+    
+    recurring_rule = models.ForeignKey(
+        'RecurringRule',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=False,
+        related_name='expenses'
+    )
+    
     class Meta:
         ordering = ['-date', '-created_at']
         verbose_name = 'Expense'
         verbose_name_plural = 'Expenses'
+        indexes = [
+            models.Index(
+                fields=['user', '-date', '-created_at', '-id', 'amount'],
+                name='core_expense_user_date_idx'
+            ),
+            models.Index(fields=['user', 'version'], name='core_expense_user_version_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recurring_rule', 'date'],
+                condition=models.Q(recurring_rule__isnull=False),
+                name='core_expense_rule_date_unique'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.description} - ${self.amount} ({self.date})"
         # Shows: "Groceries - $150.00 (2026-02-05)" in admin
 
 
+class UserSummary(models.Model):
+    """
+    UserSummary Model - Running totals for one user
+
+    Kept up to date by core.ledger every time an Income or Expense is
+    created, edited or deleted, so the dashboard reads three numbers
+    instead of summing the user's whole history on every page load.
+    Rebuild or verify with: python manage.py rebuild_summaries
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='summary'
+    )
+    
+    total_income = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    total_expenses = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    income_count = models.PositiveIntegerField(default=0)
+    
+    expense_count = models.PositiveIntegerField(default=0)
+    
+    version = models.BigIntegerField(default=0)
+    # Bumped on every insert, edit or delete; clients sync with ?since=<version>
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'User summary'
+        verbose_name_plural = 'User summaries'
+    
+    @property
+    def balance(self):
+        return self.total_income - self.total_expenses
+    
+    def __str__(self):
+        return f"{self.user} - balance ${self.balance}"
+
+
+class MonthlyRollup(models.Model):
+    """
+    MonthlyRollup Model - Pre-aggregated totals per user, month and bucket
+
+    A bucket is the normalized income source or expense description, so
+    "Groceries" and " groceries" land together. Updated by core.ledger on
+    every write; analytics read these rows instead of the raw transactions.
+    """
+    INCOME = 'income'
+    EXPENSE = 'expense'
+    KIND_CHOICES = [(INCOME, 'Income'), (EXPENSE, 'Expense')]
+    
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='rollups'
+    )
+    
+    kind = models.CharField(max_length=7, choices=KIND_CHOICES)
+    
+    month = models.DateField(help_text="First day of the month")
+    
+    bucket = models.CharField(max_length=200)
+    
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['month', 'kind', 'bucket']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'month', 'kind', 'bucket'],
+                name='core_rollup_unique_bucket'
+            ),
+        ]
+        # The unique index doubles as the (user, month) range index analytics scan
+    
+    def __str__(self):
+        return f"{self.user} {self.kind} {self.month:%Y-%m} {self.bucket}: ${self.total}"
+
+
+
+class Tombstone(models.Model):
+    """
+    Tombstone Model - Remembers a deleted Income/Expense
+
+    Lets /api/changes/ tell a client which rows to drop without the client
+    re-downloading everything.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='tombstones'
+    )
+    
+    kind = models.CharField(max_length=7, choices=MonthlyRollup.KIND_CHOICES)
+    
+    object_id = models.BigIntegerField()
+    # id of the deleted Income/Expense
+    
+    version = models.BigIntegerField()
+    
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'version'], name='core_tombstone_user_ver_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} #{self.object_id} deleted at v{self.version}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    IdempotencyKey Model - The stored outcome of a POST sent with an
+    Idempotency-Key header
+
+    A retried request with the same key gets this response back instead of
+    being executed again. Rows expire after settings.IDEMPOTENCY_KEY_TTL;
+    clear them out with: python manage.py purge_idempotency_keys
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys'
+    )
+    
+    key = models.CharField(max_length=255)
+    
+    fingerprint = models.CharField(max_length=64)
+    # sha256 of method, path and body - the same key can't be reused for a different request
+    
+    status_code = models.PositiveSmallIntegerField()
+    
+    response_body = models.BinaryField()
+    
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='core_idempotency_unique_key'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user} {self.key} -> {self.status_code}"
+
+
+class RecurringRule(models.Model):
+    """
+    RecurringRule Model - An income or expense that repeats: rent, salary,
+    subscriptions
+
+    `python manage.py materialize_recurring` (run it daily) turns due
+    occurrences into Income/Expense rows; see core.recurring. next_due is
+    the first occurrence not created yet, None once the rule has ended.
+    """
+    DAILY = 'daily'
+    WEEKLY = 'weekly'
+    MONTHLY = 'monthly'
+    YEARLY = 'yearly'
+    FREQUENCY_CHOICES = [(DAILY, 'Daily'), (WEEKLY, 'Weekly'), (MONTHLY, 'Monthly'), (YEARLY, 'Yearly')]
+    
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='recurring_rules'
+    )
+    
+    kind = models.CharField(max_length=7, choices=MonthlyRollup.KIND_CHOICES)
+    
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2
+    )
+    
+    label = models.CharField(
+        max_length=200,
+        help_text="Income source or expense description, e.g. Rent"
+    )
+    
+    frequency = models.CharField(max_length=7, choices=FREQUENCY_CHOICES)
+    
+    interval = models.PositiveSmallIntegerField(default=1)
+    # Every `interval` days/weeks/months/years: 2 + weekly is fortnightly
+    
+    start_date = models.DateField()
+    
+    end_date = models.DateField(null=True, blank=True)
+    # Last day an occurrence may fall on; open-ended if empty
+    
+    next_due = models.DateField(null=True, blank=True, editable=False)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_due'], name='core_rule_next_due_idx'),
+        ]
+        # The scheduler's only scan is "next_due <= today": an index range
+        # over the due rules, however many rules there are in total
+    
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.next_due is None:
+            self.next_due = self.start_date
+        super().save(*args, **kwargs)
+    
+    def __str__(self):
+        return f"{self.label} - ${self.amount} {self.get_frequency_display().lower()}"
+
+
+
+class Budget(models.Model):
+    """
+    Budget Model - A monthly spending limit, on all expenses or on one
+    category
+
+    The category is a rollup bucket (the normalized expense description,
+    see MonthlyRollup); blank means every expense. core.budgets keeps a
+    BudgetSpend counter per month and queues a BudgetAlert as spending
+    crosses 80% and 100% of the amount.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='budgets'
+    )
+    
+    category = models.CharField(
+        max_length=200,
+        blank=True,
+        help_text="Expense description to limit, e.g. groceries; blank for all expenses"
+    )
+    
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2
+    )
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category'], name='core_budget_unique_category'),
+        ]
+        # Also the index every expense write looks the user's budgets up by
+    
+    def __str__(self):
+        return f"{self.category or 'All expenses'} - ${self.amount}/month"
+
+
+class BudgetSpend(models.Model):
+    """
+    BudgetSpend Model - Running spend against a budget for one month
+
+    Moved by core.budgets in the same transaction as every expense write,
+    so checking a budget never re-sums the month's expenses.
+    `python manage.py reconcile_budgets` recomputes them in bulk.
+    """
+    budget = models.ForeignKey(
+        Budget,
+        on_delete=models.CASCADE,
+        related_name='spend'
+    )
+    
+    month = models.DateField(help_text="First day of the month")
+    
+    spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    alerted = models.PositiveSmallIntegerField(default=0)
+    # Highest threshold (percent) spending is at, and has been alerted for
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['budget', 'month'], name='core_budgetspend_unique_month'),
+        ]
+    
+    def __str__(self):
+        return f"{self.budget} {self.month:%Y-%m}: ${self.spent}"
+
+
+class BudgetAlert(models.Model):
+    """
+    BudgetAlert Model - A budget threshold crossed, waiting to be (or
+    already) sent
+
+    Queued inside the write that crossed it; `python manage.py
+    deliver_budget_alerts` sends the pending ones and stamps delivered_at.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='budget_alerts'
+    )
+    
+    budget = models.ForeignKey(
+        Budget,
+        on_delete=models.CASCADE,
+        related_name='alerts'
+    )
+    
+    month = models.DateField(help_text="First day of the month")
+    
+    threshold = models.PositiveSmallIntegerField(help_text="Percent of the budget, e.g. 80")
+    
+    spent = models.DecimalField(max_digits=14, decimal_places=2)
+    
+    limit = models.DecimalField(max_digits=10, decimal_places=2)
+    # The budget's amount when the alert was raised
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['id'],
+                condition=models.Q(delivered_at__isnull=True),
+                name='core_budgetalert_pending_idx'
+            ),
+            models.Index(fields=['user', '-created_at'], name='core_budgetalert_user_idx'),
+        ]
+        # The delivery queue is "pending, oldest first": the partial index
+        # holds only undelivered alerts, so it stays small however many
+        # have been sent
+    
+    def __str__(self):
+        return f"{self.budget} {self.month:%Y-%m}: {self.threshold}% (${self.spent} of ${self.limit})"
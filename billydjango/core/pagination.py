@@ -0,0 +1,101 @@
+"""
+Keyset (cursor) pagination for Income and Expense querysets.
+
+Rows are ordered newest first on (date, created_at, id). A cursor is the
+position of the last row of a page, so fetching the next page is a plain
+"WHERE (date, created_at, id) < cursor ... LIMIT n" - it costs the same on
+page 1 and page 10,000, unlike OFFSET pagination.
+"""
+import base64
+import json
+from datetime import date, datetime
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+ORDERING = ('-date', '-created_at', '-id')
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor or limit we can't decode"""
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Turn the ?limit= query param into a page size between 1 and maximum"""
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise InvalidCursor("limit must be an integer.")
+    if limit < 1:
+        raise InvalidCursor("limit must be at least 1.")
+    return min(limit, maximum)
+
+
+def encode_cursor(row_date, created_at, pk):
+    """Pack a row position into an opaque, URL-safe string"""
+    raw = json.dumps([row_date.isoformat(), created_at.isoformat(), pk])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Reverse of encode_cursor() - returns (date, created_at, id)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        row_date, created_at, pk = json.loads(base64.urlsafe_b64decode(padded))
+        return date.fromisoformat(row_date), datetime.fromisoformat(created_at), int(pk)
+    except (TypeError, ValueError):
+        raise InvalidCursor("Invalid cursor.")
+
+
+def after_position(row_date, created_at, pk):
+    """
+    Q object matching rows that come after the given position in ORDERING.
+
+    The leading date__lte keeps the filter a range scan on the date column;
+    the OR handles ties on date and created_at.
+    """
+    return Q(date__lte=row_date) & (
+        Q(date__lt=row_date)
+        | Q(created_at__lt=created_at)
+        | Q(created_at=created_at, id__lt=pk)
+    )
+
+
+def _model_position(row):
+    return row.date, row.created_at, row.id
+
+
+def paginate(queryset, cursor=None, limit=DEFAULT_PAGE_SIZE, position=_model_position):
+    """
+    Return (rows, next_cursor) for one page of queryset.
+
+    next_cursor is None when there are no more rows. One extra row is
+    fetched to know that without a COUNT(*). For a values_list() queryset,
+    pass position=, a function giving (date, created_at, id) of a row.
+    """
+    rows = list(_page_queryset(queryset, cursor, limit))
+    return _cut_page(rows, limit, position)
+
+
+async def apaginate(queryset, cursor=None, limit=DEFAULT_PAGE_SIZE, position=_model_position):
+    """paginate() for async views"""
+    rows = [row async for row in _page_queryset(queryset, cursor, limit)]
+    return _cut_page(rows, limit, position)
+
+
+def _page_queryset(queryset, cursor, limit):
+    queryset = queryset.order_by(*ORDERING)
+    if cursor:
+        queryset = queryset.filter(after_position(*decode_cursor(cursor)))
+    return queryset[:limit + 1]
+
+
+def _cut_page(rows, limit, position):
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*position(rows[-1]))
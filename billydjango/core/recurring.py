@@ -0,0 +1,128 @@
+"""
+Turn recurring rules into Income/Expense rows.
+
+materialize() finds due rules with one index range read (next_due <=
+today, on core_rule_next_due_idx), expands each into its occurrences up to
+today and writes them with importer.write_batch() - bulk_create plus the
+ledger and search bookkeeping - then moves next_due past them with one
+bulk_update, a chunk of rules per transaction. The work grows with the
+occurrences due, not with the number of rules or users.
+
+Re-running is a no-op: next_due only moves in the transaction that
+created the rows, and the (rule, date) unique constraint on Income and
+Expense makes an overlapping run fail and roll back rather than insert a
+duplicate. Editing a rule's schedule in the admin re-derives next_due
+from the rows already created (reschedule()).
+
+Monthly and yearly rules keep the start date's day of the month, clamped
+to short months: a rule starting on Jan 31 falls on Feb 28 (or 29), then
+Mar 31.
+"""
+import calendar
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Max
+
+from . import importer, ledger
+from .models import RecurringRule
+
+CHUNK_SIZE = 500
+# Editing any of these moves next_due (see reschedule)
+SCHEDULE_FIELDS = ('start_date', 'frequency', 'interval', 'end_date')
+
+
+def shift(start, frequency, steps):
+    """The date `steps` days/weeks/months/years after start"""
+    if frequency == RecurringRule.DAILY:
+        return start + timedelta(days=steps)
+    if frequency == RecurringRule.WEEKLY:
+        return start + timedelta(weeks=steps)
+    index = start.year * 12 + start.month - 1 + steps * (12 if frequency == RecurringRule.YEARLY else 1)
+    year, month = divmod(index, 12)
+    month += 1
+    return date(year, month, min(start.day, calendar.monthrange(year, month)[1]))
+
+
+def steps_between(start, day, frequency):
+    """How many days/weeks/months/years an occurrence `day` is after start"""
+    if frequency == RecurringRule.DAILY:
+        return (day - start).days
+    if frequency == RecurringRule.WEEKLY:
+        return (day - start).days // 7
+    months = (day.year - start.year) * 12 + day.month - start.month
+    return months // 12 if frequency == RecurringRule.YEARLY else months
+
+
+def occurrences(rule, today):
+    """
+    (dates, next_due): the rule's occurrences from next_due up to today,
+    and the one after them - None if that would be past end_date.
+    """
+    last = min(today, rule.end_date) if rule.end_date else today
+    steps = steps_between(rule.start_date, rule.next_due, rule.frequency)
+    day, dates = rule.next_due, []
+    while day <= last:
+        dates.append(day)
+        steps += rule.interval
+        day = shift(rule.start_date, rule.frequency, steps)
+    if rule.end_date and day > rule.end_date:
+        day = None
+    return dates, day
+
+
+def reschedule(rule):
+    """
+    Point next_due at the first occurrence of the rule's current schedule
+    after the last one already created - after start_date, frequency,
+    interval or end_date were edited. Doesn't save the rule.
+    """
+    created = [
+        model.objects.filter(recurring_rule=rule).aggregate(last=Max('date'))['last']
+        for model in ledger.MODELS.values()
+    ]
+    last = max((day for day in created if day is not None), default=None)
+    if last is None or last < rule.start_date:
+        day = rule.start_date
+    else:
+        steps = steps_between(rule.start_date, last, rule.frequency) // rule.interval * rule.interval
+        day = shift(rule.start_date, rule.frequency, steps)
+        while day <= last:
+            steps += rule.interval
+            day = shift(rule.start_date, rule.frequency, steps)
+    rule.next_due = None if rule.end_date and day > rule.end_date else day
+
+
+def build(rule, day):
+    """An unsaved Income/Expense for one occurrence"""
+    model = ledger.MODELS[rule.kind]
+    return model(
+        user_id=rule.user_id, amount=rule.amount, date=day, recurring_rule=rule,
+        **{ledger.label_field(model): rule.label},
+    )
+
+
+def materialize(today=None, chunk_size=CHUNK_SIZE):
+    """
+    Create every occurrence due on or before `today` (default: today);
+    returns {'rules', 'incomes', 'expenses'} for what was done.
+    """
+    today = today or date.today()
+    report = {'rules': 0, ledger.INCOME: 0, ledger.EXPENSE: 0}
+    while True:
+        with transaction.atomic():
+            # Every rule read here moves past today (or ends), so the next
+            # read starts on fresh ones
+            rules = list(RecurringRule.objects.filter(next_due__lte=today).order_by('next_due', 'id')[:chunk_size])
+            if not rules:
+                break
+            instances = []
+            for rule in rules:
+                dates, rule.next_due = occurrences(rule, today)
+                instances += [build(rule, day) for day in dates]
+                report[rule.kind] += len(dates)
+            if instances:
+                importer.write_batch(instances)
+            RecurringRule.objects.bulk_update(rules, ['next_due'])
+        report['rules'] += len(rules)
+    return {'rules': report['rules'], 'incomes': report[ledger.INCOME], 'expenses': report[ledger.EXPENSE]}
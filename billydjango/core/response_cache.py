@@ -0,0 +1,97 @@
+"""
+Per-user cache of rendered JSON responses.
+
+Entries are keyed by view name, user, the user's change version, their
+name (views echo it, and renaming doesn't bump the version) and the query
+string, so a write can never serve stale data: the version moves on
+and the old key is simply never asked for again. On top of that every
+write also drops the user's entries eagerly (see invalidate_user), so they
+don't sit around taking LRU slots from live ones.
+
+The backing store is CACHES['responses'] - local memory by default, or a
+directory on disk (see settings) - with bounded size and LRU eviction.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from .conditional import arequest_version, request_version
+
+CACHE_ALIAS = 'responses'
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _index_key(user_id):
+    # The list of a user's cached keys lives in the default cache, so that
+    # bookkeeping doesn't show up in the response cache's hit rate.
+    return f'response-cache-keys:{user_id}'
+
+
+def invalidate_user(user_id):
+    """Drop every cached response for a user"""
+    keys = caches['default'].get(_index_key(user_id)) or []
+    if keys:
+        _cache().delete_many(keys)
+    caches['default'].delete(_index_key(user_id))
+
+
+def _key(name, request, version):
+    user = request.user
+    varying = '\0'.join([user.username, user.first_name, request.META.get('QUERY_STRING', '')])
+    return f'{name}:{user.pk}:{version}:{hashlib.sha1(varying.encode()).hexdigest()}'
+
+
+def _hit(key):
+    content = _cache().get(key)
+    if content is not None:
+        return HttpResponse(content, content_type='application/json')
+    return None
+
+
+def _store(request, key, response):
+    if response.status_code == 200 and not response.streaming:
+        _cache().set(key, response.content)
+        index = caches['default'].get(_index_key(request.user.pk)) or []
+        caches['default'].set(_index_key(request.user.pk), [*index[-50:], key])
+
+
+def cache_per_user(name):
+    """
+    Decorator for authenticated GET views returning JSON. Successful
+    responses are stored as raw bytes, so a hit skips the queries and the
+    encoding altogether. Works on async views too.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                version = await arequest_version(request)
+                if request.method != 'GET' or version is None:
+                    return await view(request, *args, **kwargs)
+                key = _key(name, request, version)
+                response = _hit(key)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                    _store(request, key, response)
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            version = request_version(request)
+            if request.method != 'GET' or version is None:
+                return view(request, *args, **kwargs)
+            key = _key(name, request, version)
+            response = _hit(key)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                _store(request, key, response)
+            return response
+        return wrapper
+    return decorator
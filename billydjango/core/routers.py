@@ -0,0 +1,117 @@
+"""
+Send the heavy read-only views to a read replica.
+
+Views wrapped in @read_replica run their queries against
+DATABASES['replica'] when one is configured; everything else, and every
+write, goes to 'default'. Locally the replica is a second SQLite file
+refreshed by `manage.py sync_replica`, so it lags the primary by up to one
+sync interval. To keep users from missing their own changes, a commit
+pins that user's reads to the primary for REPLICA_STICKY_SECONDS (see
+pin_to_primary, called from core.signals). The pins live in the
+'replica_pins' cache, which every worker process has to share.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA = 'replica'
+
+_reading_from = ContextVar('billy_read_alias', default=None)
+
+
+def replica_enabled():
+    return REPLICA in settings.DATABASES
+
+
+def _pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    """Serve this user's reads from the primary until the replica has caught up"""
+    if replica_enabled():
+        caches['replica_pins'].set(_pin_key(user_id), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def is_pinned(user_id):
+    return bool(caches['replica_pins'].get(_pin_key(user_id)))
+
+
+@contextmanager
+def reading_from(alias):
+    """Route reads in this block to `alias` (None means the default routing)"""
+    token = _reading_from.set(alias)
+    try:
+        yield
+    finally:
+        _reading_from.reset(token)
+
+
+def primary():
+    """Read from the primary inside a replica-routed view, e.g. right before a write"""
+    return reading_from(DEFAULT_DB_ALIAS)
+
+
+def _on_replica(chunks):
+    """Re-enter the replica routing for each chunk of a streaming response"""
+    chunks = iter(chunks)
+    while True:
+        with reading_from(REPLICA):
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+        yield chunk
+
+
+def read_replica(view):
+    """
+    Decorator for read-only views. Put it under @login_required, so the
+    user is known, and above anything that queries (ETag functions, the
+    response cache). Works on async views too: their async ORM calls run
+    in threads that inherit the routing context.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            user = await request.auser()
+            if not replica_enabled() or is_pinned(user.pk):
+                return await view(request, *args, **kwargs)
+            with reading_from(REPLICA):
+                return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not replica_enabled() or is_pinned(request.user.pk):
+            return view(request, *args, **kwargs)
+        with reading_from(REPLICA):
+            response = view(request, *args, **kwargs)
+        if response.streaming:
+            # The queries of a streaming response run after the view returns
+            response.streaming_content = _on_replica(response.streaming_content)
+        return response
+    return wrapper
+
+
+class ReplicaRouter:
+    """DATABASE_ROUTERS entry; only routes to the replica inside @read_replica"""
+
+    def db_for_read(self, model, **hints):
+        return _reading_from.get()
+
+    def db_for_write(self, model, **hints):
+        # Explicit, or Django would write rows read from the replica back there
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary's file, schema included
+        return db != REPLICA
@@ -0,0 +1,203 @@
+"""
+Full-text search over Income.source and Expense.description.
+
+Backed by the core_search FTS5 table (migration 0008). Every word of a
+query is a prefix match ("gro" finds "Groceries"), all words must match,
+and results are ranked by BM25, newest first among equal scores.
+
+Each row is indexed twice:
+
+- text: the label as written, searched across all users (the admin).
+- owned: the same words prefixed with the owner, 'u42xgroceries', so a
+  user's search is a prefix scan over that user's terms alone instead of
+  intersecting with everybody's postings.
+
+rowid encodes the row: id * 2 for incomes, id * 2 + 1 for expenses.
+
+The index is written next to the ledger bookkeeping - core.signals for
+saves and (through ledger.rows_deleted) deletes, importer.write_batch()
+and batch.run_batch() for bulk inserts - rather than by SQL triggers:
+FTS5 flushes its pending terms at every savepoint, and a trigger body runs
+in one, which made each indexed insert ~50x slower. Writes that go around
+the app can be repaired with `manage.py rebuild_search_index`.
+"""
+import re
+import unicodedata
+
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from . import ledger
+from .models import Income
+
+TABLE = 'core_search'
+PARITY = {ledger.INCOME: 0, ledger.EXPENSE: 1}
+KINDS = {parity: kind for kind, parity in PARITY.items()}
+MAX_TERMS = 8
+REBUILD_CHUNK_SIZE = 5000
+
+# What unicode61 treats as a token: letters and digits (no underscore)
+_word = re.compile(r'[^\W_]+')
+
+
+class InvalidQuery(ValueError):
+    pass
+
+
+def terms(text):
+    """Words of `text` the way the FTS5 tokenizer sees them: lowercased, without accents"""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return _word.findall(''.join(char for char in decomposed if not unicodedata.combining(char)))
+
+
+def owned_text(user_id, label):
+    return ' '.join(f'u{user_id}x{word}' for word in terms(label))
+
+
+def _query_terms(query):
+    words = terms(query)[:MAX_TERMS]
+    if not words:
+        raise InvalidQuery("Search for at least one letter or digit.")
+    return words
+
+
+def _prefixes(words, owner=''):
+    # Quoted, so nothing the user types is read as FTS5 syntax
+    return ' '.join(f'"{owner}{word}"*' for word in words)
+
+
+def ranked_query(user_id, query, kind=None, limit=50, offset=0):
+    """(sql, params) selecting the rowids of one page of a user's matches, best first"""
+    sql = f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s'
+    params = [f'owned : ({_prefixes(_query_terms(query), f"u{user_id}x")})']
+    if kind is not None:
+        sql += ' AND rowid %% 2 = %s'
+        params.append(PARITY[kind])
+    sql += f' ORDER BY bm25({TABLE}, 1.0, 0.0), rowid DESC LIMIT %s OFFSET %s'
+    return sql, [*params, limit, offset]
+
+
+def search(user, query, kind=None, limit=50, offset=0):
+    """
+    Return (rows, next_offset) for one page of the user's matches. Rows look
+    like core.feed rows; next_offset is None on the last page.
+    """
+    sql, params = ranked_query(user.pk, query, kind, limit + 1, offset)
+    # Follows the read routing (core.routers), like the ORM queries below
+    alias = router.db_for_read(Income)
+    with connections[alias].cursor() as cursor:
+        cursor.execute(sql, params)
+        rowids = [rowid for (rowid,) in cursor.fetchall()]
+
+    next_offset = offset + limit if len(rowids) > limit else None
+    rowids = rowids[:limit]
+
+    found = {}
+    for parity, kind_name in KINDS.items():
+        ids = [rowid // 2 for rowid in rowids if rowid % 2 == parity]
+        if not ids:
+            continue
+        model = ledger.MODELS[kind_name]
+        label = ledger.label_field(model)
+        rows = model.objects.using(alias).filter(user=user, pk__in=ids).values_list('id', 'date', 'amount', label)
+        for pk, day, amount, text in rows:
+            found[pk * 2 + parity] = {
+                'id': pk,
+                'type': kind_name,
+                'amount': str(amount),
+                label: text,
+                'date': day.strftime('%Y-%m-%d'),
+            }
+    return [found[rowid] for rowid in rowids if rowid in found], next_offset
+
+
+def matching(model, query):
+    """
+    Q for rows of `model` (any user) whose text matches `query`, as a
+    subquery on the index - for querysets such as the admin changelist.
+    """
+    return Q(id__in=RawSQL(
+        f'SELECT rowid / 2 FROM {TABLE} WHERE {TABLE} MATCH %s AND rowid %% 2 = %s',
+        [f'text : ({_prefixes(_query_terms(query))})', PARITY[ledger.kind_of(model)]],
+    ))
+
+
+def like_filter(model, query):
+    """The icontains equivalent of a search, for comparison"""
+    condition = Q()
+    for word in terms(query)[:MAX_TERMS]:
+        condition &= Q(**{f'{ledger.label_field(model)}__icontains': word})
+    return condition
+
+
+def _documents(instances):
+    for instance in instances:
+        label = getattr(instance, ledger.label_field(instance))
+        yield instance.pk * 2 + PARITY[ledger.kind_of(instance)], owned_text(instance.user_id, label), label
+
+
+def index(instances, using='default'):
+    """Add or refresh saved Income/Expense instances in the index"""
+    with connections[using].cursor() as cursor:
+        cursor.executemany(
+            f'INSERT OR REPLACE INTO {TABLE} (rowid, owned, text) VALUES (%s, %s, %s)',
+            list(_documents(instances)),
+        )
+
+
+def unindex(kind, object_ids, using='default'):
+    with connections[using].cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {TABLE} WHERE rowid = %s',
+            [(object_id * 2 + PARITY[kind],) for object_id in object_ids],
+        )
+
+
+def rebuild(using='default'):
+    """Re-index every Income and Expense row; returns the number indexed"""
+    insert = f'INSERT INTO {TABLE} (rowid, owned, text) VALUES (%s, %s, %s)'
+    count = 0
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        for kind, model in ledger.MODELS.items():
+            label = ledger.label_field(model)
+            rows = model.objects.using(using).values_list('id', 'user_id', label)
+            documents = []
+            for pk, user_id, text in rows.iterator(chunk_size=REBUILD_CHUNK_SIZE):
+                documents.append((pk * 2 + PARITY[kind], owned_text(user_id, text), text))
+                if len(documents) == REBUILD_CHUNK_SIZE:
+                    cursor.executemany(insert, documents)
+                    count += len(documents)
+                    documents = []
+            cursor.executemany(insert, documents)
+            count += len(documents)
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return count
+
+
+def drift():
+    """
+    {kind: rows missing from, stale in or orphaned in the index}; all zero
+    when every write has gone through the app.
+    """
+    counts = {}
+    with connections['default'].cursor() as cursor:
+        for kind, parity in PARITY.items():
+            model = ledger.MODELS[kind]
+            table, label = model._meta.db_table, ledger.label_field(model)
+            cursor.execute(
+                f"SELECT row.user_id, row.{label}, doc.rowid, doc.owned, doc.text "
+                f"FROM {table} AS row LEFT JOIN {TABLE} AS doc ON doc.rowid = row.id * 2 + %s",
+                [parity],
+            )
+            counts[kind] = sum(
+                1 for user_id, text, rowid, owned, indexed in cursor.fetchall()
+                if rowid is None or indexed != text or owned != owned_text(user_id, text)
+            )
+            cursor.execute(
+                f"SELECT count(*) FROM {TABLE} WHERE rowid %% 2 = %s AND rowid / 2 NOT IN (SELECT id FROM {table})",
+                [parity],
+            )
+            counts[kind] += cursor.fetchone()[0]
+    return counts
@@ -0,0 +1,175 @@
+"""
+Deterministic synthetic users, incomes and expenses for load testing.
+
+`seed(users, rows, seed)` always produces the same rows for the same
+arguments: each user draws from its own random.Random('seed:number'), so
+the data doesn't depend on the batch size or on how many users came
+before. Row counts per user are log-normal (a few heavy users, a long
+tail of light ones), about one row in ten is an income, and amounts are
+log-normal around a typical value per source or category. Rent and
+salaries land on fixed days of the month.
+
+Rows go in with bulk_create in bounded transactions, versioned and
+search-indexed like importer.write_batch() does. The ledger tables are
+then rebuilt with ledger.rebuild_summaries()/rebuild_rollups(), a chunk of
+users at a time: folding every batch in through ledger.apply() costs an
+UPDATE per (user, month, bucket) and made seeding ten times slower. The
+end result is the same as filling the database through the app.
+"""
+import random
+from dataclasses import dataclass
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from . import analytics, importer, ledger, search
+from .models import Expense, Income
+
+USERNAME_PREFIX = 'seed-'
+PASSWORD = 'seed-password'
+# A fixed default, so seeding next month gives the same data
+DEFAULT_END = date(2025, 12, 31)
+DEFAULT_MONTHS = 24
+INCOME_SHARE = 0.1
+USER_BATCH_SIZE = 1000
+
+_cent = Decimal('0.01')
+
+
+@dataclass(frozen=True)
+class Category:
+    weight: float
+    median: float
+    labels: tuple
+    day: int = None  # fixed day of the month, e.g. rent on the 1st
+
+
+INCOME_SOURCES = [
+    Category(0.55, 3500, ('Salary',), day=25),
+    Category(0.2, 600, ('Freelance', 'Consulting')),
+    Category(0.1, 120, ('Dividends', 'Interest')),
+    Category(0.1, 80, ('Refund',)),
+    Category(0.05, 150, ('Gift',)),
+]
+
+EXPENSE_CATEGORIES = [
+    Category(0.28, 45, ('Groceries', 'Supermarket', 'Farmers market')),
+    Category(0.16, 25, ('Restaurant', 'Takeaway', 'Lunch')),
+    Category(0.14, 4.5, ('Coffee',)),
+    Category(0.12, 12, ('Transport', 'Taxi', 'Fuel')),
+    Category(0.1, 60, ('Shopping', 'Clothes', 'Electronics')),
+    Category(0.06, 90, ('Utilities', 'Electricity', 'Internet'), day=5),
+    Category(0.05, 15, ('Subscriptions', 'Streaming', 'Gym')),
+    Category(0.04, 1200, ('Rent',), day=1),
+    Category(0.03, 70, ('Health', 'Pharmacy')),
+    Category(0.02, 400, ('Travel', 'Hotel', 'Flights')),
+]
+
+
+def username(prefix, number):
+    return f'{prefix}{number:06d}'
+
+
+def row_counts(rng, users, rows):
+    """Split `rows` across `users` with log-normal weights; sums to exactly `rows`"""
+    weights = [rng.lognormvariate(0, 1) for _ in range(users)]
+    scale = rows / sum(weights)
+    counts = [int(weight * scale) for weight in weights]
+    # Hand the rounding remainder to the heaviest users
+    for index in sorted(range(users), key=weights.__getitem__, reverse=True)[:rows - sum(counts)]:
+        counts[index] += 1
+    return counts
+
+
+def _amount(rng, median):
+    value = Decimal(str(median * rng.lognormvariate(0, 0.5))).quantize(_cent)
+    return max(value, _cent)
+
+
+def _day(rng, start, end, category):
+    day = start + timedelta(days=rng.randrange((end - start).days + 1))
+    if category.day:
+        day = min(day.replace(day=category.day), end)
+    return day
+
+
+def generate(user_id, count, rng, start, end):
+    """Yield `count` unsaved Income/Expense instances for one user, dated start..end"""
+    income_weights = [category.weight for category in INCOME_SOURCES]
+    expense_weights = [category.weight for category in EXPENSE_CATEGORIES]
+    # Each user keeps roughly the same salary and rent
+    scale = rng.lognormvariate(0, 0.4)
+    for _ in range(count):
+        if rng.random() < INCOME_SHARE:
+            category = rng.choices(INCOME_SOURCES, income_weights)[0]
+            yield Income(
+                user_id=user_id, amount=_amount(rng, category.median * scale),
+                source=rng.choice(category.labels), date=_day(rng, start, end, category),
+            )
+        else:
+            category = rng.choices(EXPENSE_CATEGORIES, expense_weights)[0]
+            yield Expense(
+                user_id=user_id, amount=_amount(rng, category.median * scale),
+                description=rng.choice(category.labels), date=_day(rng, start, end, category),
+            )
+
+
+def create_users(numbers, prefix=USERNAME_PREFIX, password=PASSWORD):
+    """bulk_create the numbered users; returns their ids in the same order"""
+    # One hash for everyone: hashing per user would dominate the run
+    encoded = make_password(password)
+    users = User.objects.bulk_create([
+        User(username=username(prefix, number), email=f'{username(prefix, number)}@example.com', password=encoded)
+        for number in numbers
+    ])
+    return [user.pk for user in users]
+
+
+def write_rows(instances):
+    """importer.write_batch() without the ledger: see the module docstring"""
+    with transaction.atomic():
+        ledger.assign_versions(instances)
+        for model in (Income, Expense):
+            model.objects.bulk_create([instance for instance in instances if isinstance(instance, model)])
+        search.index(instances)
+
+
+def seed(users, rows, seed=42, prefix=USERNAME_PREFIX, end=DEFAULT_END, months=DEFAULT_MONTHS,
+         batch_size=importer.DEFAULT_BATCH_SIZE, progress=None):
+    """
+    Create `users` users and `rows` incomes/expenses between them; returns
+    {'users', 'incomes', 'expenses'}. `progress(rows_written)` is called
+    after each batch.
+    """
+    start = analytics.add_months(end, 1 - months)
+
+    counts = row_counts(random.Random(seed), users, rows)
+    totals = {'users': users, 'incomes': 0, 'expenses': 0}
+    batch = []
+
+    def flush():
+        write_rows(batch)
+        incomes = sum(1 for instance in batch if isinstance(instance, Income))
+        totals['incomes'] += incomes
+        totals['expenses'] += len(batch) - incomes
+        batch.clear()
+        if progress:
+            progress(totals['incomes'] + totals['expenses'])
+
+    for first in range(1, users + 1, USER_BATCH_SIZE):
+        numbers = list(range(first, min(first + USER_BATCH_SIZE, users + 1)))
+        user_ids = create_users(numbers, prefix)
+        for number, user_id in zip(numbers, user_ids):
+            rng = random.Random(f'{seed}:{number}')
+            for instance in generate(user_id, counts[number - 1], rng, start, end):
+                batch.append(instance)
+                if len(batch) >= batch_size:
+                    flush()
+        if batch:
+            flush()
+        ledger.rebuild_summaries(user_ids)
+        ledger.rebuild_rollups(user_ids)
+    return totals
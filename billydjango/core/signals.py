@@ -0,0 +1,105 @@
+"""
+Signal receivers that keep core.ledger's derived tables and the core.search
+index in sync with single-row Income/Expense writes - the JSON views and
+the Django admin both go through model save() and delete(), so they are
+covered here. Also the one that moves core.budgets' counters along with
+every ledger.apply() (single-row or bulk), the listeners for
+ledger.data_changed, which fires after any write commits - including the
+one that wakes the user's live event streams (core.events) - and the one
+that drops core.middleware's cached copy of a User whenever that row
+changes.
+"""
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import budgets, events, ledger, middleware, response_cache, routers, search
+from .models import Income, Expense
+
+
+@receiver(pre_save, sender=Income)
+@receiver(pre_save, sender=Expense)
+def remember_previous_entry(sender, instance, raw=False, **kwargs):
+    """
+    Edits (e.g. from the admin) need the old amount/user to reverse it.
+    Every insert or edit also gets a new change version for /api/changes/.
+    """
+    instance._ledger_previous = None
+    if instance.pk is not None:
+        previous = sender.objects.filter(pk=instance.pk).first()
+        if previous is not None:
+            instance._ledger_previous = ledger.entry_for(previous)
+    if not raw:
+        instance.version = ledger.allocate_versions(instance.user_id)
+
+
+@receiver(post_save, sender=Income)
+@receiver(post_save, sender=Expense)
+def apply_saved_entry(sender, instance, **kwargs):
+    previous = getattr(instance, '_ledger_previous', None)
+    # An edit is applied as one net change, so budgets.apply() doesn't see
+    # the old amount leave and come back as a new threshold crossing
+    with ledger.deferred():
+        if previous is not None:
+            ledger.apply([previous], sign=-1)
+            if previous.user_id != instance.user_id:
+                # Moved to another user in the admin: it's gone for the old owner
+                ledger.record_deletions(previous.kind, [(previous.user_id, instance.pk)])
+        ledger.apply([ledger.entry_for(instance)])
+    search.index([instance])
+
+
+@receiver(post_delete, sender=Income)
+@receiver(post_delete, sender=Expense)
+def apply_deleted_entry(sender, instance, **kwargs):
+    if ledger.owner_deleted(instance.user_id):
+        return
+    ledger.apply([ledger.entry_for(instance)], sign=-1)
+    ledger.record_deletions(ledger.kind_of(instance), [(instance.user_id, instance.pk)])
+
+
+@receiver(pre_delete, sender=User)
+def start_owner_delete(sender, instance, **kwargs):
+    # The derived rows go in the cascade; only the search index (no foreign
+    # keys) needs clearing here
+    for kind, model in ledger.MODELS.items():
+        search.unindex(kind, model.objects.filter(user=instance).values_list('id', flat=True))
+    ledger.begin_owner_delete(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def finish_owner_delete(sender, instance, **kwargs):
+    ledger.end_owner_delete(instance.pk)
+
+
+@receiver(ledger.rows_deleted)
+def unindex_deleted_rows(sender, kind, rows, **kwargs):
+    search.unindex(kind, [object_id for _, object_id in rows])
+
+
+@receiver(ledger.rollups_applied)
+def update_budget_counters(sender, changes, **kwargs):
+    budgets.apply(changes)
+
+
+@receiver(ledger.data_changed)
+def drop_cached_responses(sender, user_id, **kwargs):
+    response_cache.invalidate_user(user_id)
+
+
+@receiver(ledger.data_changed)
+def pin_reads_to_primary(sender, user_id, **kwargs):
+    # Read-your-writes: the replica may not have this commit yet
+    routers.pin_to_primary(user_id)
+
+
+@receiver(ledger.data_changed)
+def notify_event_streams(sender, user_id, **kwargs):
+    events.publish(user_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    # Covers password changes too: the cached copy carries the old hash
+    middleware.forget_user(instance.pk)
@@ -1,3 +1,1402 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import json
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import (
+    budgets, events, importer, ledger, middleware, recurring, routers, search, seeding, serializers, throttle, timing, urls,
+)
+from .admin import IncomeAdmin
+from .idempotency import purge_expired
+from .management.commands import benchmark_asgi, benchmark_concurrency
+from .models import (
+    Income, Expense, BudgetAlert, BudgetSpend, IdempotencyKey, MonthlyRollup, RecurringRule, Tombstone, UserSummary,
+)
+
+
+def scratch_settings(directory):
+    """Settings with every file-based cache, and the timings, moved under `directory`"""
+    moved = {
+        alias: {**config, 'LOCATION': str(Path(directory) / alias)}
+        if config['BACKEND'].endswith('.FileBasedCache') else config
+        for alias, config in settings.CACHES.items()
+    }
+    return override_settings(CACHES=moved, INSTRUMENTATION_DIR=str(Path(directory) / 'timings'))
+
+
+class ApiTestCase(TestCase):
+    """A logged-in user and a JSON POST helper"""
+
+    def setUp(self):
+        # Keep away from the developer's .cache, which the clearing below would wipe
+        scratch = tempfile.TemporaryDirectory(prefix='billy-tests-')
+        self.addCleanup(scratch.cleanup)
+        overrides = scratch_settings(scratch.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        # Cached responses are keyed by user id and version, and ids are
+        # reused once each test's transaction rolls back
+        for cache in caches.all():
+            cache.clear()
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'correct-horse-9', first_name='Alice')
+        self.client.force_login(self.user)
+
+    def post(self, path, data=None, **extra):
+        return self.client.post(path, json.dumps(data or {}), content_type='application/json', **extra)
+
+    def add_income(self, amount='10.00', source='Salary', day='2025-01-15'):
+        response = self.post('/income/add/', {'amount': amount, 'source': source, 'date': day})
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['id']
+
+    def add_expense(self, amount='10.00', description='Groceries', day='2025-01-15'):
+        response = self.post('/expense/add/', {'amount': amount, 'description': description, 'date': day})
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['id']
+
+
+# ============================================
+# Dashboard pagination
+# ============================================
+
+class DashboardPaginationTests(ApiTestCase):
+    def test_pages_cover_every_row_once_newest_first(self):
+        start = date(2025, 1, 1)
+        # Several rows per date, so pages break inside runs of equal dates
+        for number in range(7):
+            self.add_income(source=f'Income {number}', day=(start + timedelta(days=number % 3)).isoformat())
+
+        seen, cursor = [], ''
+        while True:
+            body = self.client.get('/api/dashboard/', {'limit': 3, 'income_cursor': cursor}).json()
+            self.assertLessEqual(len(body['incomes']), 3)
+            seen += body['incomes']
+            cursor = body['next_cursor']['incomes']
+            if not cursor:
+                break
+
+        expected = list(Income.objects.order_by('-date', '-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual([row['id'] for row in seen], expected)
+
+    def test_totals_cover_the_full_history(self):
+        for _ in range(4):
+            self.add_income('25.00')
+        self.add_expense('10.00')
+        body = self.client.get('/api/dashboard/', {'limit': 1}).json()
+        self.assertEqual(len(body['incomes']), 1)
+        self.assertEqual((body['total_income'], body['total_expenses'], body['balance']), (100.0, 10.0, 90.0))
+        self.assertIsNone(body['next_cursor']['expenses'])
+
+    def test_lists_are_paged_independently(self):
+        for _ in range(3):
+            self.add_income()
+            self.add_expense()
+        first = self.client.get('/api/dashboard/', {'limit': 2}).json()
+        second = self.client.get('/api/dashboard/', {
+            'limit': 2, 'expense_cursor': first['next_cursor']['expenses'],
+        }).json()
+        self.assertEqual(len(second['expenses']), 1)
+        self.assertEqual([row['id'] for row in second['incomes']], [row['id'] for row in first['incomes']])
+
+    def test_bad_cursor_or_limit_is_a_400(self):
+        self.assertEqual(self.client.get('/api/dashboard/', {'income_cursor': 'not-a-cursor'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/dashboard/', {'limit': 'ten'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/dashboard/', {'limit': 0}).status_code, 400)
+
+
+# ============================================
+# Indexes: benchmark_indexes
+# ============================================
+
+class IndexTests(ApiTestCase):
+    def test_dashboard_page_reads_the_composite_index(self):
+        page = Income.objects.filter(user=self.user).order_by('-date', '-created_at', '-id')[:50]
+        plan = page.explain()
+        self.assertIn('core_income_user_date_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class IndexBenchmarkTests(TransactionTestCase):
+    # The command's schema editor can't run inside TestCase's transaction
+
+    def test_benchmark_compares_against_the_fk_index(self):
+        out = StringIO()
+        call_command('benchmark_indexes', '--rows', 500, '--users', 3, '--repeat', 2, '--json',
+                     stdout=out, stderr=StringIO())
+        runs = json.loads(out.getvalue())['runs']
+        baseline, composite = runs['fk_index_only'], runs['composite_index']
+        self.assertIn('TEMP B-TREE', ' '.join(baseline['dashboard first page']['plan']))
+        self.assertIn('core_income_user_id', ' '.join(baseline['dashboard first page']['plan']))
+        self.assertNotIn('TEMP B-TREE', ' '.join(composite['dashboard first page']['plan']))
+        for result in composite.values():
+            self.assertGreaterEqual(result['p95_ms'], result['median_ms'])
+
+    def test_benchmark_refuses_an_existing_file(self):
+        with tempfile.NamedTemporaryFile(suffix='.sqlite3') as existing:
+            with self.assertRaises(CommandError):
+                call_command('benchmark_indexes', '--rows', 10, '--db', existing.name, stdout=StringIO())
+
+
+# ============================================
+# Ledger: UserSummary
+# ============================================
+
+class SummaryTests(ApiTestCase):
+    def summary(self):
+        return UserSummary.objects.get(user=self.user)
+
+    def test_writes_update_the_totals_incrementally(self):
+        income_id = self.add_income('100.50')
+        self.add_expense('20.00')
+        summary = self.summary()
+        self.assertEqual(
+            (summary.total_income, summary.income_count, summary.total_expenses, summary.expense_count),
+            (Decimal('100.50'), 1, Decimal('20.00'), 1),
+        )
+
+        income = Income.objects.get(pk=income_id)
+        income.amount = Decimal('50.00')
+        income.save()
+        self.assertEqual(self.summary().total_income, Decimal('50.00'))
+
+        self.client.post(f'/income/delete/{income_id}/')
+        summary = self.summary()
+        self.assertEqual((summary.total_income, summary.income_count), (0, 0))
+        self.assertEqual(summary.balance, Decimal('-20.00'))
+
+    def test_deleting_a_user_with_rows_cascades_cleanly(self):
+        for _ in range(3):
+            self.add_income()
+            self.add_expense()
+        other = User.objects.create_user('bob', 'bob@example.com', 'correct-horse-9')
+        Income.objects.create(user=other, amount=Decimal('5.00'), source='Salary', date=date(2025, 1, 1))
+
+        user_id = self.user.pk
+        self.user.delete()
+
+        self.assertFalse(Income.objects.filter(user_id=user_id).exists())
+        self.assertFalse(UserSummary.objects.filter(user_id=user_id).exists())
+        self.assertEqual(UserSummary.objects.get(user=other).income_count, 1)
+        # Later writes for other users still reach the ledger
+        Income.objects.create(user=other, amount=Decimal('5.00'), source='Salary', date=date(2025, 1, 2))
+        self.assertEqual(UserSummary.objects.get(user=other).income_count, 2)
+
+    def test_rebuild_resets_users_whose_rows_are_gone(self):
+        self.add_income('30.00')
+        # Rows removed behind the ledger's back
+        Income.objects.all()._raw_delete('default')
+        with self.assertRaises(CommandError):
+            call_command('rebuild_summaries', '--verify', stdout=StringIO())
+
+        call_command('rebuild_summaries', stdout=StringIO())
+        summary = self.summary()
+        self.assertEqual((summary.total_income, summary.income_count), (0, 0))
+        call_command('rebuild_summaries', '--verify', stdout=StringIO())
+
+
+# ============================================
+# Ledger: MonthlyRollup and /api/analytics/
+# ============================================
+
+class RollupTests(ApiTestCase):
+    def rollups(self):
+        return list(MonthlyRollup.objects.filter(user=self.user).order_by('month', 'kind', 'bucket').values_list(
+            'month', 'kind', 'bucket', 'total', 'count'
+        ))
+
+    def test_labels_are_bucketed_and_emptied_buckets_dropped(self):
+        self.add_expense('4.50', 'Coffee', '2025-03-02')
+        coffee = self.add_expense('3.00', '  coffee ', '2025-03-20')
+        self.add_income('1000.00', 'Salary', '2025-04-25')
+        self.assertEqual(self.rollups(), [
+            (date(2025, 3, 1), 'expense', 'coffee', Decimal('7.50'), 2),
+            (date(2025, 4, 1), 'income', 'salary', Decimal('1000.00'), 1),
+        ])
+
+        self.client.post(f'/expense/delete/{coffee}/')
+        self.assertEqual(self.rollups()[0][3:], (Decimal('4.50'), 1))
+        Expense.objects.filter(user=self.user).delete()
+        self.assertEqual([row[1] for row in self.rollups()], ['income'])
+
+    def test_rebuild_matches_the_incremental_rows(self):
+        self.add_expense('4.50', 'Coffee', '2025-03-02')
+        self.add_expense('60.00', 'Groceries', '2025-05-02')
+        self.add_income('1000.00', 'Salary', '2025-05-25')
+        incremental = self.rollups()
+        MonthlyRollup.objects.all().delete()
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_analytics_series_fills_empty_months(self):
+        self.add_expense('4.50', 'Coffee', '2025-03-02')
+        self.add_income('1000.00', 'Salary', '2025-05-25')
+        body = self.client.get('/api/analytics/', {'start': '2025-03', 'end': '2025-05'}).json()
+        self.assertEqual([point['month'] for point in body['series']], ['2025-03', '2025-04', '2025-05'])
+        self.assertEqual([point['expenses'] for point in body['series']], [4.5, 0.0, 0.0])
+        self.assertEqual(body['series'][2]['income'], 1000.0)
+        self.assertEqual(body['buckets']['expense'], [{'bucket': 'coffee', 'total': 4.5, 'count': 1}])
+
+        filtered = self.client.get('/api/analytics/', {
+            'start': '2025-03', 'end': '2025-05', 'kind': 'expense', 'bucket': ' COFFEE',
+        }).json()
+        self.assertEqual(sum(point['income'] for point in filtered['series']), 0)
+
+    def test_analytics_rejects_bad_ranges(self):
+        for params in ({'start': 'March'}, {'start': '2025-05', 'end': '2025-03'}, {'kind': 'refunds'},
+                       {'start': '2000-01', 'end': '2025-01'}):
+            self.assertEqual(self.client.get('/api/analytics/', params).status_code, 400, params)
+
+    def test_analytics_reaches_the_last_representable_month(self):
+        body = self.client.get('/api/analytics/', {'start': '9999-11', 'end': '9999-12'}).json()
+        self.assertEqual([point['month'] for point in body['series']], ['9999-11', '9999-12'])
+        self.assertEqual(self.client.get('/api/analytics/', {'end': '0001-06'}).status_code, 400)
+
+
+# ============================================
+# Bulk import and export
+# ============================================
+
+class ImportTests(ApiTestCase):
+    def test_csv_rows_are_imported_and_bad_rows_reported(self):
+        body = (
+            'type,date,amount,label\n'
+            'income,2025-01-25,3500.00,Salary\n'
+            'expense,2025-01-26,45.10,Groceries\n'
+            'expense,2025-01-27,-3,Refund\n'
+            'transfer,2025-01-28,10,Savings\n'
+            'expense,2025-01-29,12.00,Taxi\n'
+        )
+        response = self.client.post('/api/import/?format=csv&batch_size=1', body, content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        report = response.json()
+        self.assertEqual((report['imported'], report['incomes'], report['expenses'], report['failed']), (3, 1, 2, 2))
+        self.assertEqual([error['row'] for error in report['errors']], [3, 4])
+
+        summary = UserSummary.objects.get(user=self.user)
+        self.assertEqual((summary.income_count, summary.expense_count), (1, 2))
+        self.assertEqual(summary.total_expenses, Decimal('57.10'))
+        self.assertEqual(MonthlyRollup.objects.filter(user=self.user, kind='expense').count(), 2)
+
+    def test_ndjson_with_a_default_type(self):
+        body = '{"date": "2025-02-01", "amount": "9.99", "description": "Streaming"}\n\nnot json\n[1]\n'
+        response = self.client.post('/api/import/?type=expense', body, content_type='application/x-ndjson')
+        report = response.json()
+        self.assertEqual((report['imported'], report['failed']), (1, 2))
+        self.assertEqual(Expense.objects.get(user=self.user).description, 'Streaming')
+
+    def test_undecodable_line_ends_the_import_with_a_report(self):
+        body = (
+            'type,date,amount,label\n'.encode()
+            + 'income,2025-01-25,3500.00,Salary\n'.encode()
+            + b'expense,2025-01-26,45.10,Caf\xe9\n'
+            + 'expense,2025-01-27,12.00,Taxi\n'.encode()
+        )
+        response = self.client.post('/api/import/?format=csv&batch_size=1', body, content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        report = response.json()
+        self.assertEqual((report['imported'], report['failed']), (1, 1))
+        self.assertEqual(report['errors'][0]['row'], 2)
+        self.assertIn('UTF-8', report['errors'][0]['errors']['__all__'][0]['message'])
+        self.assertEqual(UserSummary.objects.get(user=self.user).income_count, 1)
+
+        body = '{"date": "2025-02-01", "amount": "9.99", "type": "expense", "description": "Tea"}\n'.encode()
+        report = self.client.post('/api/import/', body + b'\xff\xfe\n', content_type='application/x-ndjson').json()
+        self.assertEqual((report['imported'], report['failed'], report['errors'][0]['row']), (1, 1, 2))
+
+    def test_unknown_format_is_a_400(self):
+        self.assertEqual(self.client.post('/api/import/', 'x', content_type='text/plain').status_code, 400)
+
+
+class ExportTests(ApiTestCase):
+    def export(self, **params):
+        response = self.client.get('/api/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export_imports_back_as_is(self):
+        self.add_income('3500.00', 'Salary', '2025-01-25')
+        self.add_expense('45.10', 'Groceries', '2025-01-26')
+        exported = self.export()
+        self.assertEqual(exported.splitlines()[0], 'id,type,date,amount,source,description,created_at')
+
+        other = User.objects.create_user('bob', 'bob@example.com', 'correct-horse-9')
+        self.client.force_login(other)
+        report = self.client.post('/api/import/?format=csv', exported, content_type='text/csv').json()
+        self.assertEqual((report['imported'], report['failed']), (2, 0))
+        self.assertEqual(UserSummary.objects.get(user=other).balance, Decimal('3454.90'))
+
+    def test_ndjson_export_is_limited_to_the_user_and_dates(self):
+        self.add_expense('1.00', 'Early', '2025-01-01')
+        self.add_expense('2.00', 'Late', '2025-03-01')
+        Expense.objects.create(
+            user=User.objects.create_user('bob'), amount=Decimal('5.00'), description='Not mine', date=date(2025, 3, 1)
+        )
+        lines = self.export(format='ndjson', start='2025-02-01').splitlines()
+        self.assertEqual([json.loads(line)['description'] for line in lines], ['Late'])
+        self.assertEqual(self.client.get('/api/export/', {'start': 'soon'}).status_code, 400)
+
+
+# ============================================
+# Delta sync: /api/changes/
+# ============================================
+
+class ChangesTests(ApiTestCase):
+    def changes(self, since, **params):
+        return self.client.get('/api/changes/', {'since': since, **params}).json()
+
+    def test_only_rows_touched_since_the_version_come_back(self):
+        kept = self.add_income('10.00', 'Salary')
+        gone = self.add_expense('5.00', 'Coffee')
+        version = self.changes(0)['version']
+
+        added = self.add_expense('7.00', 'Taxi')
+        self.client.post(f'/expense/delete/{gone}/')
+        income = Income.objects.get(pk=kept)
+        income.source = 'Bonus'
+        income.save()
+
+        body = self.changes(version)
+        self.assertFalse(body['reset'])
+        self.assertEqual([row['id'] for row in body['expenses']], [added])
+        self.assertEqual([row['source'] for row in body['incomes']], ['Bonus'])
+        self.assertEqual(body['deleted'], {'incomes': [], 'expenses': [gone]})
+        self.assertEqual(body['balance'], 3.0)
+
+        latest = body['version']
+        self.assertGreater(latest, version)
+        up_to_date = self.changes(latest)
+        self.assertEqual((up_to_date['incomes'], up_to_date['expenses']), ([], []))
+
+    def test_too_many_changes_asks_for_a_reset(self):
+        for _ in range(3):
+            self.add_expense()
+        self.assertTrue(self.changes(0, limit=2)['reset'])
+        self.assertEqual(self.client.get('/api/changes/', {'since': 'yesterday'}).status_code, 400)
+
+    def test_bulk_writes_get_distinct_versions(self):
+        importer.write_batch([
+            Expense(user=self.user, amount=Decimal('1.00'), description=f'Row {number}', date=date(2025, 1, 1))
+            for number in range(5)
+        ])
+        versions = list(Expense.objects.values_list('version', flat=True))
+        self.assertEqual(len(set(versions)), 5)
+        self.assertEqual(UserSummary.objects.get(user=self.user).version, max(versions))
+
+
+# ============================================
+# Conditional GET
+# ============================================
+
+class ConditionalGetTests(ApiTestCase):
+    def test_unchanged_dashboard_is_a_304_until_the_next_write(self):
+        self.add_income()
+        first = self.client.get('/api/dashboard/')
+        etag = first['ETag']
+        self.assertEqual(self.client.get('/api/dashboard/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Another page is another representation
+        self.assertEqual(self.client.get('/api/dashboard/?limit=1', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        self.add_expense()
+        changed = self.client.get('/api/dashboard/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        self.assertEqual(len(changed.json()['expenses']), 1)
+
+    def test_check_auth_revalidates(self):
+        # The first response hands out the CSRF cookie, which is part of the tag
+        self.client.get('/api/check-auth/')
+        etag = self.client.get('/api/check-auth/')['ETag']
+        self.assertEqual(self.client.get('/api/check-auth/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.user.first_name = 'Alicia'
+        self.user.save()
+        self.assertEqual(self.client.get('/api/check-auth/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+# ============================================
+# Per-user response cache
+# ============================================
+
+class ResponseCacheTests(ApiTestCase):
+    def get_counting_queries(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        return response, len(queries)
+
+    def test_repeat_reads_skip_the_view_until_a_write(self):
+        self.add_income('10.00')
+        first, cold = self.get_counting_queries('/api/dashboard/')
+        second, warm = self.get_counting_queries('/api/dashboard/')
+        self.assertEqual(second.content, first.content)
+        self.assertLess(warm, cold)
+
+        self.add_income('5.00')
+        self.assertEqual(self.client.get('/api/dashboard/').json()['total_income'], 15.0)
+
+    def test_entries_are_per_user(self):
+        self.add_income('10.00')
+        self.client.get('/api/dashboard/')
+        other = User.objects.create_user('bob', 'bob@example.com', 'correct-horse-9')
+        self.client.force_login(other)
+        body = self.client.get('/api/dashboard/').json()
+        self.assertEqual((body['total_income'], body['user']['username']), (0.0, 'bob'))
+
+    def test_renaming_the_user_is_not_served_stale(self):
+        self.add_income('10.00')
+        self.client.get('/api/dashboard/')
+        self.user.first_name = 'Alicia'
+        self.user.save()
+        self.assertEqual(self.client.get('/api/dashboard/').json()['user']['first_name'], 'Alicia')
+
+
+# ============================================
+# Merged feed: /api/transactions/
+# ============================================
+
+class FeedTests(ApiTestCase):
+    def test_incomes_and_expenses_merge_newest_first_across_pages(self):
+        for day in range(1, 6):
+            self.add_income(day=f'2025-01-{day:02d}')
+            self.add_expense(day=f'2025-01-{day:02d}')
+
+        rows, cursor = [], None
+        while True:
+            body = self.client.get('/api/transactions/', {'limit': 3, **({'cursor': cursor} if cursor else {})}).json()
+            rows += body['transactions']
+            cursor = body['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(len({(row['type'], row['id']) for row in rows}), 10)
+        dates = [row['date'] for row in rows]
+        self.assertEqual(dates, sorted(dates, reverse=True))
+
+    def test_filters(self):
+        self.add_income('100.00', day='2025-01-10')
+        self.add_expense('5.00', day='2025-01-10')
+        self.add_expense('50.00', day='2025-02-10')
+        rows = self.client.get('/api/transactions/', {
+            'type': 'expense', 'start': '2025-01-01', 'end': '2025-01-31',
+        }).json()['transactions']
+        self.assertEqual([(row['type'], row['amount']) for row in rows], [('expense', '5.00')])
+        rows = self.client.get('/api/transactions/', {'min_amount': '50'}).json()['transactions']
+        self.assertEqual(sorted(row['amount'] for row in rows), ['100.00', '50.00'])
+
+        for params in (
+            {'type': 'transfer'}, {'min_amount': 'lots'}, {'min_amount': 'NaN'}, {'max_amount': 'Infinity'},
+            {'cursor': 'nope'},
+        ):
+            self.assertEqual(self.client.get('/api/transactions/', params).status_code, 400, params)
+
+
+# ============================================
+# Batch writes: /api/batch/
+# ============================================
+
+class BatchTests(ApiTestCase):
+    def test_creates_and_deletes_apply_together(self):
+        doomed = self.add_expense('5.00', 'Coffee')
+        response = self.post('/api/batch/', {'operations': [
+            {'op': 'create', 'type': 'income', 'amount': '100.00', 'source': 'Gift', 'date': '2025-01-01'},
+            {'op': 'create', 'type': 'expense', 'amount': '7.50', 'description': 'Taxi', 'date': '2025-01-02'},
+            {'op': 'delete', 'type': 'expense', 'id': doomed},
+        ]})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([result['status'] for result in response.json()['results']], ['created', 'created', 'deleted'])
+
+        self.assertFalse(Expense.objects.filter(pk=doomed).exists())
+        summary = UserSummary.objects.get(user=self.user)
+        self.assertEqual((summary.income_count, summary.expense_count, summary.balance), (1, 1, Decimal('92.50')))
+        self.assertEqual(Tombstone.objects.filter(user=self.user, object_id=doomed).count(), 1)
+
+    def test_one_bad_operation_rejects_the_whole_batch(self):
+        other = User.objects.create_user('bob', 'bob@example.com', 'correct-horse-9')
+        not_mine = Expense.objects.create(user=other, amount=Decimal('1.00'), description='x', date=date(2025, 1, 1))
+        response = self.post('/api/batch/', {'operations': [
+            {'op': 'create', 'type': 'income', 'amount': '100.00', 'source': 'Gift', 'date': '2025-01-01'},
+            {'op': 'delete', 'type': 'expense', 'id': not_mine.pk},
+            {'op': 'create', 'type': 'expense', 'amount': '-1', 'description': 'Refund', 'date': '2025-01-01'},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([result['status'] for result in response.json()['results']], ['skipped', 'invalid', 'invalid'])
+        self.assertFalse(Income.objects.filter(user=self.user).exists())
+        self.assertTrue(Expense.objects.filter(pk=not_mine.pk).exists())
+
+    def test_malformed_bodies_are_a_400(self):
+        for body in ({}, {'operations': []}, {'operations': 'all of them'}):
+            self.assertEqual(self.post('/api/batch/', body).status_code, 400, body)
+
+
+# ============================================
+# Idempotency keys
+# ============================================
+
+class IdempotencyTests(ApiTestCase):
+    body = {'amount': '12.50', 'source': 'Gift', 'date': '2025-01-01'}
+
+    def test_a_retry_replays_the_first_response(self):
+        first = self.post('/income/add/', self.body, HTTP_IDEMPOTENCY_KEY='key-1')
+        retry = self.post('/income/add/', self.body, HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((retry.status_code, retry.content), (201, first.content))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Income.objects.filter(user=self.user).count(), 1)
+
+        self.post('/income/add/', self.body, HTTP_IDEMPOTENCY_KEY='key-2')
+        self.post('/income/add/', self.body)
+        self.assertEqual(Income.objects.filter(user=self.user).count(), 3)
+
+    def test_reusing_a_key_for_another_request_is_refused(self):
+        self.post('/income/add/', self.body, HTTP_IDEMPOTENCY_KEY='key-1')
+        response = self.post('/income/add/', {**self.body, 'amount': '99.00'}, HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Income.objects.filter(user=self.user).count(), 1)
+
+    def test_keys_are_per_user_and_expire(self):
+        self.post('/income/add/', self.body, HTTP_IDEMPOTENCY_KEY='key-1')
+        self.client.force_login(User.objects.create_user('bob', 'bob@example.com', 'correct-horse-9'))
+        self.assertNotIn('Idempotent-Replayed', self.post('/income/add/', self.body, HTTP_IDEMPOTENCY_KEY='key-1'))
+
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(purge_expired(), 2)
+
+
+# ============================================
+# SQLite profiles
+# ============================================
+
+class DatabaseProfileTests(TestCase):
+    def connect(self, profile):
+        """A connection to a scratch file with one of the settings profiles"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_dict = {
+            **connection.settings_dict, **settings.DATABASE_PROFILES[profile],
+            'NAME': str(Path(directory.name) / 'profile.sqlite3'),
+        }
+        alias = f'profile-{profile}'
+        wrapper = connections['default'].__class__(settings_dict, alias=alias)
+        # Registered, so transaction.atomic(using=alias) finds it
+        connections[alias] = wrapper
+        self.addCleanup(connections.__delitem__, alias)
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_production_profile_runs_the_pragmas(self):
+        wrapper = self.connect('production')
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(wrapper, 'busy_timeout'), settings.SQLITE_PRAGMAS['busy_timeout'])
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)  # NORMAL
+
+    def test_every_profile_starts_transactions_immediate(self):
+        for profile in settings.DATABASE_PROFILES:
+            wrapper = self.connect(profile)
+            with CaptureQueriesContext(wrapper) as queries, transaction.atomic(using=wrapper.alias):
+                pass
+            self.assertIn('BEGIN IMMEDIATE', [query['sql'] for query in queries], profile)
+
+    def test_concurrency_benchmark_follows_the_profiles(self):
+        self.assertEqual(benchmark_concurrency.PROFILES.keys(), settings.DATABASE_PROFILES.keys())
+        for name, profile in benchmark_concurrency.PROFILES.items():
+            wrapper = self.connect(name)
+            db = benchmark_concurrency.Command().connect(wrapper.settings_dict['NAME'], profile)
+            self.addCleanup(db.close)
+            for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size'):
+                benchmarked = db.execute(f'PRAGMA {pragma}').fetchone()[0]
+                self.assertEqual(benchmarked, self.pragma(wrapper, pragma), (name, pragma))
+            self.assertEqual(profile['begin'], 'BEGIN IMMEDIATE')
+
+
+# ============================================
+# Read replica pins
+# ============================================
+
+class ReplicaPinTests(ApiTestCase):
+    """Read-your-writes across worker processes"""
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(routers, 'replica_enabled', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_write_pins_user_in_shared_cache(self):
+        self.assertFalse(routers.is_pinned(self.user.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_income()
+        self.assertTrue(routers.is_pinned(self.user.pk))
+        # Not process memory, which the other workers wouldn't see
+        self.assertNotIsInstance(caches['replica_pins'], LocMemCache)
+
+    def test_pinned_user_reads_from_primary(self):
+        @routers.read_replica
+        def view(request):
+            return HttpResponse(routers._reading_from.get() or 'default')
+
+        request = RequestFactory().get('/')
+        request.user = self.user
+        self.assertEqual(view(request).content.decode(), routers.REPLICA)
+        routers.pin_to_primary(self.user.pk)
+        self.assertEqual(view(request).content.decode(), 'default')
+
+
+# ============================================
+# Cached users in the auth middleware
+# ============================================
+
+class CachedUserTests(ApiTestCase):
+    """CachedAuthenticationMiddleware"""
+
+    def user_queries(self, path='/api/check-auth/'):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        return response, [q['sql'] for q in queries if 'auth_user' in q['sql']]
+
+    def test_second_request_uses_cached_user(self):
+        _, queries = self.user_queries()
+        self.assertEqual(len(queries), 1)
+        response, queries = self.user_queries()
+        self.assertEqual(response.json()['user']['first_name'], 'Alice')
+        self.assertEqual(queries, [])
+
+    def test_password_hash_not_cached(self):
+        self.user_queries()
+        values, auth_hash = middleware._cache().get(middleware._user_key(self.user.pk))
+        self.assertNotIn('password', middleware.CACHED_FIELDS)
+        self.assertNotIn(self.user.password, values)
+        self.assertEqual(auth_hash, self.user.get_session_auth_hash())
+
+    def test_password_change_ends_session(self):
+        self.user_queries()
+        self.user.set_password('another-horse-7')
+        self.user.save()
+        response, _ = self.user_queries()
+        self.assertEqual(response.status_code, 401)
+
+    def test_password_change_reaches_other_workers(self):
+        # Not process memory, where the other workers' copies would outlive the change
+        self.assertNotIsInstance(middleware._cache(), LocMemCache)
+        self.user_queries()
+        # Another worker process opens the same cache from its own settings
+        config = settings.CACHES[settings.SESSION_CACHE_ALIAS]
+        other_worker = import_string(config['BACKEND'])(config['LOCATION'], config)
+        self.assertIsNotNone(other_worker.get(middleware._user_key(self.user.pk)))
+        self.user.set_password('another-horse-7')
+        self.user.save()
+        self.assertIsNone(other_worker.get(middleware._user_key(self.user.pk)))
+
+
+# ============================================
+# Login and throttling
+# ============================================
+
+class LoginTests(ApiTestCase):
+    """Username-or-email login and its throttling"""
+
+    def login(self, username, password='correct-horse-9', **extra):
+        self.client.logout()
+        return self.post('/login/', {'username': username, 'password': password}, **extra)
+
+    def test_username_or_email(self):
+        self.assertEqual(self.login('alice').status_code, 200)
+        self.assertEqual(self.login('alice@example.com').json()['user']['username'], 'alice')
+        self.assertEqual(self.login('alice', 'wrong-horse').status_code, 401)
+
+    def test_ambiguous_email_is_refused(self):
+        User.objects.create_user('alice2', 'alice@example.com', 'correct-horse-9')
+        self.assertEqual(self.login('alice@example.com').status_code, 401)
+
+    def test_account_throttled_before_hashing(self):
+        limit, _ = settings.LOGIN_THROTTLE['account']
+        for _ in range(limit):
+            self.assertEqual(self.login('alice', 'wrong-horse').status_code, 401)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.login('alice')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertFalse([q for q in queries if 'auth_user' in q['sql']])
+        # Other accounts from another address are unaffected
+        self.assertEqual(self.login('bob', REMOTE_ADDR='10.0.0.2').status_code, 401)
+
+    def test_success_resets_account_bucket(self):
+        limit, _ = settings.LOGIN_THROTTLE['account']
+        for _ in range(limit - 1):
+            self.login('alice', 'wrong-horse')
+        self.assertEqual(self.login('alice').status_code, 200)
+        for _ in range(limit - 1):
+            self.assertEqual(self.login('alice', 'wrong-horse').status_code, 401)
+
+    def test_bucket_refills(self):
+        bucket = throttle.TokenBucket('test', 2, 10)
+        self.assertEqual(bucket.take('k', now=100), 0)
+        self.assertEqual(bucket.take('k', now=100), 0)
+        self.assertAlmostEqual(bucket.take('k', now=100), 5)
+        self.assertEqual(bucket.take('k', now=105), 0)
+
+
+# ============================================
+# Request instrumentation
+# ============================================
+
+@override_settings(INSTRUMENTATION_ENABLED=True, INSTRUMENTATION_FLUSH_SECONDS=0)
+class InstrumentationTests(ApiTestCase):
+    """InstrumentationMiddleware and the per-endpoint histograms"""
+
+    def setUp(self):
+        super().setUp()
+        timing.reset()
+        self.addCleanup(timing.reset)
+
+    def test_server_timing_header(self):
+        with self.assertLogs('core.timing', 'INFO') as logs:
+            response = self.client.get('/api/dashboard/')
+        header = response['Server-Timing']
+        for name in ('db;dur=', 'serialize;dur=', 'app;dur=', 'total;dur='):
+            self.assertIn(name, header)
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(line['endpoint'], 'core:dashboard-api')
+        self.assertIn(f'desc="{line["queries"]} queries"', header)
+        self.assertGreater(line['queries'], 0)
+
+    @override_settings(INSTRUMENTATION_QUERY_WARNING=0)
+    def test_query_warning(self):
+        with self.assertLogs('core.timing', 'WARNING'):
+            self.client.get('/api/dashboard/')
+
+    def test_dump_timings(self):
+        with self.assertLogs('core.timing'):
+            for _ in range(3):
+                self.client.get('/api/dashboard/')
+        out = StringIO()
+        call_command('dump_timings', '--json', '--endpoint', 'core:dashboard-api', stdout=out)
+        results = json.loads(out.getvalue())['core:dashboard-api']
+        self.assertEqual(results['total_ms']['count'], 3)
+        self.assertEqual(results['queries']['p50'], int(results['queries']['p50']))
+
+    def flush_request(self, endpoint='core:dashboard-api', pid=1):
+        # Stands in for a request served by worker process `pid`
+        with mock.patch('core.timing.os.getpid', return_value=pid):
+            timing.record(endpoint, {'total_ms': 5.0, 'db_ms': 1.0, 'serialize_ms': 0.5, 'queries': 3})
+
+    def collected_count(self, endpoint='core:dashboard-api'):
+        metrics = timing.collect().get(endpoint)
+        return metrics['total_ms'].count if metrics else 0
+
+    def test_flushes_add_up_per_process(self):
+        for pid in (1, 1, 2):
+            self.flush_request(pid=pid)
+        self.assertEqual(self.collected_count(), 3)
+
+    def test_reset_sticks_while_workers_keep_flushing(self):
+        self.flush_request(pid=1)
+        self.flush_request(pid=2)
+        with mock.patch('core.timing.os.getpid', return_value=1):
+            in_flight = timing._read(timing._process_file())
+        timing.reset()
+        self.assertEqual(timing.collect(), {})
+
+        self.flush_request(pid=1)
+        self.assertEqual(self.collected_count(), 1)
+        # A flush that read the generation before the reset doesn't bring the old counts back
+        with mock.patch('core.timing.os.getpid', return_value=2):
+            timing._write(timing._process_file(), in_flight)
+        self.assertEqual(self.collected_count(), 1)
+        self.flush_request(pid=2)
+        self.assertEqual(self.collected_count(), 2)
+
+    def test_histogram_percentiles(self):
+        histogram = timing.Histogram()
+        for value in range(1, 1001):
+            histogram.record(value)
+        for p in (50, 95, 99):
+            self.assertAlmostEqual(histogram.percentile(p), p * 10, delta=p * 10 * (timing.GROWTH - 1))
+        self.assertEqual(histogram.percentile(100), 1000)
+
+        other = timing.Histogram.from_state(histogram.as_state())
+        other.merge(histogram)
+        self.assertEqual(other.count, 2000)
+        self.assertEqual(other.percentile(50), histogram.percentile(50))
+
+    def test_nearest_rank_percentile(self):
+        values = list(range(1, 21))
+        self.assertEqual([timing.percentile(values, p) for p in (0, 50, 95, 100)], [1, 10, 19, 20])
+        self.assertEqual(timing.percentile([7], 99), 7)
+        self.assertIsNone(timing.percentile([], 95))
+
+    def test_benchmark_summary_without_requests(self):
+        summary = benchmark_asgi.Command().summarize([], [], elapsed=1.0)
+        self.assertEqual((summary['median_ms'], summary['p95_ms'], summary['requests_per_second']), (None, None, 0.0))
+
+
+# ============================================
+# Dashboard serialization
+# ============================================
+
+class SerializerTests(ApiTestCase):
+    def test_columnar_matches_rows(self):
+        for number in range(3):
+            self.add_income(f'1{number}.50', source=f'Income {number}')
+        self.add_expense('4.25')
+        rows = self.client.get('/api/dashboard/').json()
+        columnar = self.client.get('/api/dashboard/', {'format': 'columnar'}).json()
+        self.assertEqual(columnar['format'], 'columnar')
+        for name in ('incomes', 'expenses'):
+            columns = columnar[name]
+            rebuilt = [dict(zip(columns, values)) for values in zip(*columns.values())]
+            self.assertEqual(rebuilt, rows[name])
+        self.assertEqual(rows['incomes'][0]['amount'], '12.50')
+        self.assertEqual(rows['incomes'][0]['date'], '2025-01-15')
+
+    def test_undecodable_line_ends_the_import_with_a_report(self):
+        body = (
+            'type,date,amount,label\n'.encode()
+            + 'income,2025-01-25,3500.00,Salary\n'.encode()
+            + b'expense,2025-01-26,45.10,Caf\xe9\n'
+            + 'expense,2025-01-27,12.00,Taxi\n'.encode()
+        )
+        response = self.client.post('/api/import/?format=csv&batch_size=1', body, content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        report = response.json()
+        self.assertEqual((report['imported'], report['failed']), (1, 1))
+        self.assertEqual(report['errors'][0]['row'], 2)
+        self.assertIn('UTF-8', report['errors'][0]['errors']['__all__'][0]['message'])
+        self.assertEqual(UserSummary.objects.get(user=self.user).income_count, 1)
+
+        body = '{"date": "2025-02-01", "amount": "9.99", "type": "expense", "description": "Tea"}\n'.encode()
+        report = self.client.post('/api/import/', body + b'\xff\xfe\n', content_type='application/x-ndjson').json()
+        self.assertEqual((report['imported'], report['failed'], report['errors'][0]['row']), (1, 1, 2))
+
+    def test_unknown_format_is_a_400(self):
+        self.assertEqual(self.client.get('/api/dashboard/', {'format': 'xml'}).status_code, 400)
+
+    def test_chunked_json_matches_json_dumps(self):
+        records = [(number, Decimal(f'{number}.10'), date(2025, 1, 1) + timedelta(days=number)) for number in range(7)]
+        rows = serializers.Rows(['id', 'amount', 'date'], records)
+        payload = {'rows': rows, 'total': 1.5, 'empty': serializers.Rows(['id'], [])}
+        text = ''.join(serializers.iter_json(payload, chunk_size=3))
+        self.assertEqual(json.loads(text), {
+            'rows': [{'id': n, 'amount': f'{n}.10', 'date': (date(2025, 1, 1) + timedelta(days=n)).isoformat()}
+                     for n in range(7)],
+            'total': 1.5,
+            'empty': [],
+        })
+        columnar = json.loads(''.join(serializers.iter_json(payload, serializers.COLUMNAR)))
+        self.assertEqual(columnar['rows']['id'], list(range(7)))
+        self.assertEqual(columnar['empty'], {'id': []})
+
+
+# ============================================
+# Async views
+# ============================================
+
+def load_urls(async_views):
+    """Rebuild the URLconf as it would be with ASYNC_VIEWS set to `async_views`"""
+    with override_settings(ASYNC_VIEWS=async_views):
+        importlib.reload(urls)
+    # The root URLconf holds on to core.urls' old patterns
+    importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+    clear_url_caches()
+
+
+class AsyncViewTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        load_urls(True)
+        self.addCleanup(load_urls, False)
+        self.async_client.force_login(self.user)
+
+    async def apost(self, path, data=None, **extra):
+        return await self.async_client.post(path, json.dumps(data or {}), content_type='application/json', **extra)
+
+    def test_async_views_are_mounted(self):
+        self.assertTrue(iscoroutinefunction(resolve('/api/dashboard/').func))
+        self.assertEqual(resolve('/api/events/').view_name, 'core:events-api')
+
+    async def test_add_list_delete(self):
+        response = await self.apost('/income/add/', {'amount': '5.00', 'source': 'Gift', 'date': '2025-01-15'})
+        self.assertEqual(response.status_code, 201, response.content)
+        income_id = response.json()['id']
+        response = await self.apost('/expense/add/', {'amount': '2.00', 'description': 'Tea', 'date': '2025-01-16'})
+        self.assertEqual(response.status_code, 201, response.content)
+
+        body = (await self.async_client.get('/api/dashboard/')).json()
+        self.assertEqual(body['incomes'], [{'id': income_id, 'amount': '5.00', 'source': 'Gift', 'date': '2025-01-15'}])
+        self.assertEqual((body['total_income'], body['balance']), (5.0, 3.0))
+        columnar = (await self.async_client.get('/api/dashboard/', {'format': 'columnar'})).json()
+        self.assertEqual(columnar['expenses']['description'], ['Tea'])
+
+        self.assertEqual((await self.apost(f'/income/delete/{income_id}/')).status_code, 200)
+        self.assertEqual((await self.apost(f'/income/delete/{income_id}/')).status_code, 404)
+        summary = await UserSummary.objects.aget(user=self.user)
+        self.assertEqual((summary.total_income, summary.total_expenses), (0, 2))
+
+    async def test_idempotent_add(self):
+        data = {'amount': '5.00', 'source': 'Gift', 'date': '2025-01-15'}
+        first = await self.apost('/income/add/', data, headers={'Idempotency-Key': 'async-1'})
+        replay = await self.apost('/income/add/', data, headers={'Idempotency-Key': 'async-1'})
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(await Income.objects.acount(), 1)
+
+    async def test_check_auth_and_login_required(self):
+        body = (await self.async_client.get('/api/check-auth/')).json()
+        self.assertEqual(body['user'], {'username': 'alice', 'first_name': 'Alice'})
+        await self.async_client.alogout()
+        self.assertEqual((await self.async_client.get('/api/check-auth/')).status_code, 401)
+        self.assertEqual((await self.async_client.get('/api/dashboard/')).status_code, 302)
+
+
+# ============================================
+# Server-Sent Events: /api/events/
+# ============================================
+
+def event_data(text):
+    """The JSON payload of one 'changes' event"""
+    return json.loads(text.split('data: ', 1)[1])
+
+
+class EventStreamTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        load_urls(True)
+        self.addCleanup(load_urls, False)
+        self.async_client.force_login(self.user)
+
+    async def test_write_wakes_stream(self):
+        stream = events.stream(self.user)
+        first = await anext(stream)
+        self.assertTrue(first.startswith(f'retry: {events.RETRY_MILLISECONDS}\n'))
+        self.assertEqual(event_data(first)['incomes'], [])
+
+        await sync_to_async(self.add_income)('12.50')
+        events.publish(self.user.pk)
+        second = event_data(await asyncio.wait_for(anext(stream), 5))
+        self.assertEqual(second['incomes'][0]['amount'], '12.50')
+        self.assertEqual(second['total_income'], 12.5)
+        await stream.aclose()
+        self.assertNotIn(self.user.pk, events._listeners)
+
+    async def test_resume_from_version(self):
+        income_id = await sync_to_async(self.add_income)()
+        stream = events.stream(self.user, since=0)
+        first = await anext(stream)
+        self.assertEqual([row['id'] for row in event_data(first)['incomes']], [income_id])
+        self.assertIn(f"id: {event_data(first)['version']}\n", first)
+        await stream.aclose()
+
+    async def test_keepalive(self):
+        stream = events.stream(self.user)
+        await anext(stream)
+        with mock.patch.object(events, 'KEEPALIVE_SECONDS', 0.01):
+            self.assertEqual(await anext(stream), ': keepalive\n\n')
+        await stream.aclose()
+
+    async def test_events_api(self):
+        response = await self.async_client.get('/api/events/', headers={'Last-Event-ID': '0'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(event_data((await anext(aiter(response.streaming_content))).decode())['version'], 0)
+        response = await self.async_client.get('/api/events/', {'since': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_commit_publishes(self):
+        with mock.patch.object(events, 'publish') as publish, self.captureOnCommitCallbacks(execute=True):
+            self.add_expense()
+        publish.assert_called_with(self.user.pk)
+
+
+# ============================================
+# Full-text search: /api/search/
+# ============================================
+
+class SearchTests(ApiTestCase):
+    def search(self, q, **params):
+        response = self.client.get('/api/search/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def labels(self, body):
+        return [row.get('source') or row.get('description') for row in body['results']]
+
+    def test_every_word_is_a_prefix_match(self):
+        self.add_expense(description='Weekly groceries')
+        self.add_expense(description='Groceries for the party')
+        self.add_income(source='Grant')
+        self.assertEqual(len(self.search('gro')['results']), 2)
+        self.assertEqual(self.labels(self.search('gro par')), ['Groceries for the party'])
+        self.assertEqual(self.labels(self.search('GRA')), ['Grant'])
+        self.assertEqual(self.labels(self.search('gr', type='income')), ['Grant'])
+
+    def test_accents_and_punctuation(self):
+        self.add_expense(description='Café au lait')
+        self.assertEqual(self.labels(self.search('cafe')), ['Café au lait'])
+        # Quotes and FTS5 operators are searched for as words, not syntax
+        self.assertEqual(self.search('"lait" OR *')['results'], [])
+
+    def test_only_own_rows(self):
+        self.add_expense(description='Groceries')
+        bob = User.objects.create_user('bob', password='correct-horse-9')
+        Expense.objects.create(user=bob, amount='1.00', description='Groceries', date=date(2025, 1, 1))
+        self.assertEqual(len(self.search('groceries')['results']), 1)
+        self.assertEqual(Expense.objects.filter(search.matching(Expense, 'groceries')).count(), 2)
+
+    def test_paging(self):
+        for number in range(5):
+            self.add_expense(description=f'Rent {number}')
+        first = self.search('rent', limit=3)
+        second = self.search('rent', limit=3, offset=first['next_offset'])
+        self.assertIsNone(second['next_offset'])
+        ids = [row['id'] for row in first['results'] + second['results']]
+        self.assertEqual(sorted(ids), sorted(Expense.objects.values_list('id', flat=True)))
+
+    def test_bad_query_is_a_400(self):
+        self.assertEqual(self.client.get('/api/search/', {'q': '  !! '}).status_code, 400)
+        self.assertEqual(self.client.get('/api/search/', {'q': 'rent', 'type': 'loan'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/search/', {'q': 'rent', 'offset': -1}).status_code, 400)
+
+    def test_edit_and_delete_update_the_index(self):
+        expense_id = self.add_expense(description='Groceries')
+        expense = Expense.objects.get(pk=expense_id)
+        expense.description = 'Fuel'
+        expense.save()
+        self.assertEqual(self.search('groceries')['results'], [])
+        self.assertEqual(self.labels(self.search('fuel')), ['Fuel'])
+        self.client.post(f'/expense/delete/{expense_id}/')
+        self.assertEqual(self.search('fuel')['results'], [])
+        self.assertEqual(search.drift(), {'income': 0, 'expense': 0})
+
+    def test_rebuild_repairs_drift(self):
+        self.add_income(source='Salary')
+        Expense.objects.bulk_create([Expense(user=self.user, amount='1.00', description='Bus', date=date(2025, 1, 1))])
+        with self.assertRaises(CommandError):
+            call_command('rebuild_search_index', '--verify', stdout=StringIO())
+        call_command('rebuild_search_index', stdout=StringIO())
+        call_command('rebuild_search_index', '--verify', stdout=StringIO())
+        self.assertEqual(self.labels(self.search('bus')), ['Bus'])
+
+    def test_migration_indexes_like_the_app(self):
+        self.add_income(source='Crème brûlée stall')
+        self.add_expense(description='Bus_pass 2025')
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.TABLE}')
+        migration = importlib.import_module('core.migrations.0008_search_index')
+        migration.index_existing_rows(apps, SimpleNamespace(connection=connection))
+        self.assertEqual(search.drift(), {'income': 0, 'expense': 0})
+
+
+# ============================================
+# Admin changelists
+# ============================================
+
+class AdminChangelistTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser('root', 'root@example.com', 'correct-horse-9')
+        self.client.force_login(self.admin)
+
+    def changelist(self, **params):
+        response = self.client.get('/admin/core/income/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl']
+
+    def test_pages_in_date_order(self):
+        for day in ('2025-03-01', '2025-01-01', '2025-02-01', '2025-02-01'):
+            Income.objects.create(user=self.user, amount='1.00', source='Salary', date=date.fromisoformat(day))
+        with mock.patch.object(IncomeAdmin, 'list_per_page', 3):
+            first = self.changelist()
+            second = self.changelist(after=first.next_cursor)
+        self.assertIsNone(second.next_cursor)
+        expected = list(Income.objects.order_by('-date', '-created_at', '-id'))
+        self.assertEqual(list(first.result_list) + list(second.result_list), expected)
+        self.assertEqual(first.result_count, 4)
+
+    def test_user_and_period_filters(self):
+        bob = User.objects.create_user('bob', password='correct-horse-9')
+        Income.objects.create(user=self.user, amount='1.00', source='Salary', date=date(2025, 1, 1))
+        Income.objects.create(user=self.user, amount='1.00', source='Salary', date=date(2024, 12, 1))
+        Income.objects.create(user=bob, amount='1.00', source='Salary', date=date(2025, 1, 1))
+        cl = self.changelist(user=self.user.pk, period='2025-01')
+        self.assertEqual([row.user_id for row in cl.result_list], [self.user.pk])
+        self.assertEqual(cl.result_count, 1)
+        self.assertEqual(self.changelist(period='2025').result_count, 2)
+
+    def test_bad_parameters_redirect(self):
+        for params in ({'user': 'abc'}, {'period': '2025-13'}, {'after': 'not-a-cursor'}):
+            response = self.client.get('/admin/core/income/', params)
+            self.assertRedirects(response, '/admin/core/income/?e=1', fetch_redirect_response=False)
+
+
+# ============================================
+# Synthetic data: seed_data
+# ============================================
+
+class SeedingTests(TestCase):
+    def rows(self, prefix):
+        """Every seeded row, with the user numbered instead of by id"""
+        rows = []
+        for model, label in ((Income, 'source'), (Expense, 'description')):
+            for username, amount, text, day in (
+                model.objects.filter(user__username__startswith=prefix)
+                .values_list('user__username', 'amount', label, 'date')
+            ):
+                rows.append((username.removeprefix(prefix), amount, text, day))
+        return sorted(rows)
+
+    def test_same_seed_same_data(self):
+        totals = seeding.seed(5, 300, seed=7, prefix='a-', batch_size=50)
+        seeding.seed(5, 300, seed=7, prefix='b-', batch_size=1000)
+        self.assertEqual(totals['incomes'] + totals['expenses'], 300)
+        self.assertEqual(self.rows('a-'), self.rows('b-'))
+        seeding.seed(5, 300, seed=8, prefix='c-')
+        self.assertNotEqual(self.rows('a-'), self.rows('c-'))
+
+    def test_rows_fit_the_history(self):
+        seeding.seed(3, 200, months=2, end=date(2025, 6, 30), prefix='h-')
+        days = [day for _, _, _, day in self.rows('h-')]
+        self.assertGreaterEqual(min(days), date(2025, 5, 1))
+        self.assertLessEqual(max(days), date(2025, 6, 30))
+        self.assertTrue(all(amount > 0 for _, amount, _, _ in self.rows('h-')))
+
+    def test_ledger_and_index_match_the_rows(self):
+        call_command('seed_data', '--users', 4, '--rows', 250, '--prefix', 'l-', stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(User.objects.filter(username__startswith='l-').count(), 4)
+        call_command('rebuild_summaries', '--verify', stdout=StringIO())
+        fields = ('user_id', 'month', 'kind', 'bucket', 'total', 'count')
+        computed = sorted(
+            (rollup.user_id, rollup.month, rollup.kind, rollup.bucket, rollup.total.quantize(Decimal('0.01')), rollup.count)
+            for rollup in ledger.compute_rollups()
+        )
+        self.assertEqual(list(MonthlyRollup.objects.order_by(*fields).values_list(*fields)), computed)
+        self.assertEqual(search.drift(), {'income': 0, 'expense': 0})
+        user = User.objects.get(username='l-000001')
+        self.assertTrue(user.check_password(seeding.PASSWORD))
+
+    def test_existing_prefix_is_refused(self):
+        seeding.seed(1, 0, prefix='x-')
+        with self.assertRaises(CommandError):
+            call_command('seed_data', '--users', 1, '--rows', 0, '--prefix', 'x-', stdout=StringIO())
+
+
+# ============================================
+# Recurring rules
+# ============================================
+
+class RecurringTests(ApiTestCase):
+    def rule(self, start, frequency=RecurringRule.MONTHLY, **fields):
+        fields = {'kind': 'expense', 'amount': Decimal('1200.00'), 'label': 'Rent', **fields}
+        return RecurringRule.objects.create(user=self.user, frequency=frequency, start_date=start, **fields)
+
+    def dates(self, rule):
+        return list(Expense.objects.filter(recurring_rule=rule).order_by('date').values_list('date', flat=True))
+
+    def test_month_end_is_clamped(self):
+        rule = self.rule(date(2024, 1, 31))
+        report = recurring.materialize(today=date(2024, 4, 30))
+        self.assertEqual(report, {'rules': 1, 'incomes': 0, 'expenses': 4})
+        self.assertEqual(self.dates(rule), [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)])
+        rule.refresh_from_db()
+        self.assertEqual(rule.next_due, date(2024, 5, 31))
+        self.assertEqual(UserSummary.objects.get(user=self.user).total_expenses, Decimal('4800.00'))
+
+    def test_rerun_is_a_no_op(self):
+        rule = self.rule(date(2025, 1, 1), RecurringRule.WEEKLY, interval=2, end_date=date(2025, 2, 1))
+        recurring.materialize(today=date(2025, 3, 1))
+        self.assertEqual(recurring.materialize(today=date(2025, 3, 1))['expenses'], 0)
+        self.assertEqual(self.dates(rule), [date(2025, 1, 1), date(2025, 1, 15), date(2025, 1, 29)])
+        rule.refresh_from_db()
+        self.assertIsNone(rule.next_due)
+
+    def test_add_recurring_validates(self):
+        today = date.today().isoformat()
+        data = {'kind': 'income', 'amount': '3000', 'label': 'Salary', 'frequency': 'monthly', 'start_date': today}
+        response = self.post('/recurring/add/', data)
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['next_due'], today)
+        for bad in ({'interval': 0}, {'amount': '-1'}, {'end_date': '2000-01-01'}, {'frequency': 'hourly'}):
+            self.assertEqual(self.post('/recurring/add/', {**data, **bad}).status_code, 400, bad)
+
+    def test_reschedule_follows_created_rows(self):
+        rule = self.rule(date(2025, 1, 31))
+        recurring.materialize(today=date(2025, 3, 15))
+        rule.refresh_from_db()
+        rule.frequency, rule.start_date = RecurringRule.WEEKLY, date(2025, 1, 3)
+        recurring.reschedule(rule)
+        # Fridays from Jan 3; Feb 28 was the last one created
+        self.assertEqual(rule.next_due, date(2025, 3, 7))
+        rule.end_date = date(2025, 3, 1)
+        recurring.reschedule(rule)
+        self.assertIsNone(rule.next_due)
+
+
+class RecurringRuleAdminTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('root', 'root@example.com', 'correct-horse-9'))
+        self.rule = RecurringRule.objects.create(
+            user=self.user, kind='expense', amount=Decimal('50.00'), label='Gym', frequency=RecurringRule.MONTHLY,
+            start_date=date.today() - timedelta(days=500),
+        )
+        recurring.materialize()
+        self.rule.refresh_from_db()
+
+    def change(self, **fields):
+        data = {
+            'user': self.user.pk, 'kind': 'expense', 'amount': '50.00', 'label': 'Gym', 'frequency': 'monthly',
+            'interval': 1, 'start_date': self.rule.start_date.isoformat(), 'end_date': '', **fields,
+        }
+        return self.client.post(f'/admin/core/recurringrule/{self.rule.pk}/change/', data)
+
+    def test_unchanged_old_start_date_is_accepted(self):
+        next_due = self.rule.next_due
+        self.assertEqual(self.change(amount='55.00').status_code, 302)
+        self.rule.refresh_from_db()
+        self.assertEqual((self.rule.amount, self.rule.next_due), (Decimal('55.00'), next_due))
+
+    def test_form_validation_applies(self):
+        response = self.change(interval=0)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('interval', response.context['adminform'].form.errors)
+
+    def test_schedule_change_moves_next_due(self):
+        last = Expense.objects.filter(recurring_rule=self.rule).latest('date').date
+        self.assertEqual(self.change(frequency='daily').status_code, 302)
+        self.rule.refresh_from_db()
+        self.assertEqual(self.rule.next_due, last + timedelta(days=1))
+
+
+# ============================================
+# Budgets
+# ============================================
+
+class BudgetTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = date.today()
+
+    def set_budget(self, amount, category=''):
+        response = self.post('/budgets/set/', {'category': category, 'amount': amount})
+        self.assertIn(response.status_code, (200, 201), response.content)
+        return response.json()
+
+    def thresholds(self):
+        return list(BudgetAlert.objects.order_by('id').values_list('budget__category', 'threshold'))
+
+    def verify(self):
+        call_command('reconcile_budgets', '--verify', stdout=StringIO())
+
+    def test_thresholds_alert_once_per_crossing(self):
+        self.assertEqual(self.set_budget('100', ' Groceries ')['spent'], '0.00')
+        self.add_expense('79.00', day=self.today.isoformat())
+        self.assertEqual(self.thresholds(), [])
+        self.add_expense('1.00', day=self.today.isoformat())
+        self.add_expense('1.00', day=self.today.isoformat())
+        self.assertEqual(self.thresholds(), [('groceries', 80)])
+        last = self.add_expense('20.00', day=self.today.isoformat())
+        self.assertEqual(self.thresholds(), [('groceries', 80), ('groceries', 100)])
+
+        # Dropping back below is quiet; crossing again alerts again
+        self.client.post(f'/expense/delete/{last}/')
+        self.assertEqual(BudgetSpend.objects.get().alerted, 80)
+        self.add_expense('20.00', day=self.today.isoformat())
+        self.assertEqual([threshold for _, threshold in self.thresholds()], [80, 100, 100])
+        self.verify()
+
+    def test_edit_over_budget_does_not_alert_again(self):
+        self.set_budget('100')
+        expense_id = self.add_expense('120.00', day=self.today.isoformat())
+        self.assertEqual(self.thresholds(), [('', 100)])
+        expense = Expense.objects.get(pk=expense_id)
+        expense.description = 'Weekly shop'
+        expense.save()
+        expense.save()
+        self.assertEqual(self.thresholds(), [('', 100)])
+        self.assertEqual(BudgetSpend.objects.get().spent, Decimal('120.00'))
+        self.verify()
+
+    def test_overall_and_category_budgets(self):
+        self.set_budget('1000')
+        self.set_budget('10', 'coffee')
+        self.add_expense('12.00', 'Coffee', self.today.isoformat())
+        self.add_expense('50.00', 'Groceries', self.today.isoformat())
+        body = self.client.get('/api/budgets/').json()
+        self.assertEqual({row['category']: row['spent'] for row in body['budgets']}, {'': '62.00', 'coffee': '12.00'})
+        self.assertEqual([(alert['category'], alert['threshold']) for alert in body['alerts']], [('coffee', 100)])
+
+    def test_writes_do_not_sum_expenses(self):
+        self.set_budget('100', 'groceries')
+        self.add_expense('10.00', day=self.today.isoformat())
+        with CaptureQueriesContext(connection) as queries:
+            self.add_expense('10.00', day=self.today.isoformat())
+        self.assertFalse([q['sql'] for q in queries if 'SUM(' in q['sql'].upper()])
+        self.assertEqual(BudgetSpend.objects.get().spent, Decimal('20.00'))
+
+    def test_verify_is_clean_with_past_months(self):
+        last_month = ledger.month_of(self.today) - timedelta(days=1)
+        self.add_expense('90.00', day=last_month.isoformat())
+        self.add_expense('10.00', day=self.today.isoformat())
+        self.set_budget('100')
+        self.verify()
+        # A write into last month gives it a counter; changing the amount
+        # re-levels it along with this month's
+        self.add_expense('1.00', day=last_month.isoformat())
+        self.assertEqual(BudgetSpend.objects.get(month=ledger.month_of(last_month)).alerted, 80)
+        self.set_budget('50')
+        self.verify()
+        self.assertEqual(BudgetSpend.objects.get(month=ledger.month_of(last_month)).alerted, 100)
+        # ...without alerting for it: only the write above did
+        self.assertEqual(self.thresholds(), [('', 80)])
+
+    def test_reconcile_repairs_counters(self):
+        self.set_budget('100', 'groceries')
+        self.add_expense('50.00', day=self.today.isoformat())
+        BudgetSpend.objects.update(spent=0, alerted=0)
+        Expense.objects.bulk_create([
+            Expense(user=self.user, amount=Decimal('40.00'), description='Groceries', date=self.today),
+        ])
+        ledger.rebuild_rollups()
+        with self.assertRaises(CommandError):
+            self.verify()
+        call_command('reconcile_budgets', stdout=StringIO())
+        self.verify()
+        self.assertEqual(BudgetSpend.objects.get().spent, Decimal('90.00'))
+        self.assertEqual(self.thresholds(), [('groceries', 80)])
+
+    def test_deliver(self):
+        self.set_budget('10')
+        self.add_expense('12.00', day=self.today.isoformat())
+        call_command('deliver_budget_alerts', stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("over your overall budget", mail.outbox[0].subject)
+        self.assertEqual(mail.outbox[0].to, ['alice@example.com'])
+        self.assertFalse(BudgetAlert.objects.filter(delivered_at__isnull=True).exists())
+        self.assertEqual(budgets.deliver(), 0)
+
+    def test_invalid_budget_is_a_400(self):
+        self.assertEqual(self.post('/budgets/set/', {'amount': '-1'}).status_code, 400)
+        self.assertEqual(self.post('/budgets/set/', {'category': 'x'}).status_code, 400)
@@ -0,0 +1,78 @@
+"""
+Token-bucket rate limiting on top of the Django cache.
+
+Each bucket holds up to `capacity` tokens and refills at `rate` tokens a
+second; an attempt takes one token or is refused. The login view checks a
+per-IP and a per-account bucket before it does any password hashing, so
+a flood of guesses is turned away for the price of two cache lookups.
+
+State lives in CACHES['default'] (per process unless that cache is
+shared). Updates are read-then-write, not atomic, so under heavy
+concurrency a few extra attempts can slip through; that's fine for
+flood control.
+"""
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class TokenBucket:
+    def __init__(self, name, capacity, per_seconds):
+        self.name = name
+        self.capacity = capacity
+        self.rate = capacity / per_seconds
+
+    def _key(self, key):
+        return f'throttle:{self.name}:{hashlib.sha1(str(key).encode()).hexdigest()}'
+
+    def take(self, key, now=None):
+        """Take a token; returns 0 if allowed, else seconds until one is available"""
+        now = time.time() if now is None else now
+        cache = caches['default']
+        tokens, stamp = cache.get(self._key(key)) or (self.capacity, now)
+        tokens = min(self.capacity, tokens + (now - stamp) * self.rate)
+        if tokens < 1:
+            cache.set(self._key(key), (tokens, now), self.timeout)
+            return (1 - tokens) / self.rate
+        cache.set(self._key(key), (tokens - 1, now), self.timeout)
+        return 0
+
+    def reset(self, key):
+        caches['default'].delete(self._key(key))
+
+    @property
+    def timeout(self):
+        # After this long an untouched bucket is full again anyway
+        return math.ceil(self.capacity / self.rate)
+
+
+login_by_ip = TokenBucket('login-ip', *settings.LOGIN_THROTTLE['ip'])
+login_by_account = TokenBucket('login-account', *settings.LOGIN_THROTTLE['account'])
+
+
+def client_ip(request):
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _account(identifier):
+    return str(identifier).strip().lower()
+
+
+def check_login(request, identifier):
+    """
+    Take a token from the caller's IP bucket and the target account's
+    bucket. Returns 0 when the attempt may go ahead, otherwise the number
+    of seconds to put in Retry-After.
+    """
+    wait = login_by_ip.take(client_ip(request))
+    if not wait:
+        wait = login_by_account.take(_account(identifier))
+    return math.ceil(wait)
+
+
+def login_succeeded(identifier):
+    """A correct password clears the account's bucket, so the owner's earlier typos stop counting"""
+    login_by_account.reset(_account(identifier))
@@ -0,0 +1,286 @@
+"""
+Per-request query counts and timings, and per-endpoint histograms of them.
+
+InstrumentationMiddleware (core.middleware) opens a RequestTimings for
+each request; queries on every database connection are counted and timed
+through an execute wrapper, and views mark their serialization work with
+`with timing.span('serialize'):`. The totals go out as a Server-Timing
+header and a log line, and into this process's histograms, which are
+flushed now and then to a file of its own under
+settings.INSTRUMENTATION_DIR so `manage.py dump_timings` can merge them
+across worker processes.
+"""
+import json
+import math
+import os
+import socket
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+
+GENERATION_FILE = 'generation'
+# Files from processes that haven't flushed for this long are left out
+STALE_AFTER = 60 * 60 * 24
+
+METRICS = ('total_ms', 'db_ms', 'serialize_ms', 'queries')
+INTEGER_METRICS = {'queries'}
+
+# Histogram buckets start at a microsecond and grow by 10%, so a
+# percentile is off by at most that
+RESOLUTION = 0.001
+GROWTH = 1.1
+
+_current = ContextVar('billy_request_timings', default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.spans = defaultdict(float)
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+
+    def finish(self):
+        """Milliseconds (and the query count) for this request so far"""
+        total = (time.perf_counter() - self.started) * 1000
+        db, serialize = self.db * 1000, self.spans['serialize'] * 1000
+        return {
+            'total_ms': round(total, 3),
+            'db_ms': round(db, 3),
+            'serialize_ms': round(serialize, 3),
+            'app_ms': round(max(total - db - serialize, 0), 3),
+            'queries': self.queries,
+        }
+
+
+@contextmanager
+def request_timings():
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name):
+    """Add the time spent in this block to the current request's `name` span"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.spans[name] += time.perf_counter() - started
+
+
+def server_timing(metrics):
+    """Server-Timing header value, e.g. 'db;dur=1.2;desc="3 queries", total;dur=5.1'"""
+    return ', '.join([
+        f'db;dur={metrics["db_ms"]};desc="{metrics["queries"]} queries"',
+        f'serialize;dur={metrics["serialize_ms"]}',
+        f'app;dur={metrics["app_ms"]}',
+        f'total;dur={metrics["total_ms"]}',
+    ])
+
+
+# ============================================
+# HISTOGRAMS
+# ============================================
+
+def _bucket(value):
+    """Bucket index; bucket i holds values up to RESOLUTION * GROWTH ** i (0 is exactly zero)"""
+    if value <= 0:
+        return 0
+    return max(math.ceil(math.log(value / RESOLUTION, GROWTH)), 1)
+
+
+def _upper_bound(bucket):
+    return 0 if bucket == 0 else RESOLUTION * GROWTH ** bucket
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile (p out of 100) of an already sorted list; None if it's empty"""
+    if not sorted_values:
+        return None
+    return sorted_values[max(math.ceil(len(sorted_values) * p / 100), 1) - 1]
+
+
+class Histogram:
+    """Log-bucketed histogram; cheap to record into and to merge"""
+
+    def __init__(self, counts=None, count=0, total=0.0, maximum=0.0):
+        self.counts = defaultdict(int, counts or {})
+        self.count, self.total, self.maximum = count, total, maximum
+
+    def record(self, value):
+        self.counts[_bucket(value)] += 1
+        self.count += 1
+        self.total += value
+        self.maximum = max(self.maximum, value)
+
+    def merge(self, other):
+        for bucket, count in other.counts.items():
+            self.counts[bucket] += count
+        self.count += other.count
+        self.total += other.total
+        self.maximum = max(self.maximum, other.maximum)
+
+    def percentile(self, p, integer=False):
+        if not self.count:
+            return None
+        rank = math.ceil(self.count * p / 100)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                value = min(_upper_bound(bucket), self.maximum)
+                break
+        else:
+            value = self.maximum
+        # A bucket's upper bound is fractional; no count falls between integers
+        return math.floor(value) if integer else round(value, 3)
+
+    def summary(self, integer=False):
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count, 3) if self.count else None,
+            'p50': self.percentile(50, integer),
+            'p95': self.percentile(95, integer),
+            'p99': self.percentile(99, integer),
+            'max': self.maximum if integer else round(self.maximum, 3),
+        }
+
+    def as_state(self):
+        return {'counts': dict(self.counts), 'count': self.count, 'total': self.total, 'maximum': self.maximum}
+
+    @classmethod
+    def from_state(cls, state):
+        # Bucket indexes come back from JSON as strings
+        return cls({int(bucket): count for bucket, count in state['counts'].items()},
+                   state['count'], state['total'], state['maximum'])
+
+
+# ============================================
+# FLUSHING
+# ============================================
+# Each process owns one file, so nothing is shared between writers: flush()
+# adds what was recorded since the last flush to this process's file and
+# starts over. reset() bumps the generation and removes the files; a file
+# stamped with an older generation (e.g. a flush that was under way) is
+# ignored, and its process starts a fresh one on the next flush.
+
+def _empty():
+    return defaultdict(lambda: {metric: Histogram() for metric in METRICS})
+
+
+_histograms = _empty()  # recorded since this process's last flush
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_last_flush = [time.monotonic()]
+
+
+def record(endpoint, metrics):
+    with _lock:
+        for metric in METRICS:
+            _histograms[endpoint][metric].record(metrics[metric])
+        due = time.monotonic() - _last_flush[0] >= settings.INSTRUMENTATION_FLUSH_SECONDS
+    if due:
+        flush()
+
+
+def _directory():
+    return Path(settings.INSTRUMENTATION_DIR)
+
+
+def _process_file():
+    return _directory() / f'{socket.gethostname()}-{os.getpid()}.json'
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path, data):
+    """Replace the file in one step, so a reader never sees half of it"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temporary = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.replace(temporary, path)
+
+
+def _generation():
+    return (_read(_directory() / GENERATION_FILE) or {}).get('generation', 0)
+
+
+def _merge_into(merged, endpoints):
+    for endpoint, metrics in endpoints.items():
+        for metric, state in metrics.items():
+            merged[endpoint][metric].merge(Histogram.from_state(state))
+
+
+def flush():
+    """Add this process's histograms since the last flush to its file"""
+    with _lock:
+        _last_flush[0] = time.monotonic()
+        pending = dict(_histograms)
+        _histograms.clear()
+
+    with _flush_lock:
+        path, generation = _process_file(), _generation()
+        saved = _read(path)
+        totals = _empty()
+        if saved is not None and saved['generation'] == generation:
+            _merge_into(totals, saved['endpoints'])
+        for endpoint, metrics in pending.items():
+            for metric, histogram in metrics.items():
+                totals[endpoint][metric].merge(histogram)
+        _write(path, {
+            'generation': generation,
+            'flushed_at': time.time(),
+            'endpoints': {
+                endpoint: {metric: histogram.as_state() for metric, histogram in metrics.items()}
+                for endpoint, metrics in totals.items()
+            },
+        })
+
+
+def collect():
+    """Histograms from every process that has flushed since the last reset, merged per endpoint"""
+    generation, cutoff = _generation(), time.time() - STALE_AFTER
+    merged = _empty()
+    for path in _directory().glob('*.json'):
+        saved = _read(path)
+        if saved is not None and saved['generation'] == generation and saved['flushed_at'] >= cutoff:
+            _merge_into(merged, saved['endpoints'])
+    return dict(merged)
+
+
+def reset():
+    directory = _directory()
+    _write(directory / GENERATION_FILE, {'generation': _generation() + 1})
+    for path in directory.glob('*.json'):
+        path.unlink(missing_ok=True)
+    with _lock:
+        _histograms.clear()
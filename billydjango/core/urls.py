@@ -1,17 +1,39 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = "core"
 
+# Views that have an async twin in core.async_views (used under ASGI)
+api_views = async_views if settings.ASYNC_VIEWS else views
+
 urlpatterns = [
     path("", views.index, name="landing"),
-    path("api/check-auth/", views.check_auth, name="check-auth"),
-    path("api/dashboard/", views.dashboard_api, name="dashboard-api"), # Updated
+    path("api/check-auth/", api_views.check_auth, name="check-auth"),
+    path("api/dashboard/", api_views.dashboard_api, name="dashboard-api"), # Updated
+    path("api/transactions/", views.transactions_api, name="transactions-api"),
+    path("api/changes/", views.changes_api, name="changes-api"),
+    path("api/analytics/", views.analytics_api, name="analytics-api"),
+    path("api/search/", views.search_api, name="search-api"),
+    path("api/batch/", views.batch_api, name="batch-api"),
+    path("api/import/", views.import_api, name="import-api"),
+    path("api/cache-stats/", views.cache_stats_api, name="cache-stats-api"),
+    path("api/export/", views.export_api, name="export-api"),
+    path("api/recurring/", views.recurring_api, name="recurring-api"),
+    path("api/budgets/", views.budgets_api, name="budgets-api"),
     path("login/", views.login_view, name="login"),
     path("signup/", views.signup_view, name="signup"),
     path("logout/", views.logout_view, name="logout"),
-    path("income/add/", views.add_income, name="add-income"),
-    path("expense/add/", views.add_expense, name="add-expense"),
-    path("income/delete/<int:income_id>/", views.delete_income, name="delete-income"),
-    path("expense/delete/<int:expense_id>/", views.delete_expense, name="delete-expense"),
-]
\ No newline at end of file
+    path("income/add/", api_views.add_income, name="add-income"),
+    path("expense/add/", api_views.add_expense, name="add-expense"),
+    path("income/delete/<int:income_id>/", api_views.delete_income, name="delete-income"),
+    path("expense/delete/<int:expense_id>/", api_views.delete_expense, name="delete-expense"),
+    path("recurring/add/", views.add_recurring, name="add-recurring"),
+    path("recurring/delete/<int:rule_id>/", views.delete_recurring, name="delete-recurring"),
+    path("budgets/set/", views.set_budget, name="set-budget"),
+    path("budgets/delete/<int:budget_id>/", views.delete_budget, name="delete-budget"),
+]
+
+if settings.ASYNC_VIEWS:
+    # An open stream would tie up a WSGI worker thread for its whole life
+    urlpatterns.append(path("api/events/", async_views.events_api, name="events-api"))
@@ -3,15 +3,27 @@ from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum
-from django.http import JsonResponse
-from django.views.decorators.http import require_http_methods
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.middleware.csrf import get_token
 import json
+from datetime import date
+from decimal import Decimal, InvalidOperation
 
-from .forms import SignupForm, LoginForm, IncomeForm, ExpenseForm
-from .models import Income, Expense
+from . import (
+    analytics, batch, budgets, conditional, exporter, feed, importer, ledger, response_cache, search, serializers, sync, throttle,
+    timing,
+)
+from .cache_backends import stats_for
+from .forms import SignupForm, LoginForm, IncomeForm, ExpenseForm, BudgetForm, RecurringRuleForm
+from .idempotency import idempotent
+from .models import Income, Expense, Budget, BudgetAlert, BudgetSpend, RecurringRule
+from .pagination import InvalidCursor, parse_limit
+from .response_cache import cache_per_user
+from .routers import read_replica
 
 # ============================================
 # AUTH & UTILITY VIEWS
@@ -23,6 +35,8 @@ def index(request):
         return redirect('core:dashboard')
     return render(request, 'core/index.html')
 
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=conditional.check_auth_etag)
 def check_auth(request):
     """Essential for React to check if session is valid and get CSRF token"""
     get_token(request) 
@@ -69,9 +83,18 @@ def login_view(request):
         data = json.loads(request.body)
         username = data.get('username')
         password = data.get('password')
+
+        # Turn floods away before paying for a password hash
+        retry_after = throttle.check_login(request, username or '')
+        if retry_after:
+            response = JsonResponse({'error': 'Too many login attempts. Try again later.'}, status=429)
+            response['Retry-After'] = str(retry_after)
+            return response
+
         user = authenticate(request, username=username, password=password)
         
         if user:
+            throttle.login_succeeded(username)
             login(request, user)
             return JsonResponse({'success': True, 'user': {'username': user.username}})
         return JsonResponse({'error': 'Invalid credentials'}, status=401)
@@ -88,35 +111,219 @@ def logout_view(request):
 # ============================================
 
 @login_required
+@read_replica
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=conditional.versioned_etag('dashboard'))
+@cache_per_user('dashboard')
 def dashboard_api(request):
-    """The main data source for your React Dashboard"""
-    incomes = Income.objects.filter(user=request.user).order_by('-date')
-    expenses = Expense.objects.filter(user=request.user).order_by('-date')
-    
-    total_inc = incomes.aggregate(Sum('amount'))['amount__sum'] or 0
-    total_exp = expenses.aggregate(Sum('amount'))['amount__sum'] or 0
+    """
+    The main data source for your React Dashboard
+
+    Incomes and expenses are keyset-paginated newest first. Pass ?limit=N and
+    the values from 'next_cursor' as ?income_cursor= / ?expense_cursor= to
+    fetch the following pages. Totals always cover the full history.
+    ?format=columnar sends each list as parallel arrays ({"id": [...],
+    "amount": [...], ...}) instead of one object per row.
+    Responses carry an ETag; If-None-Match gets a 304 when nothing changed.
+    """
+    fmt = request.GET.get('format') or serializers.ROWS
+    if fmt not in serializers.FORMATS:
+        return JsonResponse({'error': 'format must be rows or columnar.'}, status=400)
+    try:
+        limit = parse_limit(request.GET.get('limit'))
+        incomes, next_income = serializers.page(
+            Income.objects.filter(user=request.user), ['id', 'amount', 'source', 'date'],
+            request.GET.get('income_cursor'), limit,
+        )
+        expenses, next_expense = serializers.page(
+            Expense.objects.filter(user=request.user), ['id', 'amount', 'description', 'date'],
+            request.GET.get('expense_cursor'), limit,
+        )
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    # Totals come from the incrementally maintained summary row, not a SUM() scan
+    summary = ledger.get_summary(request.user)
     
-    return JsonResponse({
-        'incomes': [{'id': i.id, 'amount': str(i.amount), 'source': i.source, 'date': i.date.strftime('%Y-%m-%d')} for i in incomes],
-        'expenses': [{'id': e.id, 'amount': str(e.amount), 'description': e.description, 'date': e.date.strftime('%Y-%m-%d')} for e in expenses],
-        'total_income': float(total_inc),
-        'total_expenses': float(total_exp),
-        'balance': float(total_inc - total_exp),
-        'user': {'username': request.user.username, 'first_name': request.user.first_name}
-    })
+    with timing.span('serialize'):
+        response = serializers.json_response({
+            'format': fmt,
+            'incomes': incomes,
+            'expenses': expenses,
+            'next_cursor': {'incomes': next_income, 'expenses': next_expense},
+            'total_income': float(summary.total_income),
+            'total_expenses': float(summary.total_expenses),
+            'balance': float(summary.balance),
+            'user': {'username': request.user.username, 'first_name': request.user.first_name}
+        }, fmt)
+    return response
+
+@login_required
+def transactions_api(request):
+    """
+    Incomes and expenses merged into one newest-first, keyset-paginated feed.
+
+    Query params: limit, cursor (from 'next_cursor'), type=income|expense,
+    start / end as YYYY-MM-DD, min_amount / max_amount.
+    """
+    kind = request.GET.get('type') or None
+    if kind not in (None, ledger.INCOME, ledger.EXPENSE):
+        return JsonResponse({'error': 'type must be income or expense.'}, status=400)
+    try:
+        start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else None
+        end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else None
+        min_amount = Decimal(request.GET['min_amount']) if request.GET.get('min_amount') else None
+        max_amount = Decimal(request.GET['max_amount']) if request.GET.get('max_amount') else None
+        # Decimal() happily parses 'NaN' and 'Infinity', which the query can't compare against
+        if any(amount is not None and not amount.is_finite() for amount in (min_amount, max_amount)):
+            raise ValueError('non-finite amount')
+    except (ValueError, InvalidOperation):
+        return JsonResponse({'error': 'Invalid date or amount filter.'}, status=400)
+
+    try:
+        rows, next_cursor = feed.feed_page(
+            request.user,
+            kinds=[kind] if kind else None,
+            cursor=request.GET.get('cursor'),
+            limit=parse_limit(request.GET.get('limit')),
+            start=start, end=end, min_amount=min_amount, max_amount=max_amount,
+        )
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    with timing.span('serialize'):
+        return JsonResponse({'transactions': rows, 'next_cursor': next_cursor})
+
+@login_required
+@read_replica
+def search_api(request):
+    """
+    Full-text search over income sources and expense descriptions.
+
+    Query params: q (every word is a prefix match), type=income|expense,
+    limit, offset (from 'next_offset'). Best matches first.
+    """
+    kind = request.GET.get('type') or None
+    if kind not in (None, ledger.INCOME, ledger.EXPENSE):
+        return JsonResponse({'error': 'type must be income or expense.'}, status=400)
+    try:
+        offset = int(request.GET.get('offset') or 0)
+    except ValueError:
+        return JsonResponse({'error': 'offset must be an integer.'}, status=400)
+    if offset < 0:
+        return JsonResponse({'error': 'offset must not be negative.'}, status=400)
+
+    try:
+        rows, next_offset = search.search(
+            request.user, request.GET.get('q', ''), kind, parse_limit(request.GET.get('limit')), offset,
+        )
+    except (search.InvalidQuery, InvalidCursor) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    with timing.span('serialize'):
+        return JsonResponse({'results': rows, 'next_offset': next_offset})
+
+@login_required
+def cache_stats_api(request):
+    """Hit rate and eviction counters of this process's response cache (staff only)"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff only'}, status=403)
+    return JsonResponse(stats_for(response_cache.CACHE_ALIAS))
+
+@login_required
+def changes_api(request):
+    """
+    Rows added, edited or deleted since ?since=<version>.
+
+    Clients keep the 'version' from each response and pass it back next
+    time. 'reset': true means too much changed - reload via the dashboard.
+    """
+    try:
+        since = int(request.GET.get('since', 0))
+        limit = parse_limit(request.GET.get('limit'), sync.DEFAULT_LIMIT, sync.MAX_LIMIT)
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'since and limit must be integers.'}, status=400)
+    changes = sync.changes_since(request.user, since, limit)
+    with timing.span('serialize'):
+        return JsonResponse(changes)
+
+@login_required
+@read_replica
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=conditional.versioned_etag('analytics'))
+@cache_per_user('analytics')
+def analytics_api(request):
+    """
+    Monthly income/expense series plus a per-bucket breakdown.
+
+    Query params: start / end as YYYY-MM (default: the last 12 months),
+    kind=income|expense and bucket=<normalized source/description>.
+    Served entirely from MonthlyRollup.
+    """
+    try:
+        end = analytics.parse_month(request.GET['end']) if request.GET.get('end') else date.today().replace(day=1)
+        start = analytics.parse_month(request.GET['start']) if request.GET.get('start') else analytics.add_months(end, -11)
+    except ValueError:
+        return JsonResponse({'error': 'start and end must look like YYYY-MM.'}, status=400)
+
+    if start > end:
+        return JsonResponse({'error': 'start must not be after end.'}, status=400)
+    if len(analytics.month_range(start, end)) > analytics.MAX_MONTHS:
+        return JsonResponse({'error': f'At most {analytics.MAX_MONTHS} months per request.'}, status=400)
+
+    kind = request.GET.get('kind') or None
+    if kind not in (None, ledger.INCOME, ledger.EXPENSE):
+        return JsonResponse({'error': 'kind must be income or expense.'}, status=400)
+    bucket = request.GET.get('bucket')
+    bucket = ledger.bucket_for(bucket) if bucket else None
+
+    series = analytics.monthly_series(request.user, start, end, kind, bucket)
+    buckets = analytics.bucket_breakdown(request.user, start, end, kind)
+    with timing.span('serialize'):
+        return JsonResponse({
+            'start': start.strftime('%Y-%m'),
+            'end': end.strftime('%Y-%m'),
+            'series': series,
+            'buckets': buckets,
+        })
+
+@login_required
+@require_http_methods(["GET"])
+@read_replica
+def export_api(request):
+    """
+    Stream the user's whole ledger as CSV (default) or NDJSON.
+
+    Query params: format=csv|ndjson, start / end as YYYY-MM-DD (inclusive).
+    """
+    fmt = request.GET.get('format') or exporter.CSV
+    if fmt not in exporter.FORMATS:
+        return JsonResponse({'error': 'format must be csv or ndjson.'}, status=400)
+    try:
+        start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else None
+        end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else None
+    except ValueError:
+        return JsonResponse({'error': 'start and end must look like YYYY-MM-DD.'}, status=400)
+
+    response = StreamingHttpResponse(
+        exporter.stream(fmt, request.user, start, end),
+        content_type=exporter.CONTENT_TYPES[fmt],
+    )
+    response['Content-Disposition'] = f'attachment; filename="billy-export-{date.today().isoformat()}.{fmt}"'
+    return response
 
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@idempotent
 def add_income(request):
     try:
         data = json.loads(request.body)
-        income = Income.objects.create(
-            user=request.user,
-            amount=data.get('amount'),
-            source=data.get('source'),
-            date=data.get('date')
-        )
+        with transaction.atomic():
+            income = Income.objects.create(
+                user=request.user,
+                amount=data.get('amount'),
+                source=data.get('source'),
+                date=data.get('date')
+            )
         return JsonResponse({'success': True, 'id': income.id}, status=201)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
@@ -124,29 +331,216 @@ def add_income(request):
 @csrf_exempt
 @login_required
 @require_http_methods(["POST"])
+@idempotent
 def add_expense(request):
     try:
         data = json.loads(request.body)
-        expense = Expense.objects.create(
-            user=request.user,
-            amount=data.get('amount'),
-            description=data.get('description'),
-            date=data.get('date')
-        )
+        with transaction.atomic():
+            expense = Expense.objects.create(
+                user=request.user,
+                amount=data.get('amount'),
+                description=data.get('description'),
+                date=data.get('date')
+            )
         return JsonResponse({'success': True, 'id': expense.id}, status=201)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
 
+@csrf_exempt
+@login_required
+@require_http_methods(["POST"])
+@idempotent
+def batch_api(request):
+    """
+    Apply a list of create/delete operations atomically.
+
+    Body: {"operations": [...]} - see core.batch for the operation format.
+    Returns per-operation results; if any operation is invalid nothing is
+    written and the response is a 400.
+    """
+    try:
+        data = json.loads(request.body)
+        ok, results = batch.run_batch(data.get('operations') if isinstance(data, dict) else None, request.user)
+    except (ValueError, batch.BatchError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    if not ok:
+        return JsonResponse({'error': 'Batch rejected; nothing was saved.', 'results': results}, status=400)
+    return JsonResponse({'success': True, 'results': results})
+
+@csrf_exempt
+@login_required
+@require_http_methods(["POST"])
+def import_api(request):
+    """
+    Bulk import incomes/expenses from CSV or NDJSON.
+
+    Send either a multipart upload in the 'file' field or the raw file as the
+    request body. ?format=csv|ndjson overrides detection from the file name /
+    Content-Type, ?type=income|expense sets the type for rows without one,
+    and ?batch_size= controls how many rows go into each transaction.
+    """
+    upload = request.FILES.get('file')
+    stream = upload if upload is not None else request
+    fmt = request.GET.get('format') or importer.guess_format(
+        upload.name if upload is not None else '',
+        upload.content_type if upload is not None else request.content_type,
+    )
+    if fmt not in importer.FORMATS:
+        return JsonResponse({'error': 'format must be csv or ndjson.'}, status=400)
+
+    try:
+        batch_size = parse_limit(request.GET.get('batch_size'), importer.DEFAULT_BATCH_SIZE, 5000)
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    report = importer.import_records(
+        importer.read_records(stream, fmt), request.user, request.GET.get('type'), batch_size
+    )
+    return JsonResponse(report.as_dict(), status=201 if report.imported else 200)
+
+@login_required
+@require_http_methods(["GET"])
+def recurring_api(request):
+    """
+    The user's recurring rules. Each one is turned into incomes/expenses as
+    its dates come round by `manage.py materialize_recurring`; next_due is
+    the next date it will create a row for (null once it has ended).
+    """
+    rules = RecurringRule.objects.filter(user=request.user).order_by('id').values_list(
+        'id', 'kind', 'amount', 'label', 'frequency', 'interval', 'start_date', 'end_date', 'next_due'
+    )
+    return JsonResponse({'rules': [
+        {
+            'id': pk,
+            'type': kind,
+            'amount': str(amount),
+            'label': label,
+            'frequency': frequency,
+            'interval': interval,
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat() if end_date else None,
+            'next_due': next_due.isoformat() if next_due else None,
+        }
+        for pk, kind, amount, label, frequency, interval, start_date, end_date, next_due in rules
+    ]})
+
+@csrf_exempt
+@login_required
+@require_http_methods(["POST"])
+@idempotent
+def add_recurring(request):
+    """
+    Body: {"kind": "expense", "amount": "1200", "label": "Rent",
+    "frequency": "monthly", "interval": 1, "start_date": "2026-03-01",
+    "end_date": null}. Occurrences before today are created on the next run.
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Body must be JSON.'}, status=400)
+    form = RecurringRuleForm(data=data if isinstance(data, dict) else {})
+    if not form.is_valid():
+        return JsonResponse({'error': 'Invalid rule.', 'errors': form.errors.get_json_data()}, status=400)
+
+    rule = form.save(commit=False)
+    rule.user = request.user
+    rule.save()
+    return JsonResponse({'success': True, 'id': rule.id, 'next_due': rule.next_due.isoformat()}, status=201)
+
+@csrf_exempt
+@login_required
+def delete_recurring(request, rule_id):
+    # Rows it already created stay; they just lose the link to the rule
+    rule = get_object_or_404(RecurringRule, id=rule_id, user=request.user)
+    rule.delete()
+    return JsonResponse({'success': True})
+
+@login_required
+@require_http_methods(["GET"])
+def budgets_api(request):
+    """
+    The user's monthly budgets with this month's spend against each, plus
+    their 20 latest alerts. A blank category is the overall budget.
+    """
+    month = ledger.month_of(date.today())
+    spent = dict(BudgetSpend.objects.filter(budget__user=request.user, month=month).values_list('budget_id', 'spent'))
+    alerts = BudgetAlert.objects.filter(user=request.user).select_related('budget').order_by('-created_at')[:20]
+    return JsonResponse({
+        'month': month.isoformat(),
+        'budgets': [
+            {
+                'id': budget.id,
+                'category': budget.category,
+                'amount': str(budget.amount),
+                'spent': str(spent.get(budget.id, Decimal(0))),
+            }
+            for budget in Budget.objects.filter(user=request.user).order_by('category')
+        ],
+        'alerts': [
+            {
+                'budget': alert.budget_id,
+                'category': alert.budget.category,
+                'month': alert.month.isoformat(),
+                'threshold': alert.threshold,
+                'spent': str(alert.spent),
+                'limit': str(alert.limit),
+                'created_at': alert.created_at.isoformat(),
+                'delivered': alert.delivered_at is not None,
+            }
+            for alert in alerts
+        ],
+    })
+
+@csrf_exempt
+@login_required
+@require_http_methods(["POST"])
+@idempotent
+def set_budget(request):
+    """
+    Body: {"category": "Groceries", "amount": "400"} - creates the budget
+    or changes its amount; leave category out for the overall budget.
+    This month's spend is checked against it straight away.
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Body must be JSON.'}, status=400)
+    form = BudgetForm(data=data if isinstance(data, dict) else {})
+    if not form.is_valid():
+        return JsonResponse({'error': 'Invalid budget.', 'errors': form.errors.get_json_data()}, status=400)
+
+    with transaction.atomic():
+        budget, created = Budget.objects.update_or_create(
+            user=request.user, category=form.cleaned_data['category'],
+            defaults={'amount': form.cleaned_data['amount']},
+        )
+        spent = budgets.refresh(budget)
+    return JsonResponse(
+        {'success': True, 'id': budget.id, 'category': budget.category, 'spent': str(spent)},
+        status=201 if created else 200,
+    )
+
+@csrf_exempt
+@login_required
+def delete_budget(request, budget_id):
+    # Its counters and alerts go with it
+    budget = get_object_or_404(Budget, id=budget_id, user=request.user)
+    budget.delete()
+    return JsonResponse({'success': True})
+
 @csrf_exempt
 @login_required
 def delete_income(request, income_id):
-    income = get_object_or_404(Income, id=income_id, user=request.user)
-    income.delete()
+    with transaction.atomic():
+        income = get_object_or_404(Income, id=income_id, user=request.user)
+        income.delete()
     return JsonResponse({'success': True})
 
 @csrf_exempt
 @login_required
 def delete_expense(request, expense_id):
-    expense = get_object_or_404(Expense, id=expense_id, user=request.user)
-    expense.delete()
+    with transaction.atomic():
+        expense = get_object_or_404(Expense, id=expense_id, user=request.user)
+        expense.delete()
     return JsonResponse({'success': True})
\ No newline at end of file